@@ -25,6 +25,7 @@ setup(
       entry_points="""
           [console_scripts]
           zasim_cli = zasim.cagen.main:main
+          zasim_sweep = zasim.sweep:main
           zasim_gui = zasim.gui.main:cli_main
           zasim_tutorial = zasim.examples.notebooks.notebook_app:launch_notebook_server [notebook]
       """,
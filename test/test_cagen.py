@@ -57,6 +57,111 @@ class TestCAGen:
         with pytest.raises(AttributeError):
             br._step_func.add_py_code("pre_compute", "print 'hello'")
 
+    def test_config_view_and_frame(self):
+        for size in [(30,), (20, 25)]:
+            br = cagen.ElementarySimulator(size=size, rule=110, copy_borders=True)
+            view = br.get_config_view()
+            assert not view.flags.writeable
+            assert np.may_share_memory(view, br._target.cconf)
+            assert_arrays_equal(view, br.get_config())
+            assert br.get_config().flags.writeable
+
+            frame = br.get_config_frame()
+            assert not frame.flags.writeable
+            assert frame is br.get_config_frame()
+            assert not np.may_share_memory(frame, br._target.cconf)
+
+            br.step_pure_py()
+            assert frame is not br.get_config_frame()
+            assert_arrays_equal(br.get_config_frame(), br.get_config())
+
+    def test_config_view_fallback(self):
+        from zasim.simulator import SimulatorInterface
+
+        class ArraySimulator(SimulatorInterface):
+            def __init__(self):
+                super(ArraySimulator, self).__init__()
+                self.cconf = np.zeros(5, dtype=int)
+
+            def get_config(self):
+                return self.cconf
+
+        sim = ArraySimulator()
+        view = sim.get_config_view()
+        assert not view.flags.writeable
+        assert sim.cconf.flags.writeable
+        sim.cconf[2] = 1
+        assert view[2] == 1
+
+    def test_separate_consts_pure(self):
+        first = cagen.ElementarySimulator(size=(8, 8), rule=54, copy_borders=True)
+        compare = cagen.ElementarySimulator(config=first.get_config(), rule=54, copy_borders=True)
+        # generating a step function for a different size must not change
+        # the sizes the other step functions work with.
+        cagen.ElementarySimulator(size=(20,), rule=110, copy_borders=True)
+
+        for i in range(3):
+            first.step_pure_py()
+            compare.step_pure_py()
+            assert_arrays_equal(first.get_config(), compare.get_config())
+
+    def test_rule_arr_round_trip(self):
+        from zasim.cagen.utils import rule_arr_to_rule_nr
+        for base, digits in [(2, 1), (2, 2), (4, 1), (2, 3), (3, 3), (2, 5), (4, 3), (3, 9)]:
+            number = randrange(base ** (base ** digits))
+            table = cagen.rule_nr_to_multidim_rule_arr(number, digits, base)
+            assert table.shape == (base,) * digits
+            # the first neighbourhood cell is the highest digit of the index
+            index = (base - 1,) + (0,) * (digits - 1)
+            position = (base - 1) * base ** (digits - 1)
+            assert table[index] == (number // base ** position) % base
+            assert rule_arr_to_rule_nr(table, base) == number
+            assert rule_arr_to_rule_nr(cagen.rule_nr_to_rule_arr(number, digits, base), base) == number
+
+        assert rule_arr_to_rule_nr([1, 0]) == 1
+        assert rule_arr_to_rule_nr([0, 1, 1, 0]) == 6
+        assert rule_arr_to_rule_nr([1, 2, 3], 4) == 57
+
+    def test_rule_table_construction(self):
+        by_number = cagen.ElementarySimulator(size=(30,), rule=110)
+        table = cagen.rule_nr_to_rule_arr(110, 3)
+        for rule in [table, table.reshape(2, 2, 2)]:
+            by_table = cagen.ElementarySimulator(config=by_number.get_config(), rule=rule)
+            assert by_table._rule_number is None
+            for i in range(5):
+                by_table.step_pure_py()
+            assert by_table.rule_number == 110
+            assert str(by_table._step_func) == str(by_number._step_func)
+        for i in range(5):
+            by_number.step_pure_py()
+        assert_arrays_equal(by_table.get_config(), by_number.get_config())
+
+        big = cagen.ElementarySimulator(size=(10, 10), rule=None, base=3)
+        number = big.rule_number
+        assert number < 3 ** (3 ** 5)
+        assert_arrays_equal(cagen.rule_nr_to_multidim_rule_arr(number, 5, 3), big.t.rule)
+
+        with pytest.raises(ValueError):
+            cagen.ElementarySimulator(size=(10,), rule=[0, 1, 1])
+
+    def test_rule_table_two_cells(self):
+        from zasim.debruijn import DeBruijnGraph
+        neigh = lambda: cagen.SimpleNeighbourhood("lm", [(-1,), (0,)])
+        by_number = cagen.ElementarySimulator(size=(20,), neighbourhood=neigh(), rule=6,
+                                              copy_borders=False)
+        for rule, number in [([0, 1, 1, 0], 6), ([1, 0, 0, 0], 1), ([0, 0, 0, 1], 8)]:
+            sim = cagen.ElementarySimulator(config=by_number.get_config(), neighbourhood=neigh(),
+                                            rule=np.array(rule), copy_borders=False)
+            assert sim.rule_number == number
+            assert DeBruijnGraph.from_simulator(sim).rules == [number]
+
+        by_table = cagen.ElementarySimulator(config=by_number.get_config(), neighbourhood=neigh(),
+                                             rule=np.array([0, 1, 1, 0]), copy_borders=False)
+        for i in range(3):
+            by_number.step_pure_py()
+            by_table.step_pure_py()
+        assert_arrays_equal(by_table.get_config(), by_number.get_config())
+
     def test_pretty_print_rules_1d(self):
         br = cagen.BinRule(size=(10,),rule=110)
 
@@ -507,6 +612,25 @@ class TestCAGen:
         main.main("--nondet 50 --life --activity --steps 10".split(" "))
         main.main("--nondet 40 --histogram --pure --steps 10".split(" "))
 
+    def test_cagen_main_batch(self, tmpdir):
+        from zasim.cagen import main
+
+        for threads in [1, 2]:
+            filename = str(tmpdir.join("record_%d.npy" % threads))
+            main.main(("--width 40 --rule 110 --backend pure --steps 10 --no-display "
+                      "--histogram --report --threads %d --record %s" % (threads, filename)).split(" "))
+
+            steps = list(main.read_recording(filename))
+            assert len(steps) == 11
+            assert set(steps[0].keys()) == set(["config", "histogram"])
+
+            sim = cagen.ElementarySimulator(size=(40,), rule=110, histogram=True,
+                                            config=steps[0]["config"])
+            for recorded in steps[1:]:
+                sim.step_pure_py()
+                assert_arrays_equal(recorded["config"], sim.get_config())
+                assert_arrays_equal(recorded["histogram"], sim.t.histogram)
+
 def pytest_generate_tests(metafunc):
     if "rule_num" in metafunc.funcargnames:
         for i in INTERESTING_BINRULES:
@@ -0,0 +1,84 @@
+from __future__ import absolute_import
+
+from zasim import cagen
+from zasim.features import HAVE_MULTIDIM
+
+from .testutil import assert_arrays_equal
+
+import numpy as np
+import pytest
+
+SETUPS = [
+    dict(size=(30,), rule=110),
+    dict(size=(30,), rule=110, nondet=0.5, histogram=True, activity=True),
+    dict(size=(30,), rule=30, beta=0.5, histogram=True),
+    dict(size=(30,), rule=184, nondet=0.7, sparse_loop=True, activity=True),
+    dict(size=(15, 12), rule=1515361445, nondet=0.5, histogram=True),
+    dict(size=(15, 12), rule=1515361445, sparse_loop=True, activity=True),
+]
+
+def run_and_record(sim, steps):
+    result = []
+    for i in range(steps):
+        sim.step_pure_py()
+        result.append([sim.get_config()] +
+                      [getattr(sim._target, name).copy()
+                       for name in ("histogram", "activity") if hasattr(sim._target, name)])
+    return result
+
+class TestCheckpoint:
+    def test_resume(self, setup, tmpdir):
+        if len(setup["size"]) == 2 and not HAVE_MULTIDIM:
+            pytest.skip("needs multidim support")
+        filename = str(tmpdir.join("checkpoint.npz"))
+
+        sim = cagen.ElementarySimulator(**setup)
+        run_and_record(sim, 5)
+        sim.save_checkpoint(filename)
+        expected = run_and_record(sim, 10)
+
+        resumed = cagen.ElementarySimulator(**setup)
+        resumed.load_checkpoint(filename)
+        assert resumed.step_number == 5
+        result = run_and_record(resumed, 10)
+        for expected_arrays, arrays in zip(expected, result):
+            for expected_array, array in zip(expected_arrays, arrays):
+                assert_arrays_equal(expected_array, array)
+
+    def test_snapshot_restore(self):
+        sim = cagen.ElementarySimulator(size=(40,), rule=54, nondet=0.5, histogram=True)
+        snapshot = sim.snapshot()
+        expected = run_and_record(sim, 5)
+        sim.restore(snapshot)
+        assert sim.step_number == 0
+        result = run_and_record(sim, 5)
+        for expected_arrays, arrays in zip(expected, result):
+            for expected_array, array in zip(expected_arrays, arrays):
+                assert_arrays_equal(expected_array, array)
+
+    def test_auto_checkpoint(self, tmpdir):
+        filename = str(tmpdir.join("auto.npz"))
+        sim = cagen.ElementarySimulator(size=(20,), rule=30)
+        sim.auto_checkpoint(filename, every=3)
+        for i in range(7):
+            sim.step_pure_py()
+            if i == 5:
+                config = sim.get_config()
+        assert sorted(tmpdir.listdir()) == [tmpdir.join("auto.npz")]
+
+        resumed = cagen.ElementarySimulator(size=(20,), rule=30)
+        resumed.load_checkpoint(filename)
+        assert resumed.step_number == 6
+        assert_arrays_equal(resumed.get_config(), config)
+
+    def test_different_structure(self):
+        snapshot = cagen.ElementarySimulator(size=(20,), rule=30).snapshot()
+        with pytest.raises(ValueError):
+            cagen.ElementarySimulator(size=(20,), rule=90).restore(snapshot)
+        with pytest.raises(ValueError):
+            cagen.ElementarySimulator(size=(21,), rule=30).restore(snapshot)
+
+def pytest_generate_tests(metafunc):
+    if "setup" in metafunc.funcargnames:
+        for setup in SETUPS:
+            metafunc.addcall(funcargs=dict(setup=setup))
@@ -117,6 +117,30 @@ class TestConfig:
             nconf_imp = config.FileCharConfiguration(tmpfile.name)
             assert_arrays_equal(nconf_imp.generate(), s.get_config())
 
+    def test_import_ragged_text(self, tmpdir):
+        text = "ab\r\naaab\n\nb\n"
+        expected = [[0, 1, 9, 9], [0, 0, 0, 1], [1, 9, 9, 9]]
+        conf = config.BaseCharConfiguration(text, {0: "a", 1: "b"}, fill=9).generate()
+        assert conf.T.tolist() == expected
+
+        filename = tmpdir.join("conf.txt")
+        filename.write(text)
+        conf = config.FileCharConfiguration(str(filename), {0: "a", 1: "b"}, fill=9).generate()
+        assert conf.T.tolist() == expected
+
+        with pytest.raises(ValueError):
+            config.BaseCharConfiguration("abc", {0: "a", 1: "b"}).generate()
+
+    def test_text_round_trip_multibyte(self):
+        import numpy as np
+        from zasim.display.console import values_to_lines, PALETTE
+        conf = np.random.RandomState(1).randint(0, 6, (17, 9))
+        lines = values_to_lines(conf.T, PALETTE)
+        assert lines[0].decode("utf8") == u"".join(PALETTE[value].decode("utf8") for value in conf[:, 0])
+        nconf = config.BaseCharConfiguration("\n".join(lines), None).generate()
+        assert_arrays_equal(nconf, conf)
+        assert values_to_lines([[0, 99]], {0: "."}) == [".X"]
+
     @pytest.mark.skipif("IS_PYPY")
     def test_export_import_conf_png(self, scale):
         from zasim.cagen import GameOfLife
@@ -133,6 +157,23 @@ class TestConfig:
             nconf_imp = config.ImageConfiguration(tmpfile.name, scale=scale)
             assert_arrays_equal(nconf_imp.generate(), s.get_config())
 
+    def test_import_png_without_qt(self, scale, tmpdir):
+        import numpy as np
+        from zasim.display.pngfile import write_png, unpack_rgb, PALETTE_32
+        conf = np.random.RandomState(2).randint(0, 4, (30, 40))
+        colors = unpack_rgb(np.array([PALETTE_32[value] for value in range(4)]))
+        image = colors[conf.T].repeat(scale, axis=0).repeat(scale, axis=1)
+        filename = str(tmpdir.join("conf.png"))
+        write_png(filename, image, filter_type=4)
+
+        assert_arrays_equal(config.ImageConfiguration(filename, scale=scale).generate(), conf)
+
+        # slightly different colours are only found with fuzz
+        noise = np.random.RandomState(3).randint(5, 20, image.shape)
+        write_png(filename, np.where(image > 127, image - noise, image + noise))
+        assert_arrays_equal(config.ImageConfiguration(filename, scale=scale, fuzz=True).generate(), conf)
+        assert (config.ImageConfiguration(filename, scale=scale).generate() == 1).all()
+
     def test_probability_distribution_1d(self):
         zero_fun = 1
         one_fun = lambda x, w: 0 if x <= w/2 else 5
@@ -168,6 +209,89 @@ class TestConfig:
                     if y <= 25:
                         assert conf[x, y] != 2
 
+    def test_random_seed(self):
+        a = config.RandomConfiguration(3, 0.5, seed=10).generate((50, 40))
+        b = config.RandomConfiguration(3, 0.5, seed=10).generate((50, 40))
+        c = config.RandomConfiguration(3, 0.5, seed=11).generate((50, 40))
+        assert_arrays_equal(a, b)
+        assert (a != c).any()
+
+        # the sequence of configurations is reproducible as well
+        gen = config.RandomConfiguration(2, seed=5)
+        first, second = gen.generate((100,)), gen.generate((100,))
+        gen.set_seed(5)
+        assert_arrays_equal(gen.generate((100,)), first)
+        assert_arrays_equal(gen.generate((100,)), second)
+
+        with pytest.raises(TypeError):
+            config.RandomConfiguration(2, 0.5, sead=1)
+
+    def test_random_chunks_into_memmap(self, tmpdir):
+        import numpy as np
+        expected = config.RandomConfiguration(4, 0.1, 0.2, seed=3).generate((123, 45))
+
+        gen = config.RandomConfiguration(4, 0.1, 0.2, seed=3)
+        gen.chunk_size = 1000
+        out = np.memmap(str(tmpdir.join("conf")), dtype=np.int8, mode="w+", shape=(123, 45))
+        result = gen.generate(out=out)
+        assert result is out
+        assert_arrays_equal(np.array(out, dtype=expected.dtype), expected)
+
+        palette = config.RandomConfigurationFromPalette([5, 7, 9], 0.5, seed=3)
+        assert set(palette.generate((1000,)).tolist()) == set([5, 7, 9])
+
+    def test_probability_distribution_seed_and_chunks(self):
+        import numpy as np
+        funs = {0: 1, 1: config.function_of_radius(lambda dist, maxdist: 3 * dist / maxdist),
+                2: lambda x, y, w, h: 2 if x < y else 0}
+        expected = config.DensityDistributedConfiguration(funs, seed=9).generate((40, 30))
+
+        gen = config.DensityDistributedConfiguration(funs, seed=9)
+        gen.chunk_size = 77
+        assert_arrays_equal(gen.generate((40, 30)), expected)
+        assert not (expected[np.indices((40, 30))[0] >= np.indices((40, 30))[1]] == 2).any()
+
+        # the corners are more likely to be 1 than the middle
+        conf = config.DensityDistributedConfiguration(
+                {0: 1, 1: config.function_of_radius(lambda dist, maxdist: 20 * (dist / maxdist) ** 4)},
+                seed=1).generate((100, 100))
+        assert conf[40:60, 40:60].mean() < 0.1 < conf[:10, :10].mean()
+
+    def test_pattern_1d(self):
+        gen = config.PatternConfiguration([[0, 0, 1], [1, 1], [2, 2, 2]], [1, 2, 1])
+        assert gen.generate((20,)).tolist() == [0, 0, 1, 0, 0, 1, 0, 1, 1, 2, 2, 2, 1, 1, 1, 0, 0, 1, 0, 0]
+        # too long layouts are cut off at both ends.
+        assert gen.generate((5,)).tolist() == [1, 2, 2, 2, 1]
+        assert gen.generate().tolist() == [1, 1, 2, 2, 2, 1, 1]
+
+        gen.chunk_size = 7
+        assert gen.generate((20,)).tolist() == [0, 0, 1, 0, 0, 1, 0, 1, 1, 2, 2, 2, 1, 1, 1, 0, 0, 1, 0, 0]
+
+        # without a layout, there is only the background.
+        assert config.PatternConfiguration([[0, 1]], []).generate((6,)).tolist() == [0, 1] * 3
+
+    def test_pattern_2d(self):
+        import numpy as np
+        gen = config.PatternConfiguration([[[0, 1], [1, 0]], [[5, 5, 5]], [[7], [7]]], [1, 2, 1])
+        expected = np.array([[0, 1, 0, 1, 0, 1, 0, 1],
+                             [1, 0, 1, 0, 1, 0, 1, 0],
+                             [0, 1, 5, 1, 0, 5, 0, 1],
+                             [1, 0, 5, 7, 7, 5, 1, 0],
+                             [0, 1, 5, 1, 0, 5, 0, 1],
+                             [1, 0, 1, 0, 1, 0, 1, 0]]).T
+        assert_arrays_equal(gen.generate((8, 6)), expected)
+        for chunk_size in [1, 5, 13]:
+            gen.chunk_size = chunk_size
+            assert_arrays_equal(gen.generate((8, 6)), expected)
+
+        # one-dimensional patterns become rows.
+        conf = config.PatternConfiguration([[0], [1, 2, 3]], [1]).generate((5, 3))
+        assert conf.T.tolist() == [[0] * 5, [0, 1, 2, 3, 0], [0] * 5]
+        conf = config.PatternConfiguration([[[0, 1], [1, 0]], [[5]]], []).generate((4, 3))
+        assert conf.T.tolist() == [[0, 1, 0, 1], [1, 0, 1, 0], [0, 1, 0, 1]]
+        with pytest.raises(ValueError):
+            config.PatternConfiguration([[[0]]], []).generate((5,))
+
 def pytest_generate_tests(metafunc):
     if "scale" in metafunc.funcargnames:
         for i in [1, 4, 10]:
@@ -0,0 +1,97 @@
+from __future__ import absolute_import
+
+from zasim import cagen
+from zasim.features import HAVE_MULTIDIM
+
+from .testutil import assert_arrays_equal
+
+import numpy as np
+import pytest
+
+def make(setup):
+    sim_class = setup.pop("sim_class", cagen.ElementarySimulator)
+    return sim_class(**setup)
+
+SETUPS = [
+    dict(size=(12,), rule=90),
+    dict(size=(10,), rule=110),
+    dict(size=(20,), rule=184, sparse_loop=True, activity=True),
+    dict(size=(8, 8), sim_class=cagen.GameOfLife),
+    dict(size=(8, 8), sim_class=cagen.GameOfLife, activity=True),
+]
+
+class TestCycles:
+    def test_run_matches_stepping(self, setup):
+        if len(setup["size"]) == 2 and not HAVE_MULTIDIM:
+            pytest.skip("needs multidim support")
+        plain = make(dict(setup))
+        fast = make(dict(setup))
+        fast.set_config(plain.get_config())
+        fast.enable_cycle_detection()
+        assert_arrays_equal(fast.t.cycle, np.array([-1, -1]))
+
+        for steps in [500, 1, 3, 77]:
+            for i in range(steps):
+                plain.step()
+            fast.run(steps)
+            assert fast.step_number == plain.step_number
+            assert_arrays_equal(fast.get_config(), plain.get_config())
+
+        transient, period = fast.cycle
+        assert_arrays_equal(fast.t.cycle, np.array([transient, period]))
+
+    def test_finds_transient_and_period(self):
+        sim = cagen.ElementarySimulator(size=(13,), rule=30)
+        config = sim.get_config()
+        seen = {}
+        while sim.get_config().tostring() not in seen:
+            seen[sim.get_config().tostring()] = sim.step_number
+            sim.step()
+        transient = seen[sim.get_config().tostring()]
+        period = sim.step_number - transient
+
+        sim.set_config(config)
+        sim.step_number = 0
+        sim.enable_cycle_detection()
+        sim.run(4 * (transient + period))
+        assert sim.cycle == (transient, period)
+
+    def test_run_takes_auto_checkpoints(self, tmpdir):
+        filename = str(tmpdir.join("auto.npz"))
+        plain = cagen.ElementarySimulator(size=(12,), rule=90)
+        sim = cagen.ElementarySimulator(size=(12,), rule=90)
+        sim.set_config(plain.get_config())
+        sim.enable_cycle_detection()
+        sim.run(200)
+        assert sim.cycle is not None
+
+        # the checkpoint at step 1000 lies inside the skipped periods.
+        sim.auto_checkpoint(filename, every=1000)
+        sim.run(1000)
+        assert tmpdir.join("auto.npz").check()
+        resumed = cagen.ElementarySimulator(size=(12,), rule=90)
+        resumed.load_checkpoint(filename)
+        assert resumed.step_number > 1000
+        plain.run(resumed.step_number)
+        assert_arrays_equal(resumed.get_config(), plain.get_config())
+
+    def test_reset_on_change(self):
+        sim = cagen.ElementarySimulator(size=(10,), rule=4)
+        sim.enable_cycle_detection()
+        sim.run(10)
+        assert sim.cycle is not None
+        sim.set_config_value((3,))
+        assert sim.cycle is None
+        assert sim.t.cycle[1] == -1
+        sim.run(10)
+        assert sim.cycle is not None
+
+    def test_needs_determinism(self):
+        sim = cagen.ElementarySimulator(size=(10,), rule=4, nondet=0.5)
+        with pytest.raises(ValueError):
+            sim.enable_cycle_detection()
+
+def pytest_generate_tests(metafunc):
+    if "setup" in metafunc.funcargnames:
+        for setup in SETUPS:
+            metafunc.addcall(funcargs=dict(setup=setup))
@@ -0,0 +1,67 @@
+from __future__ import absolute_import
+
+from zasim import cagen
+from zasim.cagen.utils import rule_nr_to_rule_arr
+from zasim.debruijn import DeBruijnGraph
+
+import numpy as np
+import itertools
+import pytest
+
+RULES = [0, 30, 54, 90, 110, 184, 255]
+
+def brute_force_step(rule, cells, boundary, border=0):
+    table = rule_nr_to_rule_arr(rule, 3)
+    if boundary == "periodic":
+        cells = [cells[-1]] + list(cells) + [cells[0]]
+    elif boundary == "fixed":
+        cells = [border] + list(cells) + [border]
+    return tuple(table[4 * cells[i] + 2 * cells[i + 1] + cells[i + 2]]
+                 for i in range(len(cells) - 2))
+
+def brute_force_preimages(rule, config, boundary, border=0):
+    width = len(config) + (2 if boundary == "open" else 0)
+    return sorted(cells for cells in itertools.product([0, 1], repeat=width)
+                  if brute_force_step(rule, cells, boundary, border) == tuple(config))
+
+class TestDeBruijn:
+    def test_count_and_enumerate(self, boundary):
+        graph = DeBruijnGraph(RULES)
+        for config in [(0, 1, 1, 0, 1, 0), (1, 1, 1, 1, 1, 1), (0, 0, 0, 1, 0, 0)]:
+            for border in ([0, 1] if boundary == "fixed" else [0]):
+                counts = graph.count_preimages(config, boundary, border)
+                for index, rule in enumerate(RULES):
+                    expected = brute_force_preimages(rule, config, boundary, border)
+                    assert counts[index] == len(expected)
+                    preimages = sorted(tuple(cells) for cells in
+                                       graph.preimages(config, boundary, border, rule=rule))
+                    assert preimages == expected
+
+    def test_big_counts(self):
+        assert DeBruijnGraph(204).count_preimages([1] * 100) == 1
+        assert DeBruijnGraph(0).count_preimages([0] * 100) == 2 ** 100
+
+    def test_garden_of_eden(self):
+        rules = range(256)
+        gardens = DeBruijnGraph(rules).has_garden_of_eden()
+        assert not gardens[90] and not gardens[150] and not gardens[204]
+        assert gardens[110] and gardens[54]
+
+        for rule in [110, 54, 184]:
+            orphan = DeBruijnGraph(rule).find_orphan()
+            assert gardens[rule]
+            assert DeBruijnGraph(rule).count_preimages(orphan, "open") == 0
+        assert DeBruijnGraph(90).find_orphan() is None
+
+    def test_from_simulator(self):
+        sim = cagen.ElementarySimulator(size=(12,), rule=110)
+        graph = DeBruijnGraph.from_simulator(sim)
+        config = sim.get_config()
+        sim.step_pure_py()
+        assert graph.count_preimages(sim.get_config()) >= 1
+        assert any((preimage == config).all() for preimage in graph.preimages(sim.get_config()))
+
+def pytest_generate_tests(metafunc):
+    if "boundary" in metafunc.funcargnames:
+        for boundary in ["periodic", "fixed", "open"]:
+            metafunc.addcall(funcargs=dict(boundary=boundary))
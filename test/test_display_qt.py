@@ -67,6 +67,10 @@ class TestDisplayQt:
 
         img2 = render_state_array_tiled(conf, jvn.PALETTE_JVN_IMAGE, jvn.PALETTE_JVN_RECT,region=(2, 2, 6, 6))
 
+        tilesize = jvn.PALETTE_JVN_RECT.values()[0].size()
+        assert img.width() == 10 * tilesize.width()
+        assert img2.height() == 6 * tilesize.height()
+
     def test_tiled_display_1d(self):
         test_conf = RandomConfigurationFromPalette(jvn.states)
         conf = test_conf.generate((10,))
@@ -47,6 +47,21 @@ class TestDualRule:
 
             assert_arrays_equal(simu.get_config(), br.get_config())
 
+    @pytest.mark.xfail("not HAVE_DTYPE_AS_INDEX")
+    def test_rule_tables_pure(self):
+        compu = cagen.DualRuleCellularAutomaton(cagen.rule_nr_to_rule_arr(232, 3), None, 0)
+        sf = cagen.automatic_stepfunc(size=(100,), computation=compu, needs_random_generator=True)
+        sf.gen_code()
+        simu = CagenSimulator(sf)
+        assert compu.rule_a == 232
+        assert 0 <= compu.rule_b < 256
+
+        br = cagen.BinRule(rule=compu.rule_b, config=simu.get_config())
+        for i in range(10):
+            simu.step_pure_py()
+            br.step_pure_py()
+            assert_arrays_equal(simu.get_config(), br.get_config())
+
     @pytest.mark.skipif("not HAVE_WEAVE")
     def test_compare_nondeterministic_weave(self):
         compu = cagen.DualRuleCellularAutomaton(184, 232, 1)
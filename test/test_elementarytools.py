@@ -1,5 +1,7 @@
 from zasim import elementarytools
-from zasim.cagen import SimpleNeighbourhood, VonNeumannNeighbourhood
+from zasim.cagen import SimpleNeighbourhood, VonNeumannNeighbourhood, MooreNeighbourhood
+from zasim.cagen.utils import elementary_digits_and_values
+from zasim.symmetry import symmetry_group
 
 import pytest
 
@@ -24,3 +26,70 @@ class TestCAGen:
         res = elementarytools.flip_h(neigh, results)
         expected = [1, 3, 2, 4]
         assert res == expected
+
+    def test_index_map_moore_base_3(self):
+        neigh = MooreNeighbourhood()
+        permutation = elementarytools.flip_offset_to_permutation(neigh, lambda (a, b): (-a, b))
+        imap = elementarytools.permutation_to_index_map(neigh, permutation, 3)
+        assert len(imap) == 3 ** 9
+        # mirroring twice gives back the original order
+        assert (imap[imap] == range(3 ** 9)).all()
+
+        dav = elementary_digits_and_values(neigh, 3)
+        for index in [0, 1, 1234, 3 ** 9 - 1]:
+            mirrored = dav[imap[index]]
+            assert all(mirrored[name] == dav[index][permutation[name]] for name in neigh.names)
+
+    def test_digits_and_values_two_neighbours(self):
+        neigh = SimpleNeighbourhood("lr", [(-1,), (1,)])
+        for results, number in [([0, 1, 1, 0], 6), ([1, 0, 0, 0], 1), ([0, 0, 0, 1], 8)]:
+            dav = elementary_digits_and_values(neigh, 2, results)
+            assert elementarytools.digits_and_values_to_rule_nr(dav) == number
+        assert elementarytools.digits_and_values_to_rule_nr([1, 2, 3], 4) == 57
+
+    def test_fixed_bits(self):
+        numbers = list(elementarytools.fixed_bits(10, 4))
+        assert numbers == [num for num in range(2 ** 10) if bin(num).count("1") == 4]
+        for index in [0, 17, len(numbers) - 1]:
+            assert elementarytools.unrank_fixed_bits(index, 10, 4) == numbers[index]
+            assert list(elementarytools.fixed_bits(10, 4, index)) == numbers[index:]
+        with pytest.raises(IndexError):
+            elementarytools.unrank_fixed_bits(len(numbers), 10, 4)
+
+    def test_class_enumeration(self, tmpdir):
+        neigh = VonNeumannNeighbourhood()
+        single = elementarytools.ClassEnumeration(neigh, 3, str(tmpdir.join("single")),
+                                                  chunk_size=500, cache_size=1000)
+        calls = []
+        single.run(processes=1, progress=lambda done, total, rate: calls.append((done, total)))
+        assert calls[-1] == (4960, 4960)
+        assert len(calls) == single.chunks == 10
+
+        group = symmetry_group(neigh, 2, single.actions)
+        numbers = list(elementarytools.fixed_bits(32, 3))
+        assert single.representatives.tolist() == group.canonical_numbers(numbers)
+
+        multi = elementarytools.ClassEnumeration(neigh, 3, str(tmpdir.join("multi")), chunk_size=500)
+        multi.run(processes=2)
+        assert (multi.representatives == single.representatives).all()
+        assert list(multi.classes()) == list(single.classes())
+
+    def test_class_enumeration_resume(self, tmpdir):
+        neigh = VonNeumannNeighbourhood()
+        basename = str(tmpdir.join("resume"))
+        enumeration = elementarytools.ClassEnumeration(neigh, 2, basename, chunk_size=100)
+        enumeration.run(processes=1)
+        expected = enumeration.representatives.tolist()
+
+        # pretend the last chunks were interrupted
+        enumeration.done[3:] = 0
+        enumeration.representatives[300:] = 0
+        enumeration.done.flush()
+        enumeration.representatives.flush()
+        del enumeration
+
+        resumed = elementarytools.ClassEnumeration(neigh, 2, basename, chunk_size=100)
+        calls = []
+        resumed.run(processes=1, progress=lambda done, total, rate: calls.append(done))
+        assert calls == [400, 496]
+        assert resumed.representatives.tolist() == expected
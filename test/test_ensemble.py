@@ -0,0 +1,98 @@
+from __future__ import absolute_import
+
+from zasim import cagen
+from zasim.features import HAVE_MULTIDIM
+
+from .testutil import assert_arrays_equal
+
+import numpy as np
+import pytest
+
+class TestEnsemble:
+    def test_elementary_members(self, rule):
+        ensemble = cagen.ElementaryEnsemble(size=(25,), members=6, rule=rule,
+                                            histogram=True, activity=True, random_seed=3)
+        assert ensemble.shape == (6, 25)
+        sims = [cagen.ElementarySimulator(config=config, rule=rule, histogram=True, activity=True)
+                for config in ensemble.get_config()]
+        for i in range(20):
+            ensemble.step()
+            for sim in sims:
+                sim.step_pure_py()
+        for index, sim in enumerate(sims):
+            assert_arrays_equal(ensemble.get_config()[index], sim.get_config())
+            assert list(ensemble.t.histogram[index]) == list(sim.t.histogram)
+            assert list(ensemble.t.activity[index]) == list(sim.t.activity)
+
+    def test_game_of_life_members(self):
+        if not HAVE_MULTIDIM:
+            pytest.skip("needs multidim support")
+        ensemble = cagen.GameOfLifeEnsemble(size=(12, 9), members=4, histogram=True, random_seed=5)
+        sims = [cagen.GameOfLife(config=config) for config in ensemble.get_config()]
+        for i in range(15):
+            ensemble.step()
+            for sim in sims:
+                sim.step_pure_py()
+        for index, sim in enumerate(sims):
+            assert_arrays_equal(ensemble.get_config()[index], sim.get_config())
+        assert_arrays_equal(ensemble.t.histogram.sum(axis=1), np.array([12 * 9] * 4))
+
+    def test_nondet_and_config_changes(self):
+        ensemble = cagen.ElementaryEnsemble(size=(30,), members=3, rule=30, nondet=0.0)
+        config = ensemble.get_config()
+        ensemble.run(5)
+        assert ensemble.step_number == 5
+        assert_arrays_equal(ensemble.get_config(), config)
+
+        ensemble.set_config_value((1, 4))
+        config[1, 4] = 1 - config[1, 4]
+        assert_arrays_equal(ensemble.get_config(), config)
+
+        with pytest.raises(ValueError):
+            ensemble.set_config(np.zeros((2, 30), dtype=config.dtype))
+
+    def test_config_frame(self):
+        ensemble = cagen.ElementaryEnsemble(size=(20,), members=3, rule=110, random_seed=2)
+        frame = ensemble.get_config_frame()
+        config = ensemble.get_config()
+        assert not frame.flags.writeable
+        assert frame is ensemble.get_config_frame()
+
+        ensemble.step()
+        ensemble.step()
+        assert_arrays_equal(frame, config)
+        assert frame is not ensemble.get_config_frame()
+        assert_arrays_equal(ensemble.get_config_frame(), ensemble.get_config())
+
+        frame = ensemble.get_config_frame()
+        ensemble.set_config_value((0, 3))
+        assert_arrays_equal(ensemble.get_config_frame(), ensemble.get_config())
+        ensemble.set_config(np.zeros((3, 20), dtype=config.dtype))
+        assert not ensemble.get_config_frame().any()
+
+    def test_damage_spreading(self):
+        sim = cagen.DamageSpreading(size=(50,), rule=110, perturb=[(25,)], random_seed=7)
+        assert sim.distance == 1
+        assert sim.damage_box == ((25, 25),)
+        for i in range(10):
+            sim.step()
+            first, second = sim.get_config()
+            differs = np.flatnonzero(first != second)
+            assert sim.distance == len(differs)
+            if len(differs):
+                assert sim.damage_box == ((differs.min(), differs.max()),)
+            else:
+                assert sim.damage_box is None
+
+    def test_damage_shares_random_numbers(self):
+        sim = cagen.DamageSpreading(size=(10, 10), life_params={}, perturb=[],
+                                    nondet=0.5, random_seed=2)
+        assert sim.damage_box is None
+        sim.run(10)
+        assert sim.distance == 0
+        assert list(sim.t.damage[1]) == [0, -1, -1, -1, -1]
+
+def pytest_generate_tests(metafunc):
+    if "rule" in metafunc.funcargnames:
+        for rule in [30, 110, 184]:
+            metafunc.addcall(funcargs=dict(rule=rule))
@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+
+from zasim import cagen
+from zasim.features import HAVE_MULTIDIM
+
+from .testutil import assert_arrays_equal
+
+import pytest
+
+def record(sim, steps):
+    configs = {sim.step_number: sim.get_config()}
+    for i in range(steps):
+        sim.step_pure_py()
+        configs[sim.step_number] = sim.get_config()
+    return configs
+
+class TestHistory:
+    def test_seek_and_step_back(self, size):
+        if len(size) == 2 and not HAVE_MULTIDIM:
+            pytest.skip("needs multidim support")
+        sim = cagen.ElementarySimulator(size=size, rule=110, nondet=0.7, histogram=True)
+        sim.enable_history(keyframe_interval=8)
+        configs = record(sim, 40)
+        assert sim.available_history == 40
+
+        for step in [3, 17, 16, 40, 0, 39, 8, 25]:
+            sim.seek(step)
+            assert sim.step_number == step
+            assert_arrays_equal(sim.get_config(), configs[step])
+            assert sim.t.histogram[1] == configs[step].sum()
+
+        for step in range(24, 10, -1):
+            sim.step_back()
+            assert sim.step_number == step
+            assert_arrays_equal(sim.get_config(), configs[step])
+
+    def test_step_after_seek(self):
+        sim = cagen.ElementarySimulator(size=(30,), rule=30)
+        sim.enable_history(keyframe_interval=5)
+        configs = record(sim, 20)
+
+        sim.seek(12)
+        configs.update(record(sim, 3))
+        assert sim.history.last_step == 15
+        with pytest.raises(IndexError):
+            sim.seek(16)
+        for step in range(16):
+            sim.seek(step)
+            assert_arrays_equal(sim.get_config(), configs[step])
+
+    def test_recalculate(self):
+        sim = cagen.ElementarySimulator(size=(30,), rule=54)
+        sim.enable_history(keyframe_interval=6, deltas=False)
+        configs = record(sim, 20)
+        assert len(sim.history.groups) == 4
+        for step in [19, 2, 6, 13, 20]:
+            sim.seek(step)
+            assert sim.step_number == step
+            assert_arrays_equal(sim.get_config(), configs[step])
+
+        with pytest.raises(ValueError):
+            cagen.ElementarySimulator(size=(30,), rule=54, nondet=0.5).enable_history(deltas=False)
+
+    def test_eviction(self):
+        sim = cagen.ElementarySimulator(size=(100,), rule=30)
+        sim.enable_history(keyframe_interval=10, max_bytes=4000)
+        configs = record(sim, 100)
+        assert sim.history.nbytes <= 4000
+        assert sim.history.first_step > 0
+        assert sim.available_history == 100 - sim.history.first_step
+
+        with pytest.raises(IndexError):
+            sim.seek(sim.history.first_step - 1)
+        sim.seek(sim.history.first_step + 3)
+        assert_arrays_equal(sim.get_config(), configs[sim.history.first_step + 3])
+
+    def test_changed_config(self):
+        sim = cagen.ElementarySimulator(size=(30,), rule=90)
+        sim.enable_history(keyframe_interval=100)
+        configs = record(sim, 10)
+
+        sim.set_config_value((5,), 1 - configs[10][5])
+        configs[10] = sim.get_config()
+        configs.update(record(sim, 5))
+        for step in range(16):
+            sim.seek(step)
+            assert_arrays_equal(sim.get_config(), configs[step])
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.funcargnames:
+        for size in [(50,), (20, 15)]:
+            metafunc.addcall(funcargs=dict(size=size))
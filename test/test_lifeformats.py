@@ -0,0 +1,110 @@
+from __future__ import absolute_import
+
+from zasim import cagen, lifeformats
+from zasim.features import HAVE_MULTIDIM
+
+from .testutil import assert_arrays_equal
+
+from StringIO import StringIO
+
+import numpy as np
+import pytest
+
+GLIDER = """#N Glider
+#C A comment
+x = 3, y = 3, rule = B3/S23
+bob$2bo$
+3o!
+anything after the end is ignored
+"""
+
+def pytest_generate_tests(metafunc):
+    if "base" in metafunc.funcargnames:
+        for base in [2, 3, 256]:
+            metafunc.addcall(funcargs=dict(base=base))
+
+def random_pattern(randomizer, shape, base):
+    return randomizer.randint(1, base, shape) * (randomizer.rand(*shape) < 0.3)
+
+class TestLifeFormats:
+    def test_read_rle(self):
+        conf, rule = lifeformats.read_rle(StringIO(GLIDER))
+        assert rule == "B3/S23"
+        assert_arrays_equal(conf.T, np.array([[0, 1, 0], [0, 0, 1], [1, 1, 1]]))
+
+        out = np.zeros((6, 5), dtype=np.int32)
+        lifeformats.read_rle(StringIO(GLIDER), out, offset=(2, 1))
+        assert_arrays_equal(out[2:5, 1:4], conf)
+        assert out.sum() == 5
+        with pytest.raises(ValueError):
+            lifeformats.read_rle(StringIO(GLIDER), out, offset=(4, 1))
+
+    def test_read_rle_multistate(self):
+        data = "x = 4, y = 3, rule = Test\n2.A$pAB\n$yO2.B!"
+        conf, rule = lifeformats.read_rle(StringIO(data))
+        assert rule == "Test"
+        assert_arrays_equal(conf.T, np.array([[0, 0, 1, 0], [25, 2, 0, 0], [255, 0, 0, 2]]))
+
+    def test_rle_round_trip(self, base):
+        randomizer = np.random.RandomState(11)
+        for shape in [(1, 1), (5, 3), (100, 37), (3, 200)]:
+            conf = random_pattern(randomizer, shape, base)
+            stream = StringIO()
+            lifeformats.write_rle(stream, conf)
+            text = stream.getvalue()
+            assert max(len(line) for line in text.splitlines()) <= 70
+            # decoding in tiny chunks splits the tags and counts.
+            loaded, _ = lifeformats.read_rle(StringIO(text), chunk_size=5)
+            assert_arrays_equal(loaded, conf)
+
+    def test_macrocell_round_trip(self, base):
+        randomizer = np.random.RandomState(12)
+        for shape in [(5, 3), (100, 37), (3, 200), (64, 64)]:
+            conf = random_pattern(randomizer, shape, base)
+            # equal parts should become the same node.
+            conf[:, :] = np.tile(conf[:(shape[0] + 1) // 2], (2, 1))[:shape[0]]
+            conf[0, 0] = conf[-1, -1] = 1
+            stream = StringIO()
+            lifeformats.write_macrocell(stream, conf)
+            stream.seek(0)
+            loaded, _ = lifeformats.read_macrocell(stream)
+            assert_arrays_equal(loaded, conf)
+
+    def test_read_macrocell(self):
+        # a glider in golly's own output
+        data = "[M2] (golly 2.0)\n#R B3/S23\n.*$..*$***$\n4 1 0 0 0\n"
+        conf, rule = lifeformats.read_macrocell(StringIO(data))
+        assert_arrays_equal(conf.T, np.array([[0, 1, 0], [0, 0, 1], [1, 1, 1]]))
+        with pytest.raises(ValueError):
+            lifeformats.read_macrocell(StringIO("[M2]\n4 2 0 0 0\n.*$\n"))
+
+    def test_rules(self):
+        params = dict(reproduce_min=3, reproduce_max=4, stay_alive_min=1, stay_alive_max=5)
+        assert lifeformats.life_rule(params) == "B34/S12345"
+        assert lifeformats.life_params("B34/S12345") == params
+        for rule in ["B3/S", "B35/S23", "life"]:
+            with pytest.raises(ValueError):
+                lifeformats.life_params(rule)
+
+    def test_game_of_life(self, tmpdir):
+        if not HAVE_MULTIDIM:
+            pytest.skip("needs multidim support")
+        life_params = dict(reproduce_min=3, reproduce_max=3, stay_alive_min=1, stay_alive_max=4)
+        sim = cagen.GameOfLife(size=(30, 20), life_params=life_params)
+        for save, configuration in [(lifeformats.save_rle, lifeformats.RleConfiguration),
+                                    (lifeformats.save_macrocell, lifeformats.MacrocellConfiguration)]:
+            filename = str(tmpdir.join("pattern"))
+            save(filename, sim)
+            config = configuration(filename)
+            assert config.life_params() == life_params
+
+            # a bigger size puts the pattern in the middle.
+            conf = config.generate((40, 30))
+            expected = sim.get_config()
+            xs, ys = np.nonzero(expected)
+            expected = expected[xs.min():xs.max() + 1, ys.min():ys.max() + 1]
+            xs, ys = np.nonzero(conf)
+            assert_arrays_equal(conf[xs.min():xs.max() + 1, ys.min():ys.max() + 1], expected)
+
+            loaded = cagen.GameOfLife(config=config, life_params=config.life_params())
+            assert_arrays_equal(loaded.get_config(), config.generate())
@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+
+from zasim import cagen
+from zasim.features import HAVE_MULTIDIM
+
+from .testutil import assert_arrays_equal
+
+import numpy as np
+import pytest
+
+SETUPS = [
+    (cagen.ElementarySimulator, dict(size=(40,), rule=110)),
+    (cagen.ElementarySimulator, dict(size=(40,), rule=30, copy_borders=False)),
+    (cagen.ElementarySimulator, dict(size=(40,), rule=184, sparse_loop=True, activity=True)),
+    (cagen.GameOfLife, dict(size=(14, 11))),
+    (cagen.GameOfLife, dict(size=(14, 11), copy_borders=False)),
+]
+
+class TestLightCone:
+    def test_matches_stepping(self, setup):
+        sim_class, kwargs = setup
+        if len(kwargs["size"]) == 2 and not HAVE_MULTIDIM:
+            pytest.skip("needs multidim support")
+        sim = sim_class(**kwargs)
+        positions = list(np.ndindex(*kwargs["size"]))
+        for steps in [1, 3, 8]:
+            values = sim.light_cone_values(positions, steps)
+            for i in range(steps):
+                sim.step_pure_py()
+            expected = sim.get_config()
+            assert_arrays_equal(values, np.array([expected[pos] for pos in positions]))
+
+    def test_more_steps_than_cells(self):
+        sim = cagen.ElementarySimulator(size=(9,), rule=90)
+        values = sim.light_cone_values([(0,), (4,)], 20)
+        for i in range(20):
+            sim.step_pure_py()
+        assert list(values) == [sim.get_config()[0], sim.get_config()[4]]
+
+    def test_needs_determinism(self):
+        sim = cagen.ElementarySimulator(size=(20,), rule=110, nondet=0.5)
+        with pytest.raises(ValueError):
+            sim.light_cone_values([(3,)], 4)
+
+def pytest_generate_tests(metafunc):
+    if "setup" in metafunc.funcargnames:
+        for setup in SETUPS:
+            metafunc.addcall(funcargs=dict(setup=setup))
@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+from zasim.display import pngfile
+
+from StringIO import StringIO
+import os
+
+import numpy as np
+import pytest
+
+def pytest_generate_tests(metafunc):
+    if "filter_type" in metafunc.funcargnames:
+        for filter_type in [0, 1, 2, 3, 4, "mixed"]:
+            metafunc.addcall(funcargs=dict(filter_type=filter_type))
+
+class TestPngFile:
+    def test_round_trip(self, filter_type):
+        randomizer = np.random.RandomState(4)
+        for shape in [(23, 31, 3), (1, 7, 3), (9, 1, 3)]:
+            image = randomizer.randint(0, 256, shape).astype(np.uint8)
+            filters = randomizer.randint(0, 5, shape[0]) if filter_type == "mixed" else filter_type
+            stream = StringIO()
+            pngfile.write_png(stream, image, filters)
+            stream.seek(0)
+            assert (pngfile.read_png(stream) == image).all()
+
+    def test_read_rgba(self):
+        filename = os.path.join(os.path.dirname(pngfile.__file__), "..", "idle.png")
+        image = pngfile.read_png(filename)
+        assert image.shape == (175, 175, 3)
+        assert image.dtype == np.uint8
+
+    def test_broken_image(self):
+        stream = StringIO()
+        pngfile.write_png(stream, np.zeros((4, 4, 3)))
+        data = stream.getvalue()
+        with pytest.raises(ValueError):
+            pngfile.read_png(StringIO(data[:30] + "x" + data[31:]))
+        with pytest.raises(ValueError):
+            pngfile.read_png(StringIO("GIF89a" + data))
+
+    def test_colors_to_values(self):
+        palette = {0: 0xff000000, 1: 0xffffffff, 5: 0x00ff0000}
+        colors = pngfile.pack_rgb([[0, 0, 0], [255, 0, 0], [200, 30, 30], [240, 250, 230]])
+        assert pngfile.colors_to_values(colors, palette).tolist() == [0, 5, 1, 1]
+        assert pngfile.colors_to_values(colors, palette, fuzz=True).tolist() == [0, 5, 5, 1]
+        assert pngfile.colors_to_values(colors, palette, fuzz=True, chunk_size=1).tolist() == [0, 5, 5, 1]
+        assert (pngfile.unpack_rgb(colors) == [[0, 0, 0], [255, 0, 0], [200, 30, 30], [240, 250, 230]]).all()
+
+    def test_color_table(self):
+        randomizer = np.random.RandomState(5)
+        for palette in [pngfile.PALETTE_32,
+                        dict((value, 0xff000000 + value * 77) for value in range(0, 300, 3)),
+                        dict((1 << bit, 0xff000000 + bit) for bit in range(29)),
+                        {-5: 0xffff0000, 2: 0xff00ff00}]:
+            keys = sorted(palette)
+            for dtype in [np.int8, np.int32, np.int64, np.uint16]:
+                if dtype != np.int64 and max(keys) > np.iinfo(dtype).max:
+                    continue
+                values = np.array(keys, dtype=np.int64)[randomizer.randint(0, len(keys), (20, 7))]
+                values[0, :3] = [-1, 3 if 3 not in palette else -2, 1000 if 1000 not in palette else -3]
+                values = values.astype(dtype)
+
+                expected = np.array([[palette.get(value, pngfile.ColorTable.missing) for value in row]
+                                     for row in values.tolist()], dtype=np.uint32)
+                assert (pngfile.values_to_colors(values, palette) == expected).all()
+                # non-contiguous views work as well
+                out = np.empty((7, 20), dtype=np.uint32)
+                pngfile.ColorTable(palette).lookup(values.T, out=out)
+                assert (out == expected.T).all()
+
+        colors = pngfile.values_to_colors([[0, 1], [2, 3]])
+        assert pngfile.colors_to_values(colors).tolist() == [[0, 1], [2, 3]]
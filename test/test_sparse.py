@@ -6,6 +6,7 @@ from zasim import config
 
 from .testutil import *
 
+import numpy as np
 import pytest
 
 class TestSparseLoop:
@@ -66,6 +67,109 @@ class TestSparseLoop:
     def test_compare_sparse_elementary_pure(self, rule_num):
         self.body_compare_sparse_elementary(rule_num, False)
 
+    def test_set_config_value_sparse_pure(self, rule_num):
+        conf = cagen.RandomConfiguration().generate((50,))
+        elem_full   = cagen.ElementarySimulator(config=conf, rule=rule_num, activity=True)
+        elem_sparse = cagen.ElementarySimulator(config=conf, rule=rule_num, activity=True,
+                                                sparse_loop=True)
+
+        for i in range(10):
+            elem_full.step_pure_py()
+            elem_sparse.step_pure_py()
+
+        for pos in [(0,), (25,), (49,)]:
+            elem_full.set_config_value(pos)
+            elem_sparse.set_config_value(pos)
+
+        for i in range(10):
+            elem_full.step_pure_py()
+            elem_sparse.step_pure_py()
+
+            assert_arrays_equal(elem_full.get_config(), elem_sparse.get_config())
+
+    def test_skipped_cells_keep_value_pure(self):
+        # rule 51 flips every cell in every step.
+        sim = cagen.ElementarySimulator(size=(30,), rule=51, activity=True,
+                                        nondet=0.5, sparse_loop=True)
+        sim._step_func.random = ZerosThenOnesRandom(30)
+
+        sim.step_pure_py()
+        first = sim.get_config()
+        # from now on, every cell gets skipped.
+        sim.step_pure_py()
+        assert_arrays_equal(sim.get_config(), first)
+        sim.step_pure_py()
+        assert_arrays_equal(sim.get_config(), first)
+
+    def test_set_config_value_enlists_once(self):
+        sim = cagen.ElementarySimulator(size=(30,), rule=110, activity=True, sparse_loop=True)
+        t = sim.t
+        # after creating the simulator every cell is enlisted.
+        assert t.prev_sparse_end[0] == 30
+        assert t.sparse_mask.all()
+
+        t.prev_sparse_list[0] = -1
+        t.prev_sparse_end[0] = 0
+        t.sparse_mask[:] = False
+        sim.set_config_value((10,))
+        sim.set_config_value((11,))
+        sim.set_config_value((0,))
+        enlisted = t.prev_sparse_list[:t.prev_sparse_end[0]].tolist()
+        assert t.prev_sparse_list[t.prev_sparse_end[0]] == -1
+        assert sorted(enlisted) == [0, 1, 9, 10, 11, 12, 29]
+        assert (np.flatnonzero(t.sparse_mask) == sorted(enlisted)).all()
+
+    def body_sparse_weave_changes(self, size, rule):
+        conf = cagen.RandomConfiguration().generate(size)
+        full = cagen.ElementarySimulator(config=conf, rule=rule, activity=True)
+        sparse = cagen.ElementarySimulator(config=conf, rule=rule, activity=True,
+                                           sparse_loop=True)
+        positions = [tuple(entry // 2 for entry in size), (0,) * len(size),
+                     tuple(entry - 1 for entry in size)]
+
+        for i in range(15):
+            full.step_inline()
+            sparse.step_inline()
+            assert_arrays_equal(full.get_config(), sparse.get_config())
+            if i % 4 == 1:
+                # the C code has to pick up cells enlisted between steps.
+                for pos in positions:
+                    full.set_config_value(pos)
+                    sparse.set_config_value(pos)
+
+    @pytest.mark.skipif("not HAVE_WEAVE")
+    def test_sparse_weave_changes_1d(self, rule_num):
+        self.body_sparse_weave_changes((60,), rule_num)
+
+    @pytest.mark.skipif("not HAVE_MULTIDIM")
+    @pytest.mark.skipif("not HAVE_WEAVE")
+    def test_sparse_weave_changes_2d(self):
+        self.body_sparse_weave_changes((13, 17), 1515361445)
+
+    def body_nondet_sparse_weave(self, size, rule):
+        sim = cagen.ElementarySimulator(size=size, rule=rule, activity=True,
+                                        nondet=0.5, sparse_loop=True)
+        for i in range(15):
+            before = sim.get_config()
+            sim.step_inline()
+            after = sim.get_config()
+            full = cagen.ElementarySimulator(config=before, rule=rule)
+            full.step_inline()
+            # every cell either got computed or kept its value; none may
+            # fall back to a value from an older step.
+            assert ((after == before) | (after == full.get_config())).all()
+            if i == 5:
+                sim.set_config_value((0,) * len(size))
+
+    @pytest.mark.skipif("not HAVE_WEAVE")
+    def test_nondet_sparse_weave_1d(self):
+        self.body_nondet_sparse_weave((40,), 110)
+
+    @pytest.mark.skipif("not HAVE_MULTIDIM")
+    @pytest.mark.skipif("not HAVE_WEAVE")
+    def test_nondet_sparse_weave_2d(self):
+        self.body_nondet_sparse_weave((11, 9), 1515361445)
+
 def pytest_generate_tests(metafunc):
     if "rule_num" in metafunc.funcargnames:
         for i in INTERESTING_BINRULES:
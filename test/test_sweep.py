@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+
+from zasim import sweep
+
+import numpy as np
+import pytest
+
+def sorted_rows(results):
+    order = np.lexsort([results[name] for name, _ in reversed(sweep.PARAMETER_COLUMNS)])
+    return dict((name, values[order]) for name, values in results.iteritems())
+
+class TestSweep:
+    def test_grid(self):
+        grid = list(sweep.parameter_grid([30, 110], nondet=[1, 0.5], beta=[1, 0.5],
+                                         sizes=[(20,), (10, 10)], seeds=[0, 1]))
+        # nondet and beta can't both be used at the same time.
+        assert len(grid) == 2 * 3 * 2 * 2
+        assert dict(rule=110, nondet=1, beta=0.5, width=10, height=10, seed=1) in grid
+
+    def test_reused_simulator_gives_same_result(self):
+        task = (dict(rule=110, nondet=0.5, beta=1, width=30, height=0, seed=3),
+                20, 2, ["final_density", "mean_activity", "frozen_step"])
+        other = (dict(rule=30, nondet=0.5, beta=1, width=30, height=0, seed=4),
+                 20, 2, ["final_density", "mean_activity", "frozen_step"])
+
+        sweep._simulators.clear()
+        first = sweep.run_one(task)
+        sweep.run_one(other)
+        assert len(sweep._simulators) == 1
+        assert sweep.run_one(task) == first
+
+    def test_resume(self, tmpdir):
+        directory = str(tmpdir.join("sweep"))
+        kwargs = dict(rules=[30, 90], nondet=[1, 0.7], sizes=[(30,)], steps=10,
+                      metrics=["final_density", "mean_activity"], processes=1)
+
+        results = sweep.run_sweep(directory, seeds=[0, 1], **kwargs)
+        assert len(results["rule"]) == 8
+
+        calls = []
+        results = sweep.run_sweep(directory, seeds=[0, 1, 2],
+                                  progress=lambda done, total: calls.append((done, total)), **kwargs)
+        assert len(results["rule"]) == 12
+        assert calls == [(9, 12), (10, 12), (11, 12), (12, 12)]
+        assert sorted(results["seed"].tolist()) == [0] * 4 + [1] * 4 + [2] * 4
+
+        with pytest.raises(ValueError):
+            sweep.run_sweep(directory, seeds=[0], **dict(kwargs, steps=20))
+
+    def test_cut_off_partial_row(self, tmpdir):
+        directory = str(tmpdir.join("store"))
+        store = sweep.ColumnStore(directory, [("a", "int64"), ("b", "float64")])
+        store.append(dict(a=1, b=0.5))
+        store.append(dict(a=2, b=1.5))
+        store.close()
+        with open(str(tmpdir.join("store", "a.col")), "ab") as colfile:
+            colfile.write(np.array([3], dtype="int64").tostring())
+
+        store = sweep.ColumnStore(directory)
+        assert len(store) == 2
+        store.append(dict(a=4, b=2.5))
+        results = store.load()
+        store.close()
+        assert results["a"].tolist() == [1, 2, 4]
+        assert results["b"].tolist() == [0.5, 1.5, 2.5]
+
+    def test_processes(self, tmpdir):
+        kwargs = dict(rules=[30, 54, 110], beta=[1, 0.8], sizes=[(20,), (8, 8)],
+                      seeds=[0, 1], steps=5, metrics=["mean_density", "final_activity"])
+        single = sweep.run_sweep(str(tmpdir.join("single")), processes=1, **kwargs)
+        multi = sweep.run_sweep(str(tmpdir.join("multi")), processes=2, **kwargs)
+
+        single = sorted_rows(single)
+        multi = sorted_rows(multi)
+        for name in single:
+            assert single[name].tolist() == multi[name].tolist()
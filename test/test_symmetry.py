@@ -0,0 +1,75 @@
+from zasim import elementarytools
+from zasim.symmetry import SymmetryGroup, symmetry_group
+from zasim.cagen import VonNeumannNeighbourhood, MooreNeighbourhood, ElementaryFlatNeighbourhood
+from zasim.cagen.utils import rule_nr_to_rule_arr, rule_arr_to_rule_nr
+
+import numpy as np
+import pytest
+
+def minimize_by_search(neighbourhood, number, base=2):
+    """Find the lowest equivalent number by applying the actions over and
+    over again, like minimize_rule_number used to."""
+    digits = len(neighbourhood.offsets)
+    start = tuple(rule_nr_to_rule_arr(number, digits, base))
+    seen = set([start])
+    todo = [start]
+    for table in todo:
+        for name, action in elementarytools.neighbourhood_actions.iteritems():
+            try:
+                new = tuple(action(neighbourhood, list(table), base=base))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if new not in seen:
+                seen.add(new)
+                todo.append(new)
+    return min(rule_arr_to_rule_nr(table, base) for table in seen), len(seen)
+
+def pytest_generate_tests(metafunc):
+    if "neighbourhood" in metafunc.funcargnames:
+        for neigh in [VonNeumannNeighbourhood, ElementaryFlatNeighbourhood]:
+            for base in [2, 3]:
+                metafunc.addcall(funcargs=dict(neighbourhood=neigh(), base=base))
+
+class TestSymmetry:
+    def test_canonical_matches_search(self, neighbourhood, base):
+        group = SymmetryGroup(neighbourhood, base)
+        randomizer = np.random.RandomState(7)
+        tables = randomizer.randint(0, base, (50, base ** len(neighbourhood.offsets)))
+        numbers = group.numbers(tables)
+        canonical = group.canonical_numbers(numbers)
+        for number, result in zip(numbers, canonical):
+            lowest, orbit_size = minimize_by_search(neighbourhood, number, base)
+            assert result == lowest
+            assert len(group.orbit_numbers(number)) == orbit_size
+
+    def test_canonical_is_invariant(self, neighbourhood, base):
+        group = symmetry_group(neighbourhood, base)
+        randomizer = np.random.RandomState(3)
+        tables = randomizer.randint(0, base, (20, group.size))
+        canonical, elements = group.canonical_tables(tables)
+        # every member of an orbit has the same canonical form
+        for table, result in zip(tables, canonical):
+            orbit = group.orbits(table)[0]
+            again, _ = group.canonical_tables(orbit)
+            assert (again == result).all()
+        # the element found creates the canonical form
+        orbits = group.orbits(tables)
+        assert (orbits[np.arange(len(tables)), elements] == canonical).all()
+
+    def test_minimize_rule_number(self):
+        neigh = VonNeumannNeighbourhood()
+        lowest, (route, rule_arr), everything = elementarytools.minimize_rule_number(neigh, 2 ** 16)
+        assert lowest == 2
+        assert len(route) > 0
+        assert elementarytools.digits_and_values_to_rule_nr(list(rule_arr)) == 2
+        assert set(everything) >= set([2, 4, 256, 65536])
+        assert all(num not in everything for num in [16])
+
+    def test_moore_batch(self):
+        group = symmetry_group(MooreNeighbourhood())
+        assert len(group) == 16
+        tables = np.random.RandomState(1).randint(0, 2, (1000, 512))
+        canonical, _ = group.canonical_tables(tables)
+        assert canonical.shape == tables.shape
+        numbers = group.numbers(canonical)
+        assert all(result <= original for result, original in zip(numbers, group.numbers(tables)))
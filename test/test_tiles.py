@@ -0,0 +1,47 @@
+from __future__ import absolute_import
+
+from zasim.display.tiles import TileSet
+
+import numpy as np
+
+def pytest_generate_tests(metafunc):
+    if "shape" in metafunc.funcargnames:
+        for shape in [(17,), (9, 13), (1, 1)]:
+            metafunc.addcall(funcargs=dict(shape=shape))
+
+def slow_render(tile_set, states):
+    """Put the tiles together one cell after the other."""
+    tiles = dict(zip(tile_set.index.palette.keys(), tile_set.tiles))
+    return np.vstack([np.hstack([tiles.get(states[x, y], tile_set.tiles[-1])
+                                 for x in range(states.shape[0])])
+                      for y in range(states.shape[1])])
+
+class TestTiles:
+    def setup_method(self, method):
+        randomizer = np.random.RandomState(11)
+        values = [0, 1, 2, 5, 1024, 2048]
+        self.tile_set = TileSet(randomizer.randint(0, 2 ** 24, (len(values), 4, 3)), values)
+        self.states = randomizer.choice(values + [3], 40 * 30).reshape((40, 30))
+
+    def test_render(self, shape):
+        states = self.states[:shape[0], :shape[1] if len(shape) > 1 else 1]
+        reference = slow_render(self.tile_set, states)
+        frame = self.tile_set.render(states.reshape(shape))
+        assert frame.shape == (states.shape[1] * 4, states.shape[0] * 3)
+        assert (frame == reference).all()
+
+    def test_render_region(self):
+        reference = slow_render(self.tile_set, self.states)
+        frame = self.tile_set.render(self.states, (5, 7, 10, 8))
+        assert (frame == reference[7 * 4:15 * 4, 5 * 3:15 * 3]).all()
+
+    def test_render_reuses_buffer(self):
+        buf = np.zeros(40 * 30 * 4 * 3 + 5, dtype=np.uint32)
+        frame = self.tile_set.render(self.states, (0, 0, 6, 6), out=buf)
+        assert frame.base is not None
+        assert (buf[:6 * 6 * 4 * 3] == frame.ravel()).all()
+        assert (buf[6 * 6 * 4 * 3:] == 0).all()
+
+    def test_missing_tile(self):
+        frame = self.tile_set.render(np.array([[3]]))
+        assert (frame == TileSet.missing).all()
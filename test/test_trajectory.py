@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+
+from zasim import cagen
+from zasim.trajectory import TrajectoryWriter, TrajectoryReader
+from zasim.features import HAVE_MULTIDIM
+
+from .testutil import assert_arrays_equal
+
+import numpy as np
+import pytest
+
+class TestTrajectory:
+    def record(self, filename, size, steps, **kwargs):
+        sim = cagen.ElementarySimulator(size=size, rule=110, nondet=0.8)
+        writer = TrajectoryWriter(filename, sim, **kwargs)
+        configs = [sim.get_config()]
+        for i in range(steps):
+            sim.step_pure_py()
+            configs.append(sim.get_config())
+        return writer, configs
+
+    def test_read_back(self, size, tmpdir):
+        if len(size) == 2 and not HAVE_MULTIDIM:
+            pytest.skip("needs multidim support")
+        filename = str(tmpdir.join("run.trj"))
+        writer, configs = self.record(filename, size, 40, keyframe_interval=16)
+        writer.close()
+
+        reader = TrajectoryReader(filename)
+        assert len(reader) == 41
+        assert reader.shape == size
+        assert list(reader.steps) == range(41)
+
+        for record in [0, 15, 16, 17, 40, 33, 2]:
+            assert_arrays_equal(reader[record], configs[record])
+        assert_arrays_equal(reader.get_step(23), configs[23])
+        assert_arrays_equal(reader[-1], configs[-1])
+        with pytest.raises(IndexError):
+            reader.get_step(41)
+
+        for config, expected in zip(reader, configs):
+            assert_arrays_equal(config, expected)
+
+        region = (slice(3, 9),) + (slice(2, 5),) * (len(size) - 1)
+        spacetime = reader.spacetime(10, 30, region)
+        assert spacetime.shape[0] == 20
+        for config, expected in zip(spacetime, configs[10:30]):
+            assert_arrays_equal(config, expected[region])
+        reader.close()
+
+    def test_unfinished_file(self, tmpdir):
+        filename = str(tmpdir.join("crashed.trj"))
+        writer, configs = self.record(filename, (30,), 20, keyframe_interval=8)
+        writer._file.flush()
+
+        reader = TrajectoryReader(filename)
+        assert len(reader) == 21
+        assert_arrays_equal(reader[19], configs[19])
+        reader.close()
+        writer.close()
+
+    def test_deltas_are_small(self, tmpdir):
+        filename = str(tmpdir.join("still.trj"))
+        config = np.zeros(1000, dtype=int)
+        with TrajectoryWriter(filename, keyframe_interval=100) as writer:
+            for step in range(100):
+                writer.write(config, step)
+        reader = TrajectoryReader(filename)
+        assert reader._index["length"][1:].max() < config.nbytes / 20
+        reader.close()
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.funcargnames:
+        for size in [(50,), (20, 15)]:
+            metafunc.addcall(funcargs=dict(size=size))
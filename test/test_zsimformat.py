@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+
+from zasim import cagen, zsimformat
+from zasim.features import HAVE_MULTIDIM
+
+from .testutil import assert_arrays_equal
+
+import numpy as np
+import pytest
+
+SETUPS = [
+    dict(size=(30,), rule=110),
+    dict(size=(30,), rule=30, beta=0.5, histogram=True),
+    dict(size=(30,), rule=184, nondet=0.7, sparse_loop=True, activity=True),
+    dict(size=(30,), rule=184, sparse_loop=True, activity=True),
+    dict(size=(25,), rule=1234, base=3, copy_borders=False),
+    dict(size=(15, 12), rule=1515361445, nondet=0.5, histogram=True),
+    dict(size=(15, 12), rule=1515361445, sparse_loop=True, activity=True),
+]
+
+def pytest_generate_tests(metafunc):
+    if "setup" in metafunc.funcargnames:
+        for setup in SETUPS:
+            metafunc.addcall(funcargs=dict(setup=setup))
+
+class TestZsimFormat:
+    def test_save_load(self, setup, tmpdir):
+        if len(setup["size"]) == 2 and not HAVE_MULTIDIM:
+            pytest.skip("needs multidim support")
+        filename = str(tmpdir.join("sim.zsim"))
+
+        sim = cagen.ElementarySimulator(**setup)
+        for i in range(4):
+            sim.step_pure_py()
+        zsimformat.save_simulator(filename, sim)
+
+        header = zsimformat.read_header(filename)
+        assert header["shape"] == setup["size"]
+        assert header["packed"] == (setup.get("base", 2) == 2)
+
+        loaded = zsimformat.load_simulator(filename)
+        assert loaded.step_number == 4
+        assert loaded.rule_number == sim.rule_number
+        assert type(loaded._step_func.loop) is type(sim._step_func.loop)
+        assert str(loaded._step_func) == str(sim._step_func)
+        assert_arrays_equal(loaded.get_config(), sim.get_config())
+        if setup.get("nondet", 1) == 1 and setup.get("beta", 1) == 1:
+            for i in range(3):
+                sim.step_pure_py()
+                loaded.step_pure_py()
+                assert_arrays_equal(loaded.get_config(), sim.get_config())
+
+    def test_game_of_life(self, tmpdir):
+        if not HAVE_MULTIDIM:
+            pytest.skip("needs multidim support")
+        filename = str(tmpdir.join("life.zsim"))
+        sim = cagen.GameOfLife(size=(20, 20), life_params=dict(reproduce_min=2))
+        sim.step_pure_py()
+        zsimformat.save_simulator(filename, sim)
+
+        loaded = zsimformat.load_simulator(filename)
+        for i in range(3):
+            sim.step_pure_py()
+            loaded.step_pure_py()
+            assert_arrays_equal(loaded.get_config(), sim.get_config())
+
+    def test_configuration(self, tmpdir):
+        filename = str(tmpdir.join("conf.zsim"))
+        conf = np.random.RandomState(3).randint(0, 2, (37, 11)).astype(np.int32)
+        for packed in [False, True]:
+            zsimformat.write_zsim(filename, conf, dict(base=2), packed=packed)
+            header, payload = zsimformat.read_payload(filename)
+            assert header["packed"] == packed
+            assert isinstance(payload, np.memmap) != packed
+
+            loaded = zsimformat.ZsimConfiguration(filename)
+            assert loaded.header["shape"] == (37, 11)
+            assert_arrays_equal(loaded.generate(), conf)
+            assert loaded.generate(dtype=np.uint8).dtype == np.uint8
+
+            # the file is mapped copy-on-write
+            loaded.generate()[:] = 5
+            assert_arrays_equal(loaded.generate(), conf)
+
+    def test_errors(self, tmpdir):
+        filename = str(tmpdir.join("conf.zsim"))
+        with pytest.raises(ValueError):
+            zsimformat.write_zsim(filename, np.arange(10), packed=True)
+        zsimformat.write_zsim(filename, np.arange(10))
+        with pytest.raises(ValueError):
+            zsimformat.load_simulator(filename)
+
+        tmpdir.join("other.zsim").write("\x93NUMPY", mode="wb")
+        with pytest.raises(ValueError):
+            zsimformat.read_header(str(tmpdir.join("other.zsim")))
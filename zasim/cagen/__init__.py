@@ -32,6 +32,7 @@ from .stepfunc import *
 from .target import *
 from .compatibility import *
 from .dualrule import *
+from .ensemble import *
 
 def categories():
     """Returns a dictionary mapping categories to known classes."""
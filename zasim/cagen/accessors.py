@@ -7,6 +7,8 @@
 from .bases import StateAccessor
 from .utils import gen_offset_pos, offset_pos
 
+import numpy as np
+
 class SimpleStateAccessor(StateAccessor):
     """The SimpleStateAccessor offers a base for classes that just linearly
     grant access to any-dimensional configuration space."""
@@ -119,8 +121,29 @@ class SimpleStateAccessor(StateAccessor):
                 self.target.cconf, self.target.nconf
 
     def multiplicate_config(self):
-        """Copy cconf to nconf in the target."""
-        self.target.nconf = self.target.cconf.copy()
+        """Copy cconf to nconf in the target.
+
+        If the target already has an nconf of the same shape and dtype, its
+        buffer is reused instead of allocating a new array."""
+        cconf = self.target.cconf
+        nconf = getattr(self.target, "nconf", None)
+        if (nconf is not None and nconf.shape == cconf.shape and
+                nconf.dtype == cconf.dtype and
+                not np.may_share_memory(nconf, cconf)):
+            nconf[...] = cconf
+        else:
+            self.target.nconf = cconf.copy()
+
+    def config_value_changed(self, pos):
+        """Copy the changed cell over to nconf as well.
+
+        Loops that don't visit every cell in every step rely on nconf, which
+        holds the configuration from two steps ago, being up to date for all
+        cells they skip. That way, only the changed cell has to be copied
+        instead of the whole array."""
+        super(SimpleStateAccessor, self).config_value_changed(pos)
+        pos = offset_pos(pos, self.border[0])
+        self.target.nconf[pos] = self.target.cconf[pos]
 
     def gen_copy_code(self):
         """Generate a bit of C code to copy the current field over from the old
@@ -203,6 +226,13 @@ class SubcellAccessor(SimpleStateAccessor):
             cconf = getattr(self.target, "cconf_%s" % k)
             setattr(self.target, "nconf_%s" % k, cconf.copy())
 
+    def config_value_changed(self, pos):
+        """Copy the changed cell over to the nconf of every subcell."""
+        pos = offset_pos(pos, self.border[0])
+        for cell in self.cells:
+            nconf = getattr(self.target, "nconf_%s" % cell)
+            nconf[pos] = getattr(self.target, "cconf_%s" % cell)[pos]
+
     def swap_configs(self):
         for cell in self.cells:
             nconf = getattr(self.target, "nconf_%s" % cell)
@@ -58,6 +58,12 @@ class StepFuncVisitor(object):
         it only changes the current configuration "cconf" of the automaton.
         after all new_config hooks have been run, they are multiplied."""
 
+    def config_value_changed(self, pos):
+        """React to a single cell of the current configuration "cconf" having
+        been written to between two steps, for instance by the user.
+
+        :param pos: The position of the cell, not including the borders."""
+
     def build_name(self, parts):
         """Add text to the name of the StepFunc for easy identification of
         what's going on."""
@@ -63,7 +63,7 @@ class BorderSizeEnsurer(BorderHandler):
 #=======
             (left,), (right,) = self.code.acc.border_names
             new_conf = np.zeros(shape[0] + borders[left] + borders[right], dtype)
-            new_conf[borders[left]:-borders[right]] = array
+            new_conf[borders[left]:new_conf.shape[0]-borders[right]] = array
         elif dims == 2:
             # TODO figure out how to create slice objects in a general way.
             (left,up), (right,down) = self.code.acc.border_names
@@ -113,7 +113,16 @@ class BaseBorderCopier(BorderSizeEnsurer):
         """Runs the retargetted version of the border copy code created in
         :meth:`visit`."""
         super(BaseBorderCopier, self).new_config()
+        self.copy_current_borders()
 
+    def config_value_changed(self, pos):
+        """Refresh the borders, as the changed cell may have been copied over
+        to the other side."""
+        super(BaseBorderCopier, self).config_value_changed(pos)
+        self.copy_current_borders()
+
+    def copy_current_borders(self):
+        """Run the border copy code on the current config "cconf"."""
         retargetted = "\n".join(self.copy_py_code)
         retargetted = retargetted.replace("self.", "self.code.")
         retargetted = retargetted.replace("write_to(", "write_to_current(")
@@ -7,16 +7,15 @@
 
 from __future__ import print_function
 
-from random import randrange
 from .bases import Computation
-from .utils import elementary_digits_and_values, rule_nr_to_multidim_rule_arr
+from .utils import elementary_digits_and_values, rule_nr_to_multidim_rule_arr, make_rule_arr, rule_arr_to_rule_nr
 from .compatibility import no_weave_code, no_python_code
 
 import new
 import re
 import sys
 
-#import numpy as np
+import numpy as np
 
 class ElementaryCellularAutomatonBase(Computation):
     """Infer a 'Gödel numbering' from the used `Neighbourhood` and
@@ -25,10 +24,8 @@ class ElementaryCellularAutomatonBase(Computation):
 
     This works with any number of dimensions."""
 
-    rule = 0
-    """The elementary cellular automaton rule to use.
-
-    See :meth:`visit` for details on how it's used."""
+    _rule = None
+    _rule_arr = None
 
     digits_and_values = []
     """This list stores a list of dictionaries that for each combination of
@@ -38,10 +35,49 @@ class ElementaryCellularAutomatonBase(Computation):
     def __init__(self, rule=None, **kwargs):
         """Create the computation.
 
-        Supply None as the rule to get a random one."""
+        :param rule: The rule number or the lookup array of the rule, either
+                     flat, like :func:`rule_nr_to_rule_arr` creates it, or
+                     with one axis per neighbour, like
+                     :func:`rule_nr_to_multidim_rule_arr` creates it.
+                     Supply None to get a random one."""
         super(ElementaryCellularAutomatonBase, self).__init__(**kwargs)
         self.rule = rule
 
+    @property
+    def rule(self):
+        """The elementary cellular automaton rule to use.
+
+        If the rule was given as a lookup array or drawn randomly, the rule
+        number is only calculated when it's first needed.
+
+        See :meth:`visit` for details on how it's used."""
+        if self._rule is None or isinstance(self._rule, np.ndarray):
+            if self._rule_arr is not None:
+                self._rule = rule_arr_to_rule_nr(self._rule_arr, self.base)
+            elif self._rule is not None and self._rule.ndim > 1:
+                self._rule = rule_arr_to_rule_nr(self._rule, self._rule.shape[0])
+            elif self._rule is not None:
+                raise ValueError("The base of a flat rule table is only known once the "
+                                 "computation is part of a step function.")
+        return self._rule
+
+    @rule.setter
+    def rule(self, rule):
+        if rule is not None and not isinstance(rule, (int, long, np.integer)):
+            rule = np.asarray(rule)
+        self._rule = rule
+        self._rule_arr = None
+
+    def prepare_rule_arr(self, digits, base):
+        """Create the flat lookup array for the rule with the given number
+        of neighbours and base, drawing a random rule if none was given."""
+        self.digits = digits
+        self.base = base
+        if isinstance(self._rule, (int, long, np.integer)) and self._rule >= base ** (base ** digits):
+            self._rule = self._rule % (base ** (base ** digits))
+        self._rule_arr = make_rule_arr(self._rule, digits, base)
+        return self._rule_arr
+
     def visit(self):
         """Get the rule'th cellular automaton for the given neighbourhood.
 
@@ -63,11 +99,7 @@ class ElementaryCellularAutomatonBase(Computation):
         # all the way up to base-1.
         assert self.code.possible_values == tuple(range(self.base))
 
-        if self.rule is None:
-            self.rule = randrange(0, self.base ** (self.base ** self.digits))
-
-        if self.rule >= self.base ** (self.base ** self.digits):
-            self.rule = self.rule % (self.base ** (self.base ** self.digits))
+        self.prepare_rule_arr(self.digits, self.base)
 
         compute_code = []
         compute_py = []
@@ -84,9 +116,7 @@ class ElementaryCellularAutomatonBase(Computation):
     def init_once(self):
         """Generate the rule lookup array and a pretty printer."""
         super(ElementaryCellularAutomatonBase, self).init_once()
-        rule = self.rule
-
-        self.target.rule = rule_nr_to_multidim_rule_arr(rule, self.digits, self.base)
+        self.target.rule = self._rule_arr.reshape((self.base,) * self.digits).copy()
 
         # and now do some heavy work to generate a pretty-printer!
         bbox = self.code.neigh.bounding_box()
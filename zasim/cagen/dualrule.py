@@ -6,11 +6,9 @@
 # See LICENSE.txt for details.
 
 from .bases import Computation
-from .utils import elementary_digits_and_values, rule_nr_to_rule_arr
+from .utils import elementary_digits_and_values, rule_nr_to_rule_arr, make_rule_arr, rule_arr_to_rule_nr
 from .compatibility import random_generator
 
-from random import randrange
-
 import numpy as np
 import new
 
@@ -20,10 +18,6 @@ class DualRuleCellularAutomaton(Computation):
 
     Everything else works just like the `ElementaryCellularAutomatonBase`."""
 
-    rule_a = 0
-    """The elementary rule to use with probability `alpha`."""
-    rule_b = 0
-    """The elementary rule to use with probability 1 - `alpha`."""
     alpha = 0.5
     """The probability for which to use rule_a rather than rule_b."""
 
@@ -39,12 +33,34 @@ class DualRuleCellularAutomaton(Computation):
     def __init__(self, rule_a=None, rule_b=None, alpha=0.5, **kwargs):
         """Create the computation.
 
+        The rules can be given as rule numbers or as flat lookup arrays.
         Supply None as either rule to get a random one."""
         super(DualRuleCellularAutomaton, self).__init__(**kwargs)
-        self.rule_a = rule_a
-        self.rule_b = rule_b
+        self._rules = dict(a=rule_a, b=rule_b)
+        self._rule_arrs = dict(a=None, b=None)
         self.alpha  = alpha
 
+    def _rule_nr(self, which):
+        if self._rules[which] is None or not isinstance(self._rules[which], (int, long, np.integer)):
+            if self._rule_arrs[which] is None:
+                raise ValueError("The rule number of a random rule or a rule table is "
+                                 "only known once the computation is part of a step function.")
+            self._rules[which] = rule_arr_to_rule_nr(self._rule_arrs[which], self.base)
+        return self._rules[which]
+
+    @property
+    def rule_a(self):
+        """The elementary rule to use with probability `alpha`.
+
+        If the rule was given as a lookup array or drawn randomly, the rule
+        number is only calculated when it's first needed."""
+        return self._rule_nr("a")
+
+    @property
+    def rule_b(self):
+        """The elementary rule to use with probability 1 - `alpha`."""
+        return self._rule_nr("b")
+
     def visit(self):
         """Get the rule_a'th and rule_b'th cellular automaton for the
         given neighbourhood.
@@ -62,16 +78,10 @@ class DualRuleCellularAutomaton(Computation):
         # all the way up to base-1.
         assert self.code.possible_values == tuple(range(self.base))
 
-        if self.rule_a is None:
-            self.rule_a = randrange(0, self.base ** (self.base ** self.digits))
-
-        if self.rule_b is None:
-            self.rule_b = randrange(0, self.base ** (self.base ** self.digits))
-
-        if self.rule_a >= self.base ** (self.base ** self.digits):
-            self.rule_a = self.rule_a % (self.base ** (self.base ** self.digits))
-        if self.rule_b >= self.base ** (self.base ** self.digits):
-            self.rule_b = self.rule_b % (self.base ** (self.base ** self.digits))
+        for which, rule in self._rules.items():
+            if isinstance(rule, (int, long, np.integer)) and rule >= self.base ** (self.base ** self.digits):
+                self._rules[which] = rule % (self.base ** (self.base ** self.digits))
+            self._rule_arrs[which] = make_rule_arr(self._rules[which], self.digits, self.base)
 
         compute_code = ["result = 0;"]
         compute_py = ["result = 0"]
@@ -108,14 +118,8 @@ else:
     def init_once(self):
         """Generate the rule lookup arrays and a pretty printer."""
         super(DualRuleCellularAutomaton, self).init_once()
-        entries = self.base ** self.digits
-        self.target.rule_a = np.zeros(entries, np.dtype("i"))
-        self.target.rule_b = np.zeros(entries, np.dtype("i"))
-        rule_a = self.rule_a
-        rule_b = self.rule_b
-
-        self.target.rule_a = np.array(rule_nr_to_rule_arr(rule_a, self.digits, self.base))
-        self.target.rule_b = np.array(rule_nr_to_rule_arr(rule_b, self.digits, self.base))
+        self.target.rule_a = self._rule_arrs["a"].copy()
+        self.target.rule_b = self._rule_arrs["b"].copy()
 
         # and now do some heavy work to generate a pretty-printer!
         bbox = self.code.neigh.bounding_box()
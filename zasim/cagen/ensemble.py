@@ -0,0 +1,467 @@
+"""This module steps a whole ensemble of configurations at once.
+
+Instead of creating one `StepFunc` with its own generated code for every
+initial configuration, an `EnsembleTarget` holds all configurations in one
+array, whose first axis is the member of the ensemble. The
+`EnsembleStepFunc` copies the borders of every member and reads the
+neighbourhood as shifted slices of that array, so that the computation for
+all cells of all members happens in a few numpy operations.
+
+Only the computations, that can be expressed as whole-array operations, are
+supported: `ElementaryCellularAutomatonBase`, which looks the result up in
+its rule array, and `LifeCellularAutomatonBase`, which counts the nonzero
+neighbours.
+
+The histogram and activity stats come out as two-dimensional arrays with
+one row per member. The damage stat compares every member to the first
+one, which is what the `DamageSpreading` simulator uses to follow how a
+small perturbation spreads.
+
+.. testsetup::
+
+    from zasim.cagen.ensemble import *
+
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+from .computations import ElementaryCellularAutomatonBase, LifeCellularAutomatonBase
+from .neighbourhoods import ElementaryFlatNeighbourhood, VonNeumannNeighbourhood, MooreNeighbourhood
+
+from ..config import BaseConfiguration, default_dtype
+from ..simulator import SimulatorInterface, TargetProxy
+
+import inspect
+import numpy as np
+
+def compute_array(computation, neigh, conf, borders, size, rule=None):
+    """Compute the next values of many cells at once.
+
+    :param computation: An `ElementaryCellularAutomatonBase` or a
+                        `LifeCellularAutomatonBase` instance.
+    :param neigh: The `Neighbourhood` to read the cells with.
+    :param conf: The array to read from. Its first axis is not part of the
+                 cellular space, every entry along it is computed separately.
+    :param borders: The number of cells to skip at the low and high end of
+                    every other axis, as a list of tuples. Those have to be
+                    at least as wide as the bounding box of the neighbourhood.
+    :param size: The number of cells to compute along every other axis.
+    :param rule: The rule array for an `ElementaryCellularAutomatonBase`.
+    :returns: An array with the first axis of conf and the given size."""
+    def neighbour(offset):
+        return conf[(slice(None),) + tuple(slice(low + off, low + off + length)
+                    for (low, high), off, length in zip(borders, offset, size))]
+
+    values = [neighbour(offset) for offset in neigh.offsets]
+    if isinstance(computation, ElementaryCellularAutomatonBase):
+        return rule[tuple(values)]
+    elif isinstance(computation, LifeCellularAutomatonBase):
+        params = computation.params
+        center = values.pop(neigh.offsets.index(tuple([0] * len(size))))
+        count = sum((value != 0).astype(np.int8) for value in values)
+        reproduce = (params["reproduce_min"] <= count) & (count <= params["reproduce_max"])
+        stay = (params["stay_alive_min"] <= count) & (count <= params["stay_alive_max"])
+        return np.where(center == 0, reproduce, np.where(stay, center, 0)).astype(conf.dtype)
+    raise TypeError("Can't compute %s on whole arrays." % (computation.__class__.__name__))
+
+class EnsembleTarget(object):
+    """The EnsembleTarget holds the configurations of all members of an
+    ensemble in one array with the member as the first axis."""
+
+    cconf = None
+    """The current configurations, including the borders."""
+
+    nconf = None
+    """The array the next configurations are written to."""
+
+    possible_values = (0, 1)
+    """What values the cells can have."""
+
+    def __init__(self, size=None, members=None, config=None, base=2, random_seed=None):
+        """:param size: The size of the configuration of each member.
+        :param members: How many configurations to create.
+        :param config: Optionally an array with the configurations, that has
+                       the member as its first axis, or a configuration
+                       generator, that is called once for each member.
+        :param base: The base of possible values for the target.
+        :param random_seed: The seed for the random configurations that are
+                            created if no config is supplied."""
+        self.possible_values = tuple(range(base))
+        if config is None:
+            config = np.random.RandomState(random_seed).randint(
+                    0, base, (members,) + tuple(size)).astype(default_dtype)
+        elif isinstance(config, BaseConfiguration):
+            config = np.array([config.generate(size_hint=size) for member in range(members)])
+        self.size = config.shape[1:]
+        self.members = config.shape[0]
+        self.config = config
+
+class EnsembleStepFunc(object):
+    """Step all members of an `EnsembleTarget` at once."""
+
+    def __init__(self, target, computation, neighbourhood=None, copy_borders=True,
+                 nondet=1, histogram=False, activity=False, damage=False,
+                 shared_random=False, random_seed=None):
+        """:param target: The `EnsembleTarget` to work on.
+        :param computation: An `ElementaryCellularAutomatonBase` or a
+                            `LifeCellularAutomatonBase` instance.
+        :param neighbourhood: The neighbourhood to use. Defaults to the
+                              same neighbourhoods `automatic_stepfunc` uses.
+        :param copy_borders: Copy over data from the other side? Otherwise,
+                             the borders stay zero.
+        :param nondet: The probability for each cell to get executed.
+        :param histogram: Keep a histogram for each member?
+        :param activity: Count the changed cells of each member?
+        :param damage: Keep track of the cells that differ from the first
+                       member? This creates the stat `damage`, that holds
+                       for each member the number of differing cells and
+                       the bounding box around them, as the lowest and
+                       highest index along each axis. The bounding box is
+                       -1 if there is no difference.
+        :param shared_random: Use the same random numbers for every member,
+                              so that the same cells get executed in all of
+                              them.
+        :param random_seed: The seed for the nondeterministic execution."""
+        self.target = target
+        dims = len(target.size)
+
+        if neighbourhood is None:
+            neighbourhood = ElementaryFlatNeighbourhood if dims == 1 else VonNeumannNeighbourhood
+        if inspect.isfunction(neighbourhood):
+            neighbourhood = neighbourhood()
+        self.neigh = neighbourhood
+        if len(self.neigh.offsets[0]) != dims:
+            raise ValueError("The neighbourhood has %d dimensions, the configurations %d."
+                             % (len(self.neigh.offsets[0]), dims))
+
+        self.borders = [(max(0, -low), max(0, high)) for low, high in self.neigh.bounding_box()]
+        for (low, high), length in zip(self.borders, target.size):
+            if copy_borders and max(low, high) > length:
+                raise ValueError("The configurations are too small for the neighbourhood.")
+        self.copy_borders = copy_borders
+
+        self.computation = computation
+        self.attrs = []
+        if isinstance(computation, ElementaryCellularAutomatonBase):
+            base = len(target.possible_values)
+            digits = len(self.neigh.offsets)
+            target.rule = computation.prepare_rule_arr(digits, base).reshape((base,) * digits)
+            self.attrs.append("rule")
+        elif isinstance(computation, LifeCellularAutomatonBase):
+            center = tuple([0] * dims)
+            if center not in self.neigh.offsets:
+                raise ValueError("Need a neighbourhood with a zero offset")
+            computation.params.setdefault("central_name",
+                                          self.neigh.names[self.neigh.offsets.index(center)])
+        else:
+            raise TypeError("Can't step %s for a whole ensemble." % (computation.__class__.__name__))
+
+        self.nondet = nondet
+        self.shared_random = shared_random
+        if nondet != 1:
+            self.random = np.random.RandomState(random_seed)
+
+        self.histogram = histogram
+        self.activity = activity
+        if histogram:
+            self.attrs.append("histogram")
+        if activity:
+            self.attrs.append("activity")
+        self.damage = damage
+        if damage:
+            self.attrs.append("damage")
+
+        self.set_config(target.config)
+        del target.config
+
+    def _interior(self):
+        return (slice(None),) + tuple(slice(low, low + length)
+                                      for (low, high), length in zip(self.borders, self.target.size))
+
+    def set_config(self, config):
+        """Set the configurations of all members from an array with the
+        member as its first axis."""
+        target = self.target
+        if config.shape != (target.members,) + tuple(target.size):
+            raise ValueError("Expected configurations of shape %s, got %s."
+                             % ((target.members,) + tuple(target.size), config.shape))
+        shape = (target.members,) + tuple(length + low + high
+                                          for (low, high), length in zip(self.borders, target.size))
+        target.cconf = np.zeros(shape, dtype=config.dtype)
+        target.cconf[self._interior()] = config
+        target.nconf = target.cconf.copy()
+        self.new_config()
+
+    def set_config_value(self, pos, value=None):
+        """Set the cell at pos, which starts with the member, to value.
+
+        If value is None, flip the value instead."""
+        pos = tuple(pos)
+        interior = self._interior()
+        conf = self.target.cconf[interior]
+        if value is None:
+            value = 1 - conf[pos]
+        conf[pos] = value
+        self.new_config()
+
+    def new_config(self):
+        """Regenerate the stats after the configurations were changed."""
+        if self.histogram:
+            self.target.histogram = self._histogram(self.target.cconf[self._interior()])
+        if self.activity:
+            self.target.activity = np.zeros((self.target.members, 2), dtype=int) - 1
+        if self.damage:
+            self.target.damage = self._damage(self.target.cconf[self._interior()])
+
+    def _damage(self, conf):
+        members = self.target.members
+        differs = conf != conf[:1]
+        damage = np.empty((members, 1 + 2 * len(self.target.size)), dtype=int)
+        damage[:, 0] = differs.reshape(members, -1).sum(axis=1)
+        for axis, length in enumerate(self.target.size):
+            others = tuple(other + 1 for other in range(len(self.target.size)) if other != axis)
+            along = differs.any(axis=others) if others else differs
+            damage[:, 1 + 2 * axis] = along.argmax(axis=1)
+            damage[:, 2 + 2 * axis] = length - 1 - along[:, ::-1].argmax(axis=1)
+        damage[damage[:, 0] == 0, 1:] = -1
+        return damage
+
+    def _histogram(self, conf):
+        members = self.target.members
+        base = len(self.target.possible_values)
+        flat = conf.reshape(members, -1) + (np.arange(members) * base)[:, None]
+        return np.bincount(flat.ravel(), minlength=members * base).reshape(members, base)
+
+    def _copy_borders(self, conf):
+        for axis, ((low, high), length) in enumerate(zip(self.borders, self.target.size)):
+            def along(start, stop):
+                return (slice(None),) * (axis + 1) + (slice(start, stop),)
+            if low:
+                conf[along(0, low)] = conf[along(length, length + low)]
+            if high:
+                conf[along(low + length, low + length + high)] = conf[along(low, low + high)]
+
+    def step(self):
+        """Step all members of the ensemble once."""
+        target = self.target
+        if self.copy_borders:
+            self._copy_borders(target.cconf)
+
+        interior = self._interior()
+        old = target.cconf[interior]
+        result = compute_array(self.computation, self.neigh, target.cconf,
+                               self.borders, target.size, getattr(target, "rule", None))
+        if self.nondet != 1:
+            shape = old.shape[1:] if self.shared_random else old.shape
+            result = np.where(self.random.random_sample(shape) < self.nondet, result, old)
+
+        if self.activity or self.histogram:
+            changed = (result != old).reshape(target.members, -1).sum(axis=1)
+            if self.activity:
+                target.activity[:, 1] = changed
+                target.activity[:, 0] = np.prod(target.size) - changed
+            if self.histogram:
+                target.histogram = self._histogram(result)
+        if self.damage:
+            target.damage = self._damage(result)
+
+        target.nconf[interior] = result
+        target.cconf, target.nconf = target.nconf, target.cconf
+
+    step_pure_py = step
+
+    def __str__(self):
+        parts = ["Ensemble of %d" % self.target.members]
+        self.computation.build_name(parts)
+        self.neigh.build_name(parts)
+        return " ".join(parts)
+
+class EnsembleSimulator(SimulatorInterface):
+    """This Simulator takes an `EnsembleStepFunc` and packs it in an
+    interface similar to `CagenSimulator`.
+
+    Its configurations and shape have the member of the ensemble as the
+    first axis."""
+
+    def __init__(self, step_func):
+        super(EnsembleSimulator, self).__init__()
+        self._step_func = step_func
+        self._target = step_func.target
+        self._size = self._target.size
+        self.members = self._target.members
+        self.shape = (self.members,) + tuple(self._size)
+
+        self.t = TargetProxy(self._target, self._step_func.attrs + ["possible_values"])
+        self._config_frame = None
+
+    def get_config_view(self):
+        """Return a read-only view of the configurations, sans borders."""
+        view = self._target.cconf[self._step_func._interior()]
+        view.flags.writeable = False
+        return view
+
+    def get_config(self):
+        """Return the configurations, sans borders."""
+        return self.get_config_view().copy()
+
+    def get_config_frame(self):
+        """Return a read-only copy of the configurations, that is made at
+        most once per step and shared by all callers."""
+        if self._config_frame is None:
+            frame = self.get_config()
+            frame.flags.writeable = False
+            self._config_frame = frame
+        return self._config_frame
+
+    def set_config(self, config):
+        self._step_func.set_config(config)
+        self._config_frame = None
+        self.snapshot_restored.emit()
+
+    def set_config_value(self, pos, value=None):
+        try:
+            self._step_func.set_config_value(pos, value)
+        except IndexError:
+            return
+        self._config_frame = None
+        self.changed.emit()
+
+    def step(self):
+        """Step all members of the ensemble, then emit :attr:`updated`."""
+        self._step_func.step()
+        self.step_number += 1
+        self._config_frame = None
+        self.updated.emit()
+
+    step_pure_py = step
+    step_inline = step
+
+    def run(self, steps):
+        """Step all members of the ensemble the given number of times."""
+        for i in xrange(steps):
+            self.step()
+
+    def __str__(self):
+        return str(self._step_func)
+
+class ElementaryEnsemble(EnsembleSimulator):
+    """An `EnsembleSimulator` for an elementary cellular automaton, that is
+    set up like an `ElementarySimulator`."""
+
+    def __init__(self, size=None, members=None, rule=None, config=None,
+                 nondet=1, histogram=False, activity=False,
+                 copy_borders=True, neighbourhood=None, base=2,
+                 random_seed=None):
+        """:param size: The size of the configuration of each member.
+        :param members: How many members the ensemble has.
+        :param rule: The rule number for the elementary cellular automaton
+                     or its lookup array.
+        :param config: Optionally the configurations or a configuration
+                       generator to use. See `EnsembleTarget`.
+        :param random_seed: The seed for the random configurations and the
+                            nondeterministic execution.
+
+        The other parameters are the same as for `EnsembleStepFunc`."""
+        target = EnsembleTarget(size, members, config, base=base, random_seed=random_seed)
+        computer = ElementaryCellularAutomatonBase(rule)
+        stepfunc = EnsembleStepFunc(target, computer, neighbourhood=neighbourhood,
+                                    copy_borders=copy_borders, nondet=nondet,
+                                    histogram=histogram, activity=activity,
+                                    random_seed=random_seed)
+        self.computer = computer
+        super(ElementaryEnsemble, self).__init__(stepfunc)
+
+    @property
+    def rule_number(self):
+        """The rule number of the ensemble."""
+        return self.computer.rule
+
+class GameOfLifeEnsemble(EnsembleSimulator):
+    """An `EnsembleSimulator` for game-of-life-like rules, that is set up
+    like a `GameOfLife` simulator."""
+
+    def __init__(self, size=None, members=None, config=None,
+                 nondet=1, histogram=False, activity=False,
+                 copy_borders=True, life_params={}, random_seed=None):
+        """:param life_params: Those parameters are passed on to the
+                               constructor of `LifeCellularAutomatonBase`.
+
+        The other parameters are the same as for `ElementaryEnsemble`."""
+        target = EnsembleTarget(size, members, config, random_seed=random_seed)
+        computer = LifeCellularAutomatonBase(**life_params)
+        stepfunc = EnsembleStepFunc(target, computer, neighbourhood=MooreNeighbourhood,
+                                    copy_borders=copy_borders, nondet=nondet,
+                                    histogram=histogram, activity=activity,
+                                    random_seed=random_seed)
+        super(GameOfLifeEnsemble, self).__init__(stepfunc)
+
+class DamageSpreading(EnsembleSimulator):
+    """Run a configuration and a perturbed copy of it side by side, to see
+    how far the perturbation spreads.
+
+    Both are members of one ensemble, so they are stepped together and, for
+    nondeterministic rules, the same cells get executed in both. The stat
+    `damage` holds the number of cells that differ between the two and the
+    bounding box around them, see `EnsembleStepFunc`."""
+
+    perturbed = ()
+    """The positions of the cells that were changed in the copy."""
+
+    def __init__(self, size=None, config=None, rule=None, life_params=None,
+                 perturb=1, nondet=1, copy_borders=True, neighbourhood=None,
+                 base=2, random_seed=None):
+        """:param size: The size of the configuration.
+        :param config: Optionally the configuration or a configuration
+                       generator to use.
+        :param rule: The rule number, if an elementary cellular automaton
+                     should be run.
+        :param life_params: If this is not None, run a game-of-life-like
+                            rule with these parameters instead.
+        :param perturb: The number of randomly chosen cells to change in
+                        the copy or a list of their positions.
+        :param random_seed: The seed for the random configuration, the
+                            perturbed cells and the nondeterministic
+                            execution.
+
+        The other parameters are the same as for `EnsembleStepFunc`."""
+        random = np.random.RandomState(random_seed)
+        if config is None:
+            config = random.randint(0, base, tuple(size)).astype(default_dtype)
+        elif isinstance(config, BaseConfiguration):
+            config = config.generate(size_hint=size)
+
+        if isinstance(perturb, (int, long)):
+            cells = random.choice(config.size, perturb, replace=False)
+            perturb = zip(*np.unravel_index(cells, config.shape))
+        self.perturbed = [tuple(pos) for pos in perturb]
+        copy = config.copy()
+        for pos in self.perturbed:
+            copy[pos] = (copy[pos] + 1) % base
+
+        if life_params is not None:
+            computer = LifeCellularAutomatonBase(**life_params)
+            if neighbourhood is None:
+                neighbourhood = MooreNeighbourhood
+        else:
+            computer = ElementaryCellularAutomatonBase(rule)
+
+        target = EnsembleTarget(config=np.array([config, copy]), base=base)
+        stepfunc = EnsembleStepFunc(target, computer, neighbourhood=neighbourhood,
+                                    copy_borders=copy_borders, nondet=nondet,
+                                    damage=True, shared_random=True,
+                                    random_seed=random.randint(2 ** 31))
+        super(DamageSpreading, self).__init__(stepfunc)
+
+    @property
+    def distance(self):
+        """The number of cells, that differ between the two configurations."""
+        return self._target.damage[1, 0]
+
+    @property
+    def damage_box(self):
+        """The lowest and highest index of differing cells along each axis,
+        or None, if there are none."""
+        damage = self._target.damage[1]
+        if damage[0] == 0:
+            return None
+        return tuple(zip(damage[1::2], damage[2::2]))
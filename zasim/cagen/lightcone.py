@@ -0,0 +1,94 @@
+"""This module calculates the value a few cells will have some steps in the
+future, without stepping the whole configuration.
+
+The value of a cell after t steps only depends on the cells in its backward
+light cone, which is the bounding box of the neighbourhood after t steps,
+as returned by :meth:`Neighbourhood.bounding_box`. Only that part of the
+configuration is cut out and stepped; after every step, the part that can
+still be calculated correctly shrinks by the bounding box of the
+neighbourhood, until only the cell itself is left.
+
+For border copiers, the light cone wraps around the configuration. For
+other border handlers, the cells outside of the configuration keep the
+value they have in the border.
+
+.. testsetup::
+
+    from zasim.cagen.lightcone import *
+
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+from .border import BaseBorderCopier
+from .computations import ElementaryCellularAutomatonBase, LifeCellularAutomatonBase
+from .ensemble import compute_array
+
+import numpy as np
+
+def light_cone_values(stepfunc, positions, steps):
+    """Calculate the values the cells at positions will have after the
+    given number of steps of a deterministic `StepFunc`.
+
+    :param stepfunc: The step function, whose current configuration to
+                     start from. It has to use an
+                     `ElementaryCellularAutomatonBase` or a
+                     `LifeCellularAutomatonBase` computation.
+    :param positions: A list of positions without borders.
+    :param steps: How many steps into the future to look.
+    :returns: An array with the value for each position."""
+    if getattr(stepfunc, "random", None) is not None:
+        raise ValueError("Can only look into the future of deterministic step functions.")
+    for computation in stepfunc.visitors:
+        if isinstance(computation, (ElementaryCellularAutomatonBase, LifeCellularAutomatonBase)):
+            break
+    else:
+        raise TypeError("Can only calculate light cones for elementary and life-like computations.")
+
+    target = stepfunc.target
+    conf = target.cconf
+    size = target.size
+    dims = len(size)
+    positions = np.array(positions, dtype=int).reshape(-1, dims)
+    count = len(positions)
+
+    bbox = stepfunc.neigh.bounding_box()
+    cone = stepfunc.neigh.bounding_box(steps)
+    periodic = isinstance(stepfunc.border, BaseBorderCopier)
+
+    # gather the cones of all positions into one array with the position
+    # as the first axis.
+    indices = []
+    outside = np.zeros((count,) + (1,) * dims, dtype=bool)
+    missing = np.zeros((count,) + (1,) * dims, dtype=bool)
+    for axis, ((low, high), (cone_low, cone_high)) in enumerate(zip(bbox, cone)):
+        shape = [count] + [1] * dims
+        shape[axis + 1] = cone_high - cone_low + 1
+        coords = (positions[:, axis][:, None] + np.arange(cone_low, cone_high + 1)).reshape(shape)
+        if periodic:
+            coords = coords % size[axis]
+        else:
+            outside = outside | (coords < 0) | (coords >= size[axis])
+        coords = coords + abs(low)
+        missing = missing | (coords < 0) | (coords >= conf.shape[axis])
+        indices.append(coords.clip(0, conf.shape[axis] - 1))
+
+    region = conf[tuple(indices)]
+    # cells beyond the borders are only ever read by cells in the borders,
+    # which don't change anyway.
+    region[np.broadcast_to(missing, region.shape)] = 0
+    outside = np.broadcast_to(outside, region.shape)
+
+    borders = [(-low, high) for low, high in bbox]
+    for step in xrange(steps):
+        new_size = [length - low - high for (low, high), length in zip(borders, region.shape[1:])]
+        result = compute_array(computation, stepfunc.neigh, region, borders, new_size,
+                               getattr(target, "rule", None))
+        inner = (slice(None),) + tuple(slice(low, low + length)
+                                       for (low, high), length in zip(borders, new_size))
+        if not periodic:
+            outside = outside[inner]
+            result = np.where(outside, region[inner], result)
+        region = result
+
+    return region.reshape(count)
@@ -66,12 +66,25 @@ class SparseCellLoop(CellLoop):
     of booleans called `sparse_mask`, that only internally gets used to make
     sure, that no fields are enlisted more than once.
 
-    The `sparse_list` is duplicated into the property `prev_sparse_list`, from
-    which reads are performed. All entries in the sparse_list arrays are valid
-    up to the first -1.
+    The C code reads the positions to calculate from `prev_sparse_list` and
+    enlists the positions for the next step in `sparse_list`. Between steps,
+    the mask marks the cells in `prev_sparse_list`, whose length is kept in
+    `prev_sparse_end`. A step clears the mask for those cells first, so that
+    it can mark the cells it enlists, and at its end copies the new entries
+    over to `prev_sparse_list`. That way the cost of a step is proportional
+    to the activity rather than to the size of the configuration. All
+    entries in the sparse_list arrays are valid up to the first -1.
+    Positions are stored as flat indices in C order.
 
     For the pure-py version, a normal python set is used.
 
+    Cells that are not calculated are not copied over from cconf either.
+    Since nconf holds the configuration from two steps ago, a cell whose
+    neighbourhood - including the cell itself - didn't change in the last
+    step already has the right value in nconf. Cells that are skipped
+    nondeterministically and cells that get changed between steps via
+    `StepFunc.set_config_value` are copied one by one.
+
     It requires an ActivityRecord for the `was_active` flag."""
 
     probab = None
@@ -82,7 +95,8 @@ class SparseCellLoop(CellLoop):
 
         size = self.calculate_size()
         target.sparse_mask = np.zeros(size, dtype=bool)
-        target.sparse_list = np.zeros(size, dtype=int)
+        target.sparse_list = np.zeros(size + 1, dtype=int)
+        target.prev_sparse_end = np.zeros(1, dtype=int)
         target.sparse_set = set()
 
     def bind(self, code):
@@ -100,20 +114,44 @@ class SparseCellLoop(CellLoop):
         configuration."""
         return reduce(lambda a, b: a * b, self.target.size)
 
-    def mark_cell_py(self, pos):
+    def affected_positions(self, pos):
+        """Get the positions of all cells, that have the cell at pos in their
+        neighbourhood, wrapped around the borders where possible."""
         positions = [offset_pos(pos, offs) for offs in
                      self.code.neigh.affected_cells()]
         positions = [pos
                          if self.code.border.is_position_valid(pos)
                          else self.code.border.correct_position(pos)
                      for pos in positions]
+        return [pos for pos in positions if pos is not None]
+
+    def mark_cell_py(self, pos):
+        self.target.sparse_set.update(self.affected_positions(pos))
+
+    def config_value_changed(self, pos):
+        """Enlist the changed cell and all cells that have it in their
+        neighbourhood for the next step of both the pure-py and the C code."""
+        super(SparseCellLoop, self).config_value_changed(pos)
+        positions = self.affected_positions(pos)
         self.target.sparse_set.update(positions)
 
+        prev_list, mask = self.target.prev_sparse_list, self.target.sparse_mask
+        end = self.target.prev_sparse_end[0]
+        for position in positions:
+            idx = np.ravel_multi_index(position, self.target.size)
+            if not mask[idx]:
+                mask[idx] = True
+                prev_list[end] = idx
+                end += 1
+        prev_list[end] = -1
+        self.target.prev_sparse_end[0] = end
+
     def new_config(self):
         size = self.calculate_size()
         self.target.sparse_mask = np.ones(size, dtype=bool)
         self.target.sparse_list = np.array(list(range(size)) + [-1] , dtype=int)
         self.target.prev_sparse_list = self.target.sparse_list.copy()
+        self.target.prev_sparse_end = np.array([size], dtype=int)
         self.target.sparse_set = set(product(*[range(siz) for siz in self.target.size]))
 
     def get_iter(self):
@@ -124,54 +162,65 @@ class SparseCellLoop(CellLoop):
             # get a list of entries to go through
             sublist = []
             for pos in the_list:
-                if self.code.random.random() >= self.probab:
+                if self.code.random.random() < self.probab:
                     sublist.append(pos)
                 else:
-                    self.target.sparse_set.update([pos])
+                    # the skipped cell keeps its value, but nconf may still
+                    # hold an older one.
+                    self.code.acc.write_to(pos, self.code.acc.read_from(pos))
+                    self.target.sparse_set.add(pos)
             return iter(sublist)
         else:
             return iter(the_list)
 
+    def enlist_code(self, index):
+        """Generate a bit of C code that enlists the flat index for the next
+        step, unless it already is."""
+        return """if(!sparse_mask(%(idx)s)) {
+                sparse_list(sparse_cell_write_idx) = %(idx)s;
+                sparse_mask(%(idx)s) = true;
+                sparse_cell_write_idx++;
+            }""" % dict(idx=index)
+
     def visit(self):
         super(SparseCellLoop, self).visit()
 
         self.code.attrs.append("sparse_mask")
         self.code.attrs.append("sparse_list")
         self.code.attrs.append("prev_sparse_list")
+        self.code.attrs.append("prev_sparse_end")
 
         self.code.add_py_code("loop_end",
             """if was_active: self.loop.mark_cell_py(pos)""")
 
         self.code.add_weave_code("localvars",
-            """int sparse_cell_write_idx = 0;""")
-
-        # copy all data over, because of the inactive cells.
-        self.code.add_weave_code("localvars",
-            """nconf = cconf.copy();""")
+            """int sparse_cell_write_idx = 0;
+            // the mask still marks the cells of this step, clear it so that
+            // it can mark the cells for the next one.
+            for(int list_idx=0; list_idx < prev_sparse_end(0); list_idx++) {
+                sparse_mask(prev_sparse_list(list_idx)) = false;
+            }""")
 
         self.code.add_weave_code("loop_begin",
             """for(int cell_idx=0; prev_sparse_list(cell_idx) != -1; cell_idx++) {""")
-        if self.probab is not None:
-            self.code.add_weave_code("loop_begin",
-                """if(rand() >= RAND_MAX * NONDET_PROBAB) {
-                    if(!sparse_mask(cell_idx)) {
-                        sparse_list(sparse_cell_write_idx) = cell_idx;
-                        sparse_mask(cell_idx) = true;
-                        sparse_cell_write_idx++;
-                    }
-                    continue;
-                }""")
         if len(self.position_names) == 1:
             self.code.add_weave_code("loop_begin",
                 """    int %s = prev_sparse_list(cell_idx);""" % self.position_names)
         elif len(self.position_names) == 2:
             self.code.add_weave_code("loop_begin",
-                """    int %(pos_a)s = prev_sparse_list(cell_idx) %% %(size_a)s;
-                       int %(pos_b)s = prev_sparse_list(cell_idx) / %(size_b)s;""" %
+                """    int %(pos_a)s = prev_sparse_list(cell_idx) / %(size_b)s;
+                       int %(pos_b)s = prev_sparse_list(cell_idx) %% %(size_b)s;""" %
                            dict(pos_a = self.position_names[0],
                                 pos_b = self.position_names[1],
-                                size_a = self.code.acc.size_names[0],
                                 size_b = self.code.acc.size_names[1]))
+        if self.probab is not None:
+            self.code.add_weave_code("loop_begin",
+                """if(rand() >= RAND_MAX * NONDET_PROBAB) {
+                    %(copy_code)s
+                    %(enlist)s
+                    continue;
+                }""" % dict(copy_code=self.code.acc.gen_copy_code(),
+                            enlist=self.enlist_code("prev_sparse_list(cell_idx)")))
 
         # FIXME use proper position names here
         if len(self.position_names) == 1:
@@ -181,12 +230,9 @@ class SparseCellLoop(CellLoop):
                        }""" % ("\n".join([
                            """
                            {int idx = %(wrap_x)s;
-                           if(!sparse_mask(idx)) {
-                               sparse_list(sparse_cell_write_idx) = idx;
-                               sparse_mask(idx) = true;
-                               sparse_cell_write_idx++;
-                           }}""" % dict(offs_x=offs[0],
-                                        wrap_x=self.code.border.correct_position_c(["loop_x + %s" % (offs[0])])[0])
+                           %(enlist)s}""" % dict(
+                                        wrap_x=self.code.border.correct_position_c(["loop_x + %s" % (offs[0])])[0],
+                                        enlist=self.enlist_code("idx"))
                                for offs in self.code.neigh.offsets])))
         elif len(self.position_names) == 2:
             self.code.add_weave_code("loop_end",
@@ -197,23 +243,25 @@ class SparseCellLoop(CellLoop):
                            {int px = loop_x + %(offs_x)s;
                            int py = loop_y + %(offs_y)s;
                            %(wrap)s;
-                           int idx = px * %(size_x)s + py;
-                           if(!sparse_mask(idx)) {
-                               sparse_list(sparse_cell_write_idx) = idx;
-                               sparse_mask(idx) = true;
-                               sparse_cell_write_idx++;
-                           }}""" % dict(offs_x=offs[0], offs_y=offs[1],
-                                        size_x=self.code.acc.size_names[0],
+                           int idx = px * %(size_y)s + py;
+                           %(enlist)s}""" % dict(offs_x=offs[0], offs_y=offs[1],
+                                        size_y=self.code.acc.size_names[1],
                                         wrap="px = " + ("; py = ".join(self.code.border.correct_position_c(
                                             ("px", "py")
-                                            ))))
+                                            ))),
+                                        enlist=self.enlist_code("idx"))
                                for offs in self.code.neigh.offsets])))
         self.code.add_weave_code("loop_end",
                 """
                 }
-                // null the sparse mask
-                sparse_mask = 0;
                 sparse_list(sparse_cell_write_idx) = -1;
+                // hand the enlisted cells over to the next step; their
+                // entries in the sparse mask stay set until it runs.
+                for(int list_idx=0; list_idx < sparse_cell_write_idx; list_idx++) {
+                    prev_sparse_list(list_idx) = sparse_list(list_idx);
+                }
+                prev_sparse_list(sparse_cell_write_idx) = -1;
+                prev_sparse_end(0) = sparse_cell_write_idx;
                 """)
 
 class OneDimSparseCellLoop(SparseCellLoop):
@@ -232,8 +280,8 @@ class OneDimSparseNondetCellLoop(OneDimSparseCellLoop):
         super(OneDimSparseNondetCellLoop, self).__init__()
         self.probab = probab
 
-class TwoDimSparseNondetCellLoop(SparseCellLoop):
+class TwoDimSparseNondetCellLoop(TwoDimSparseCellLoop):
     requires_features = [two_dimensions, activity, random_generator]
     def __init__(self, probab=0.5):
-        super(OneDimSparseNondetCellLoop, self).__init__()
+        super(TwoDimSparseNondetCellLoop, self).__init__()
         self.probab = probab
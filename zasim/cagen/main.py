@@ -17,14 +17,106 @@ from . import DualRuleCellularAutomaton, automatic_stepfunc
 
 from ..debug import launch_debugger
 
+import numpy as np
+
 import os
+import time
+import threading
+import Queue
+
+class StepRecorder(object):
+    """Stream the configurations and stats of a simulator to a file.
+
+    Every step is written as a sequence of arrays in the .npy format, one
+    array per recorded field. The first array in the file holds the names
+    of the fields, so that :func:`read_recording` can put the steps back
+    together."""
+
+    def __init__(self, simulator, filename, threaded=False, connect=True):
+        """:param simulator: The simulator to record.
+        :param filename: The file to write to.
+        :param threaded: Hand the data over to a writer thread, so that the
+                         simulator doesn't have to wait for the disk.
+        :param connect: Connect the signals of the simulator immediately?"""
+        self._sim = simulator
+        self._file = open(filename, "wb")
+
+        self.fields = ["config"]
+        for stat in ("histogram", "activity"):
+            if stat in simulator._step_func.attrs:
+                self.fields.append(stat)
+        np.save(self._file, np.array(self.fields))
+
+        self.write_time = 0
+        self._queue = None
+        if threaded:
+            self._queue = Queue.Queue(maxsize=64)
+            self._thread = threading.Thread(target=self._writer)
+            self._thread.daemon = True
+            self._thread.start()
+
+        self.record()
+        if connect:
+            self.connect_simulator()
+
+    def connect_simulator(self):
+        self._sim.updated.connect(self.record)
+        self._sim.changed.connect(self.record)
+        self._sim.snapshot_restored.connect(self.record)
+
+    def record(self):
+        if self._queue is not None:
+            # the writer thread needs copies, that survive the next step.
+            arrays = [self._sim.get_config_frame()]
+            arrays.extend(getattr(self._sim._target, stat).copy() for stat in self.fields[1:])
+            self._queue.put(arrays)
+        else:
+            arrays = [self._sim.get_config_view()]
+            arrays.extend(getattr(self._sim._target, stat) for stat in self.fields[1:])
+            self._write(arrays)
+
+    def _write(self, arrays):
+        start = time.time()
+        for array in arrays:
+            np.save(self._file, array)
+        self.write_time += time.time() - start
+
+    def _writer(self):
+        while True:
+            arrays = self._queue.get()
+            if arrays is None:
+                break
+            self._write(arrays)
+
+    def close(self):
+        """Wait for the writer thread to finish and close the file."""
+        if self._queue is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._queue = None
+        self._file.close()
+
+def read_recording(filename):
+    """Read back a file written by :class:`StepRecorder`.
+
+    :returns: A generator of dictionaries mapping field names to arrays,
+              one per recorded step."""
+    with open(filename, "rb") as infile:
+        fields = list(np.load(infile))
+        while True:
+            try:
+                arrays = [np.load(infile) for _ in fields]
+            except (IOError, ValueError):
+                break
+            yield dict(zip(fields, arrays))
 
 def test(width=75, height=None, life=False, copy_borders=True,
          rule=None, alt_rule=None,
          histogram=True, activity=False,
          pure=False, print_rule=True,
          nondet=100, beta=100, steps=100, base=2,
-         sparse=False, background=None, patterns=None, layout=None):
+         sparse=False, background=None, patterns=None, layout=None,
+         display=True, backend="auto", threads=1, record=None, report=False):
 
     if beta > 1.0:
         beta = beta / 100.
@@ -57,13 +149,25 @@ def test(width=75, height=None, life=False, copy_borders=True,
             sf_obj.gen_code()
             sim_obj = CagenSimulator(sf_obj, sf_obj.target)
 
-    if height is None:
-        display = OneDimConsolePainter(sim_obj, 1)
-    else:
-        display = TwoDimConsolePainter(sim_obj)
-        def extra_newline():
-            print
-        sim_obj.updated.connect(extra_newline)
+    if pure:
+        backend = "pure"
+    if backend == "auto":
+        backend = "weave" if HAVE_WEAVE else "pure"
+    elif backend == "weave" and not HAVE_WEAVE:
+        raise ValueError("the weave backend is not available")
+
+    # the painter and the recorder are driven from the loop below instead of
+    # the updated signal, so that their time can be told apart from the
+    # time spent stepping.
+    if display:
+        if height is None:
+            painter = OneDimConsolePainter(sim_obj, 1, connect=False)
+        else:
+            painter = TwoDimConsolePainter(sim_obj, connect=False)
+
+    recorder = None
+    if record:
+        recorder = StepRecorder(sim_obj, record, threaded=threads > 1, connect=False)
 
     if print_rule:
         print sim_obj.pretty_print()
@@ -72,20 +176,58 @@ def test(width=75, height=None, life=False, copy_borders=True,
     if os.environ.get("ZASIM_WEAVE_DEBUG", False) == "gdb":
         launch_debugger()
 
-    if HAVE_WEAVE and not pure:
-        for i in xrange(steps):
-            sim_obj.step_inline()
-            if histogram:
-                print sim_obj.t.histogram
-            if activity:
-                print sim_obj.t.activity, sum(sim_obj.t.activity)
+    if backend == "weave":
+        step = sim_obj.step_inline
     else:
-        for i in xrange(steps):
-            sim_obj.step_pure_py()
+        step = sim_obj.step_pure_py
+
+    step_time = 0
+    display_time = 0
+    start = time.time()
+    for i in xrange(steps):
+        step_start = time.time()
+        step()
+        display_start = time.time()
+        step_time += display_start - step_start
+
+        if display:
+            painter.after_step()
+            if height is not None:
+                print
             if histogram:
                 print sim_obj.t.histogram
             if activity:
                 print sim_obj.t.activity, sum(sim_obj.t.activity)
+            display_time += time.time() - display_start
+
+        if recorder:
+            recorder.record()
+
+    if recorder:
+        recorder.close()
+    total_time = time.time() - start
+
+    if not display:
+        if histogram:
+            print sim_obj.t.histogram
+        if activity:
+            print sim_obj.t.activity, sum(sim_obj.t.activity)
+
+    if report:
+        cells = np.prod(sim_obj.shape) * steps
+        print "steps:     %d (%s backend)" % (steps, backend)
+        print "cells:     %d" % cells
+        print "total:     %.3fs" % total_time
+        print "stepping:  %.3fs" % step_time
+        if display:
+            print "display:   %.3fs" % display_time
+        if recorder:
+            print "recording: %.3fs%s" % (recorder.write_time,
+                    " (in writer thread)" if threads > 1 else "")
+        if step_time > 0:
+            print "cells/sec: %.0f" % (cells / step_time)
+
+    return sim_obj
 
 def main(args=None):
     import argparse
@@ -116,6 +258,18 @@ def main(args=None):
             help="calculate the activity")
     argp.add_argument("--pure", default=False, action="store_true",
             help="use pure python stepfunc even if weave is available")
+    argp.add_argument("--backend", default="auto", choices=["auto", "weave", "pure"],
+            help="which step function to run. auto uses weave if it is available")
+    argp.add_argument("--no-display", default=True, dest="display", action="store_false",
+            help="don't draw the configurations to the console. Histogram and "
+                 "activity will only be printed after the last step")
+    argp.add_argument("--record", metavar="FILE", default=None,
+            help="stream the configuration and stats of every step to FILE")
+    argp.add_argument("--threads", default=1, type=int,
+            help="with more than one thread, recording is done in a separate "
+                 "writer thread. The simulation itself always runs in one thread")
+    argp.add_argument("--report", default=False, action="store_true",
+            help="print the throughput and a breakdown of the time taken at the end")
     argp.add_argument("--print-rule", default=False, action="store_true",
             help="pretty-print the rule")
     argp.add_argument("--life", default=False, action="store_true",
@@ -154,6 +308,9 @@ def main(args=None):
         else:
             args.alt_rule = int(args.alt_rule)
 
+    if args.backend == "weave" and not HAVE_WEAVE:
+        argp.error("the weave backend is not available")
+
     test(**vars(args))
 
 
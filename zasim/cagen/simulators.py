@@ -146,13 +146,16 @@ class ElementarySimulator(ElementaryCagenSimulator):
                  neighbourhood=None,
                  base=2,
                  sparse_loop=False,
+                 random_generator=None,
                  **kwargs):
         """:param size: The size of the config to generate if no config
                         is supplied. Must be a tuple.
            :param nondet: If this is not 1, use this value as the probability
                           for each cell to get executed.
            :param histogram: Generate and update a histogram as well?
-           :param rule: The rule number for the elementary cellular automaton.
+           :param rule: The rule number for the elementary cellular automaton
+                        or its lookup array, see
+                        `ElementaryCellularAutomatonBase`.
            :param config: Optionally the configuration to use.
                           Supply a configuration generator here
                           to make the reset method of the simulator work.
@@ -164,6 +167,8 @@ class ElementarySimulator(ElementaryCagenSimulator):
            :param neighbourhood: The neighbourhood to use.
            :param base: The base of possible values for the configuration.
            :param sparse_loop: Should a sparse loop be used?
+           :param random_generator: The Random object to use for nondet and
+                                    beta asynchronism, for reproducible runs.
            """
         if size is None:
             assert config is not None, "either supply size or config."
@@ -175,7 +180,12 @@ class ElementarySimulator(ElementaryCagenSimulator):
 
         if neighbourhood is None:
             if len(size) > 1:
-                if rule is None or rule < base ** (base ** 5):
+                if rule is None:
+                    neighbourhood = VonNeumannNeighbourhood
+                elif not isinstance(rule, (int, long, np.integer)):
+                    neighbourhood = (VonNeumannNeighbourhood if np.size(rule) <= base ** 5
+                                     else MooreNeighbourhood)
+                elif rule < base ** (base ** 5):
                     neighbourhood = VonNeumannNeighbourhood
                 else:
                     neighbourhood = MooreNeighbourhood
@@ -187,15 +197,16 @@ class ElementarySimulator(ElementaryCagenSimulator):
                 histogram=histogram, activity=activity,
                 copy_borders=copy_borders, neighbourhood=neighbourhood,
                 base=base, visitors=[],
-                sparse_loop=sparse_loop)
+                sparse_loop=sparse_loop,
+                random_generator=random_generator)
 
         target = stepfunc.target
         stepfunc.gen_code()
 
         self.rule = target.rule
-        rule_nr = computer.rule
 
-        super(ElementarySimulator, self).__init__(stepfunc, rule_nr)
+        # the rule number is calculated from the lookup array on demand.
+        super(ElementarySimulator, self).__init__(stepfunc, None)
 
     def pretty_print(self):
         return self.computer.pretty_print()
@@ -10,6 +10,7 @@ from __future__ import print_function
 import new
 
 from .utils import dedent_python_code
+from .lightcone import light_cone_values
 from .compatibility import NoCodeGeneratedException, CompatibilityException, one_dimension, two_dimensions, no_python_code, no_weave_code
 
 from ..features import HAVE_WEAVE, HAVE_TUPLE_ARRAY_INDEX, tuple_array_index_fixup
@@ -337,7 +338,9 @@ class StepFunc(object):
                 print(code_text, file=sys.stderr)
                 print("# --->8--->8--->8---", file=sys.stderr)
 
-            myglob = globals()
+            # every step function needs its own globals, or the consts of
+            # the step function generated last would be used by all of them.
+            myglob = dict(globals())
             myloc = locals()
             myglob.update(self.consts)
             try:
@@ -401,6 +404,15 @@ class StepFunc(object):
         if value is None:
             value = 1 - self.acc.read_from(pos)
         self.acc.write_to_current(pos, value)
+        for code in self.visitors:
+            code.config_value_changed(pos)
+
+    def light_cone_values(self, positions, steps):
+        """Calculate the values the cells at positions will have after the
+        given number of steps, by only stepping their backward light cones.
+
+        See `zasim.cagen.lightcone`."""
+        return light_cone_values(self, positions, steps)
 
     def set_target(self, target):
         """Set the target of the step function. The target contains,
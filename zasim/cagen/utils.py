@@ -9,7 +9,6 @@
 
 from ..features import HAVE_TUPLE_ARRAY_INDEX
 
-from itertools import product
 import numpy as np
 
 if HAVE_TUPLE_ARRAY_INDEX:
@@ -65,24 +64,106 @@ def dedent_python_code(code):
             resultlines.extend(lines[1:])
     return "\n".join(resultlines)
 
+# how many digits to split off with one division of a python integer. the
+# divisor stays below 2**30, so that python can divide by a single digit of
+# its own.
+def _chunk_digits(base):
+    digits = 1
+    while base ** (digits + 1) < 2 ** 30:
+        digits += 1
+    return digits
+
+def _power_of_two(base):
+    bits = base.bit_length() - 1
+    return bits if base == 1 << bits else None
+
+def _number_to_digits(number, count, base, powers):
+    """Split number into count digits, lowest first, by splitting it in
+    halves recursively and cutting the halves into chunks, that are split
+    up by numpy."""
+    if number == 0:
+        return np.zeros(count, dtype=np.int64)
+    chunk = _chunk_digits(base)
+    if count <= 64 * chunk:
+        divisor = base ** chunk
+        chunks = np.zeros(-(-count // chunk), dtype=np.int64)
+        index = 0
+        while number:
+            number, chunks[index] = divmod(number, divisor)
+            index += 1
+        digits = (chunks[:, None] // base ** np.arange(chunk, dtype=np.int64)) % base
+        return digits.ravel()[:count]
+
+    half = count // 2
+    if half not in powers:
+        powers[half] = base ** half
+    high, low = divmod(number, powers[half])
+    return np.concatenate([_number_to_digits(low, half, base, powers),
+                           _number_to_digits(high, count - half, base, powers)])
+
+def _digits_to_number(digits, base, powers):
+    """Join digits, lowest first, into a number; the inverse of
+    `_number_to_digits`."""
+    count = len(digits)
+    chunk = _chunk_digits(base)
+    if count <= 64 * chunk:
+        padded = np.zeros(-(-count // chunk) * chunk, dtype=np.int64)
+        padded[:count] = digits
+        chunks = padded.reshape(-1, chunk).dot(base ** np.arange(chunk, dtype=np.int64))
+        divisor = base ** chunk
+        number = 0
+        for value in reversed(chunks.tolist()):
+            number = number * divisor + value
+        return number
+
+    half = count // 2
+    if half not in powers:
+        powers[half] = base ** half
+    return (_digits_to_number(digits[:half], base, powers)
+            + _digits_to_number(digits[half:], base, powers) * powers[half])
+
+def rule_arr_dtype(base):
+    """The dtype used for the lookup arrays of rules with the given base."""
+    if base < 256: return np.int8
+    else: return np.int16 # good luck with that.
+
+_rule_arr_cache = {}
+def _cached_rule_arr(number, digits, base):
+    key = (number, digits, base)
+    if key in _rule_arr_cache:
+        return _rule_arr_cache[key]
+
+    entries = base ** digits
+    number = number % (base ** entries)
+    bits = _power_of_two(base)
+    if bits:
+        # the hex representation of the number already has all the bits.
+        hexdigits = "%x" % number
+        raw = np.frombuffer(("0" * (len(hexdigits) % 2) + hexdigits).decode("hex"), dtype=np.uint8)
+        allbits = np.unpackbits(raw)[::-1]
+        padded = np.zeros(entries * bits, dtype=np.uint8)
+        padded[:min(len(allbits), len(padded))] = allbits[:len(padded)]
+        table = padded.reshape(entries, bits).dot(1 << np.arange(bits))
+    else:
+        table = _number_to_digits(number, entries, base, {})
+    table = table.astype(rule_arr_dtype(base))
+    table.flags.writeable = False
+
+    if len(_rule_arr_cache) > 1024:
+        _rule_arr_cache.clear()
+    _rule_arr_cache[key] = table
+    return table
+
 def rule_nr_to_multidim_rule_arr(number, digits, base=2):
     """Given the rule `number`, the number of cells the neighbourhood has
     (as `digits`) and the `base` of the cells, this function calculates the
-    multidimensional rule table for computing that rule."""
+    multidimensional rule table for computing that rule.
 
-    if base < 256: dtype = "int8"
-    else: dtype = "int16" # good luck with that.
+    The table is indexed with the values of the neighbourhood cells.
 
-    res = np.zeros((base,) * digits, dtype=dtype)
-    entries = base ** digits
-    blubb = base ** entries
-    for position in product(*([xrange(base-1, -1, -1)] * digits)):
-        blubb /= base
-        d = int(number // (blubb))
-        number -= d * (blubb)
-        res[position] = d
-
-    return res
+    >>> rule_nr_to_multidim_rule_arr(110, 3)[0, 1, 1]
+    1"""
+    return _cached_rule_arr(number, digits, base).reshape((base,) * digits).copy()
 
 def rule_nr_to_rule_arr(number, digits, base=2):
     """Given a rule `number`, the number of cells the neighbourhood has
@@ -90,20 +171,68 @@ def rule_nr_to_rule_arr(number, digits, base=2):
     lookup array for computing that rule.
 
     >>> rule_nr_to_rule_arr(110, 3)
-    [0, 1, 1, 1, 0, 1, 1, 0]
-    >>> rule_nr_to_rule_arr(26, 3, 3)
-    [2, 2, 2, ...]
+    array([0, 1, 1, 1, 0, 1, 1, 0], dtype=int8)
+    >>> rule_nr_to_rule_arr(26, 3, 3)[:4]
+    array([2, 2, 2, 0], dtype=int8)
+
+    The results are cached, so getting the table for the same rule again
+    is cheap.
     """
-    entries = base ** digits
-    result = [0 for index in range(entries)]
-    blubb = base ** entries
-    for e in range(entries - 1, -1, -1):
-        blubb /= base
-        d = int(number // (blubb))
-        number -= d * (blubb)
-        result[e] = d
+    return _cached_rule_arr(number, digits, base).copy()
 
-    return result
+def make_rule_arr(rule, digits, base=2):
+    """Get the flat lookup array for a rule, that is given either as a rule
+    number, as a lookup array, flat or multidimensional, or as None, in which
+    case a random rule is drawn.
+
+    Random rules are drawn entry by entry, so that no rule number has to be
+    created for them.
+
+    >>> make_rule_arr(110, 3)
+    array([0, 1, 1, 1, 0, 1, 1, 0], dtype=int8)
+    >>> make_rule_arr([[0, 1], [1, 0]], 2)
+    array([0, 1, 1, 0], dtype=int8)"""
+    entries = base ** digits
+    if rule is None:
+        return np.random.randint(0, base, entries).astype(rule_arr_dtype(base))
+    elif isinstance(rule, (int, long, np.integer)):
+        return rule_nr_to_rule_arr(rule, digits, base)
+
+    rule_arr = np.asarray(rule).ravel()
+    if len(rule_arr) != entries:
+        raise ValueError("The rule table for %d cells with base %d needs %d entries, not %d."
+                         % (digits, base, entries, len(rule_arr)))
+    if rule_arr.min() < 0 or rule_arr.max() >= base:
+        raise ValueError("The rule table has values outside of 0 to %d." % (base - 1))
+    return rule_arr.astype(rule_arr_dtype(base))
+
+def rule_arr_to_rule_nr(rule_arr, base=2):
+    """Calculate the rule number from a lookup array, as created by
+    :func:`rule_nr_to_rule_arr` or :func:`rule_nr_to_multidim_rule_arr`.
+
+    >>> rule_arr_to_rule_nr(rule_nr_to_rule_arr(110, 3))
+    110"""
+    digits = np.asarray(rule_arr).ravel().astype(np.int64)
+    bits = _power_of_two(base)
+    if bits:
+        allbits = ((digits[:, None] >> np.arange(bits)) & 1).astype(np.uint8).ravel()
+        padded = np.zeros(-(-len(allbits) // 8) * 8, dtype=np.uint8)
+        padded[:len(allbits)] = allbits
+        # packing from the end puts the padding into the highest bits,
+        # where it doesn't change the number.
+        raw = np.packbits(padded[::-1]).tostring()
+        return int(raw.encode("hex"), 16) if raw else 0
+    return _digits_to_number(digits, base, {})
+
+def elementary_digits(digits, base=2):
+    """Create an array with one row for each entry of a rule array, that
+    holds the neighbourhood values belonging to that entry, the first
+    neighbour being the lowest digit.
+
+    >>> elementary_digits(2, 3).tolist()
+    [[0, 0], [1, 0], [2, 0], [0, 1], [1, 1], [2, 1], [0, 2], [1, 2], [2, 2]]"""
+    powers = base ** np.arange(digits)
+    return (np.arange(base ** digits)[:, None] // powers) % base
 
 def elementary_digits_and_values(neighbourhood, base=2, rule_arr=None):
     """From a neighbourhood, the base of the values used and the array that
@@ -112,23 +241,13 @@ def elementary_digits_and_values(neighbourhood, base=2, rule_arr=None):
     result_value ordered by the position like in the rule array.
 
     If the rule_arr is None, no result_value field will be generated."""
-    digits_and_values = []
-    offsets = neighbourhood.offsets
     names = neighbourhood.names
-    digits = len(offsets)
-
-    for i in range(base ** digits):
-        values = rule_nr_to_rule_arr(i, digits, base)
-        asdict = dict(zip(names, values))
-        digits_and_values.append(asdict)
+    digits = elementary_digits(len(neighbourhood.offsets), base).tolist()
+    digits_and_values = [dict(zip(names, values)) for values in digits]
 
     if rule_arr is not None:
-        if not isinstance(rule_arr, np.ndarray) or len(rule_arr.shape) == 1:
-            indices = enumerate(xrange(base ** digits))
-        else:
-            indices = enumerate(reversed(list(product(*([xrange(base-1,-1,-1)] * digits)))))
-
-        for index, rule_idx in indices:
-            digits_and_values[index].update(result_value = rule_arr[rule_idx])
+        if isinstance(rule_arr, np.ndarray):
+            rule_arr = rule_arr.ravel().tolist()
+        for asdict, value in zip(digits_and_values, rule_arr):
+            asdict.update(result_value = value)
     return digits_and_values
-
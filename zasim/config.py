@@ -23,8 +23,8 @@ from features import HAVE_NUMPY_RANDOM, HAVE_MULTIDIM
 
 import random
 import math
+import os
 import numpy as np
-from itertools import product
 
 default_dtype = np.int32
 
@@ -48,11 +48,27 @@ class BaseConfiguration(object):
         """
 
 class BaseRandomConfiguration(BaseConfiguration):
-    def __init__(self, base=2, *percentages):
+    """The base of configurations, that are made up of random values.
+
+    If a seed is given, the configurations are drawn from a random number
+    generator of their own, so that the same sequence of configurations is
+    generated every time. Otherwise, the global generator of `numpy.random`
+    is used."""
+
+    chunk_size = 2 ** 20
+    """How many cells to generate at once."""
+
+    def __init__(self, base=2, *percentages, **kwargs):
         """Create a random initial configuration with values from 0 to base-1
         inclusive and, if positional arguments are given, use the supplied
-        percentages for the different states."""
+        percentages for the different states.
+
+        Pass the keyword argument `seed` to get reproducible
+        configurations."""
 
+        self.set_seed(kwargs.pop("seed", None))
+        if kwargs:
+            raise TypeError("unexpected keyword arguments: %s" % ", ".join(kwargs))
         self.base = base
         self.percentages = percentages
         if len(self.percentages) > self.base:
@@ -76,37 +92,64 @@ class BaseRandomConfiguration(BaseConfiguration):
         if rest == 0 and self.cumulative_percentages[-1] != 1.0:
             raise ValueError("Probabilities must add up to 1.0")
 
+        self.cumulative_percentages = list(enumerate(self.cumulative_percentages))
+
+    def set_seed(self, seed=None):
+        """Start drawing random numbers from a generator with the given
+        seed, or from the global generator, if the seed is None."""
+        self.seed = seed
+        if not HAVE_NUMPY_RANDOM:
+            self.random = None
+        elif seed is None:
+            self.random = np.random
+        else:
+            self.random = np.random.RandomState(seed)
+
+    def randoms(self, count):
+        """Draw count random numbers between 0 and 1."""
+        if self.random is None:
+            # pypy compatibility
+            return np.array([random.random() for i in xrange(count)])
+        return self.random.random_sample(count)
+
     def size_hint_to_size(self, size_hint=None):
+        if self.random is None:
+            randrange = lambda: random.randrange(1, 100)
+        else:
+            randrange = lambda: self.random.randint(1, 100)
         if size_hint is None:
-            size_hint = (random.randrange(1, 100),)
+            size_hint = (randrange(),)
 
         size = []
         for entry in size_hint:
-            size.append(random.randrange(1, 100) if entry is None else entry)
+            size.append(randrange() if entry is None else entry)
 
         return tuple(size)
 
-    def generate(self, size_hint=None, dtype=default_dtype):
-        size = self.size_hint_to_size(size_hint)
-
-        if not HAVE_NUMPY_RANDOM and not HAVE_MULTIDIM:
-            # pypy compatibility
-            assert len(size) == 1
-            randoms = np.array([random.random() for i in xrange(size[0])])
-            arr = np.zeros(len(randoms), dtype=dtype)
-        elif not HAVE_NUMPY_RANDOM and HAVE_MULTIDIM:
-            randoms = np.array([random.random() for i in xrange(reduce(lambda a,b:a*b, size))])
-            randoms = randoms.reshape(*size)
-            arr = np.zeros(randoms.shape, dtype=dtype)
-        else:
-            randoms = np.random.rand(*size)
-            arr = np.zeros(randoms.shape, dtype=dtype)
-
-        for pos in product(*[xrange(siz) for siz in size]):
-            arr[pos] = min(idx for idx, perc in self.cumulative_percentages
-                           if randoms[pos] < perc)
+    def generate(self, size_hint=None, dtype=default_dtype, out=None):
+        """Generate the configuration.
 
-        return arr
+        :param out: An array to fill instead of creating a new one. This
+                    can be a `numpy.memmap`, as the configuration is
+                    generated in chunks of `chunk_size` cells."""
+        if out is None:
+            out = np.empty(self.size_hint_to_size(size_hint), dtype=dtype)
+        if not out.flags.c_contiguous:
+            raise ValueError("Can only generate into contiguous arrays.")
+
+        flat = out.reshape(-1)
+        for start in xrange(0, flat.size, self.chunk_size):
+            end = min(start + self.chunk_size, flat.size)
+            flat[start:end] = self.generate_chunk(out.shape, start, end)
+        return out
+
+    def generate_chunk(self, size, start, end):
+        """Generate the values of the cells from flat index start up to end
+        of a configuration of the given size."""
+        values = np.array([value for value, perc in self.cumulative_percentages])
+        cumulative = np.array([perc for value, perc in self.cumulative_percentages])
+        index = np.searchsorted(cumulative, self.randoms(end - start), side="right")
+        return values[index.clip(max=len(values) - 1)]
 
     def make_percentages_cumulative(self, percentages):
         self.percentages = percentages
@@ -142,32 +185,50 @@ class BaseRandomConfiguration(BaseConfiguration):
             self.percentages = tuple(percs)
 
 class RandomConfiguration(BaseRandomConfiguration):
-    def __init__(self, base=2, *percentages):
+    def __init__(self, base=2, *percentages, **kwargs):
         """Create a random initial configuration with values from 0 to base-1
         inclusive and, if positional arguments are given, use the supplied
-        percentages for the different states."""
+        percentages for the different states.
+
+        Pass the keyword argument `seed` to get reproducible
+        configurations."""
 
+        self.set_seed(kwargs.pop("seed", None))
+        if kwargs:
+            raise TypeError("unexpected keyword arguments: %s" % ", ".join(kwargs))
         self.values = range(base)
         self.percentages = percentages
         self.make_percentages_cumulative(percentages)
 
 class RandomConfigurationFromPalette(BaseRandomConfiguration):
-    def __init__(self, values, *percentages):
+    def __init__(self, values, *percentages, **kwargs):
         """Create a random initial configuration with the given values and,
         if positional arguments are given, use the supplied
-        percentages for the different states."""
+        percentages for the different states.
 
+        Pass the keyword argument `seed` to get reproducible
+        configurations."""
+
+        self.set_seed(kwargs.pop("seed", None))
+        if kwargs:
+            raise TypeError("unexpected keyword arguments: %s" % ", ".join(kwargs))
         self.values = values
         self.make_percentages_cumulative(percentages)
 
 class BaseCharConfiguration(BaseConfiguration):
-    """Generate a configuration from an ascii string."""
-    def __init__(self, strdata, palette):
+    """Generate a configuration from an ascii string.
+
+    Each line of the string becomes one row of the configuration. Empty
+    lines are skipped and lines that are shorter than the others are
+    filled up with the fill value. Representations may be made up of
+    multiple bytes, as long as the string is utf8 encoded."""
+    def __init__(self, strdata, palette, fill=0):
         """The palette is either a dictionary, mapping value to representation
         or a list with representation values.
         If no palette is supplied, the PALETTE value from BaseConsolePainter is
         used."""
         self.strdata = strdata
+        self.fill = fill
 
         if not palette:
             from zasim.display import console
@@ -177,45 +238,103 @@ class BaseCharConfiguration(BaseConfiguration):
         self.palette = palette
 
     def generate(self, size_hint=None, dtype=default_dtype):
-        lines = []
-        for line in self.strdata.split("\n"):
-            line_res = list(line.rstrip("\n\r"))
-            # skip empty lines
-            if line_res:
-                lines.append(line_res)
-        whole_conf = np.array(lines)
-        result = np.empty((len(lines), len(lines[0])), dtype=dtype)
-        for value, entry in self.palette.iteritems():
-            result[whole_conf == entry] = value
+        strdata = self.strdata
+        if isinstance(strdata, unicode):
+            strdata = strdata.encode("utf8")
+        return self.decode(np.frombuffer(strdata, dtype=np.uint8), dtype)
+
+    def decode(self, data, dtype=default_dtype):
+        """Turn an array of the bytes of a text into a configuration."""
+        from zasim.display.console import palette_bytes
+        palette = palette_bytes(self.palette)
+        newline = data == ord("\n")
+
+        if all(len(text) == 1 for text in palette.itervalues()):
+            # every byte is one cell, so a table of all bytes does the job.
+            starts = np.flatnonzero(~newline & (data != ord("\r")))
+            table = np.full(256, -1, dtype=np.int64)
+            known = np.zeros(256, dtype=bool)
+            for value, text in palette.iteritems():
+                table[ord(text)] = value
+                known[ord(text)] = True
+            codes = data[starts]
+            found = known[codes]
+            values = table[codes]
+        else:
+            # every byte, that doesn't continue a multi-byte character,
+            # starts a cell. the bytes of a cell are packed into one number.
+            boundaries = np.flatnonzero((data & 0xc0) != 0x80)
+            lengths = np.diff(np.append(boundaries, len(data)))
+            padded = np.zeros(len(data) + 4, dtype=np.uint32)
+            padded[:len(data)] = data
+            codes = np.zeros(len(boundaries), dtype=np.uint32)
+            for offset in range(4):
+                part = np.where(offset < lengths, padded[boundaries + offset], 0)
+                codes |= part.astype(np.uint32) << np.uint32(8 * (3 - offset))
+            cells = ~newline[boundaries] & (data[boundaries] != ord("\r"))
+            starts, codes = boundaries[cells], codes[cells]
+
+            texts = sorted((int(np.frombuffer(text.ljust(4, "\0"), dtype=">u4")[0]), value)
+                           for value, text in palette.iteritems())
+            keys = np.array([key for key, value in texts], dtype=np.uint32)
+            index = np.searchsorted(keys, codes).clip(max=len(keys) - 1)
+            found = keys[index] == codes
+            values = np.array([value for key, value in texts])[index]
+
+        if not found.all():
+            position = starts[np.flatnonzero(~found)[0]]
+            raise ValueError("No value for the character at byte %d." % position)
+
+        # number the lines that have any cells in them
+        line_numbers = np.cumsum(newline)[starts]
+        lines, line_index = np.unique(line_numbers, return_inverse=True)
+        if len(lines) == 0:
+            raise ValueError("There is no configuration in the text.")
+        line_starts = np.searchsorted(line_index, np.arange(len(lines)))
+        columns = np.arange(len(starts)) - line_starts[line_index]
+
+        result = np.empty((len(lines), columns.max() + 1), dtype=dtype)
+        result.fill(self.fill)
+        result[line_index, columns] = values
         return result.transpose()
 
 class FileCharConfiguration(BaseCharConfiguration):
     """Import an ascii-based file with a palette, as generated by
-    `zasim.display.console.BaseConsolePainter.export`."""
+    `zasim.display.console.BaseConsolePainter.export`.
 
-    def __init__(self, file_or_name, palette=None):
+    The file is memory mapped instead of read all at once."""
+
+    def __init__(self, file_or_name, palette=None, fill=0):
         self.file_or_name = file_or_name
 
-        super(FileCharConfiguration, self).__init__("", palette)
+        super(FileCharConfiguration, self).__init__("", palette, fill)
 
-    def generate(self, **kwargs):
-        if not isinstance(self.file_or_name, file):
-            file_o = open(self.file_or_name, "r")
-            self.strdata = file_o.read()
+    def generate(self, size_hint=None, dtype=default_dtype):
+        source = self.file_or_name
+        if isinstance(source, file):
+            size = os.fstat(source.fileno()).st_size
         else:
-            self.file_or_name.seek(0)
-            self.strdata = self.file_or_name.read()
-
-        return super(FileCharConfiguration, self).generate(**kwargs)
+            size = os.path.getsize(source)
+        # empty files can't be memory mapped
+        if size:
+            data = np.memmap(source, dtype=np.uint8, mode="r")
+        else:
+            data = np.zeros(0, dtype=np.uint8)
+        return self.decode(data, dtype)
 
 class ImageConfiguration(BaseConfiguration):
-    """Import an image file as a configuration."""
+    """Import an image file as a configuration.
+
+    PNG images are read without Qt, other formats need Qt. Every pixel
+    gets the value of its colour in the palette; with fuzz, colours that
+    are not in the palette get the value of the nearest one, otherwise they
+    get the value 1."""
 
     def __init__(self, filename, scale=1, palette=None, fuzz=False):
         self.filename = filename
 
         if palette is None:
-            from zasim.display.qt import PALETTE_32
+            from zasim.display.pngfile import PALETTE_32
             palette = PALETTE_32
         if isinstance(palette, list):
             palette = dict(enumerate(palette))
@@ -223,75 +342,140 @@ class ImageConfiguration(BaseConfiguration):
         self.scale = scale
         self.fuzz = fuzz
 
-    def generate(self, size_hint=None, dtype=default_dtype):
-        from .external.qt import QImage, QColor
-        from .display.qt import make_palette_qc
+    def load_colors(self):
+        """Load the image as an array of 32 bit colours with the y axis
+        first."""
+        from zasim.display.pngfile import is_png, read_png, pack_rgb
+        if is_png(self.filename):
+            return pack_rgb(read_png(self.filename))
+
+        from .external.qt import QImage
         image = QImage()
         assert image.load(self.filename)
         image = image.convertToFormat(QImage.Format_RGB32)
+        colors = np.frombuffer(image.bits(), dtype=np.uint32)
+        return colors.reshape((image.height(), image.width())).copy()
+
+    def generate(self, size_hint=None, dtype=default_dtype):
+        from zasim.display.pngfile import colors_to_values
+        colors = self.load_colors()
         if self.scale != 1:
-            image = image.scaled(image.width() // self.scale,
-                                 image.height() // self.scale)
-        if size_hint:
-            w, h = size_hint
-        else:
-            w, h = image.width(), image.height()
-
-        result = np.ones((w, h), dtype=dtype)
-
-        if self.fuzz:
-
-            def lowest_distance(color, palette):
-                min_dst = 1000000000
-                min_value = -1
-                for value, pcol in palette.iteritems():
-                    x1, y1, z1,_ = color.getHsv()
-                    x2, y2, z2,_ = pcol.getHsv()
-                    dist = (x1 - x2) ** 2 + (y1 - y2) ** 2 + (z1 - z2) ** 2
-                    if dist < min_dst:
-                        min_value = value
-                        min_dst = dist
-                return min_value
-
-            qc_pal = make_palette_qc(self.palette)
-            for x, y in product(range(image.width()), range(image.height())):
-                color = QColor.fromRgb(image.pixel(x, y))
-                value = lowest_distance(color, qc_pal)
-                result[x, y] = value
-        else:
-            nparr = np.frombuffer(image.bits(), dtype=np.uint32)
-            nparr = nparr.reshape((image.width(), image.height()), order="F")
-            for value, color in self.palette.iteritems():
-                result[nparr == color] = value
+            height, width = colors.shape
+            colors = colors[:height // self.scale * self.scale:self.scale,
+                            :width // self.scale * self.scale:self.scale]
 
-        return result
+        return colors_to_values(colors.T, self.palette, self.fuzz).astype(dtype)
 
 class PatternConfiguration(BaseConfiguration):
     """This generator accepts different patterns as lists of values and a
     layout that defines how those patterns make up the whole configuration.
 
     Pattern 0 will be used to fill the whole background, all others will
-    be embedded centered in the configuration according to `layout`."""
+    be embedded centered in the configuration according to `layout`.
+
+    Patterns may also be two-dimensional, with the x axis first. The
+    patterns of the layout are then put next to each other along the x axis
+    and centered along the y axis; one-dimensional patterns are treated as
+    a single row.
+
+    The configuration is generated in chunks of `chunk_size` cells, which
+    are tiled from the background and the layout, so that big
+    configurations only need the memory of the result."""
+
+    chunk_size = 2 ** 20
+    """How many cells to generate at once."""
+
     def __init__(self, patterns, layout):
-        self.patterns = [list(a) for a in patterns] # deep copy
+        self.patterns = [np.array(a).tolist() for a in patterns] # deep copy
         self.layout = tuple(layout)
 
-    def generate(self, size_hint=None, dtype=default_dtype):
-        assert len(size_hint) == 1, "two-dimensional pattern-based configs not supported yet."
+    def _blocks(self, dims):
+        """Turn the patterns into arrays with dims axes and put the ones of
+        the layout next to each other.
+
+        :returns: The background, the layout and an array, that tells which
+                  cells of the layout belong to a pattern."""
+        arrays = []
+        for pattern in self.patterns:
+            array = np.asarray(pattern)
+            if array.ndim > dims:
+                raise ValueError("Can't use a %d-dimensional pattern in a %d-dimensional configuration."
+                                 % (array.ndim, dims))
+            arrays.append(array.reshape(array.shape + (1,) * (dims - array.ndim)))
+
+        parts = [arrays[index] for index in self.layout]
+        if not parts:
+            return arrays[0], np.zeros((0,) * dims, dtype=arrays[0].dtype), np.zeros((0,) * dims, dtype=bool)
+        if dims == 1 or all(part.shape[1:] == parts[0].shape[1:] for part in parts):
+            layout = np.concatenate(parts)
+            return arrays[0], layout, np.ones(layout.shape, dtype=bool)
+
+        # center the patterns of different heights on each other.
+        height = max(part.shape[1] for part in parts)
+        layout = np.zeros((sum(len(part) for part in parts), height), dtype=np.result_type(*parts))
+        covered = np.zeros(layout.shape, dtype=bool)
+        x = 0
+        for part in parts:
+            y = (height - part.shape[1]) // 2
+            layout[x:x + len(part), y:y + part.shape[1]] = part
+            covered[x:x + len(part), y:y + part.shape[1]] = True
+            x += len(part)
+        return arrays[0], layout, covered
 
-        background = self.patterns[0] * (size_hint[0] // len(self.patterns[0]) + 1)
-        result = np.array(background[:size_hint[0]], dtype=dtype)
+    def size_hint_to_size(self, size_hint=None):
+        """Fill in the sizes, that the size hint leaves open, with the size
+        of the layout."""
+        if size_hint is None:
+            size_hint = (None,) * max(np.ndim(pattern) for pattern in self.patterns)
+        _, layout, _ = self._blocks(len(size_hint))
+        return tuple(max(1, layout.shape[axis]) if entry is None else entry
+                     for axis, entry in enumerate(size_hint))
 
-        internal_pattern = sum([self.patterns[idx] for idx in self.layout], [])
-        lendiff = size_hint[0] - len(internal_pattern)
-        if lendiff < 0:
-            result[0:-1] = internal_pattern[-lendiff//2:lendiff//2-1]
-        else:
-            middle = size_hint[0] // 2
-            halfwidth = len(internal_pattern) // 2
-            result[middle - halfwidth:middle - halfwidth + len(internal_pattern)] = internal_pattern
+    def generate(self, size_hint=None, dtype=default_dtype, out=None):
+        """Generate the configuration.
 
-        return result
+        :param out: An array to fill instead of creating a new one. This
+                    can be a `numpy.memmap`, as the configuration is
+                    generated in chunks of `chunk_size` cells."""
+        if out is None:
+            out = np.empty(self.size_hint_to_size(size_hint), dtype=dtype)
+        if not out.flags.c_contiguous:
+            raise ValueError("Can only generate into contiguous arrays.")
+
+        flat = out.reshape(-1)
+        for start in xrange(0, flat.size, self.chunk_size):
+            end = min(start + self.chunk_size, flat.size)
+            flat[start:end] = self.generate_chunk(out.shape, start, end)
+        return out
+
+    def generate_chunk(self, size, start, end):
+        """Generate the values of the cells from flat index start up to end
+        of a configuration of the given size."""
+        # one-dimensional configurations are made up of rows of one cell.
+        shape = tuple(size) + (1,) * (2 - len(size))
+        background, layout, covered = self._blocks(len(size))
+        background = background.reshape(len(background), -1)
+        # an empty layout can't guess the length of its rows.
+        layout = layout.reshape(len(layout), layout.size // len(layout) if len(layout) else 1)
+        covered = covered.reshape(layout.shape)
+
+        width, height = shape
+        first, last = start // height, -(-end // height)
+        rows = background[np.arange(first, last) % len(background)]
+        block = np.tile(rows, (1, -(-height // rows.shape[1])))[:, :height]
+
+        # the part of the layout, that lies in the rows of this chunk.
+        x = width // 2 - len(layout) // 2
+        y = height // 2 - layout.shape[1] // 2
+        x_from, x_to = max(x, first), min(x + len(layout), last)
+        y_from, y_to = max(y, 0), min(y + layout.shape[1], height)
+        if x_from < x_to and y_from < y_to:
+            np.copyto(block[x_from - first:x_to - first, y_from:y_to],
+                      layout[x_from - x:x_to - x, y_from - y:y_to - y],
+                      where=covered[x_from - x:x_to - x, y_from - y:y_to - y])
+
+        offset = first * height
+        return block.reshape(-1)[start - offset:end - offset]
 
 def function_of_radius(function, max_dist="diagonal"):
     """Turns a function that takes the radius and maximum distance as
@@ -308,6 +492,7 @@ def function_of_radius(function, max_dist="diagonal"):
             return math.sqrt(sum(squares))
 
     def wrapper(*args):
+        # the positions may be arrays of positions.
         dists = []
         half = len(args) // 2
         for num in range(half):
@@ -315,7 +500,7 @@ def function_of_radius(function, max_dist="diagonal"):
             dists.append(abs(center - args[num]))
 
         squares = [num ** 2 for num in dists]
-        dist = math.sqrt(sum(squares))
+        dist = np.sqrt(sum(squares))
 
         return function(dist, calc_max_dist(args[half:]))
 
@@ -337,44 +522,32 @@ class DensityDistributedConfiguration(RandomConfiguration):
     If a value is an integer, rather than a callable, then it will be
     interpreted as a constant function instead."""
 
-    def __init__(self, prob_dist_fun):
+    def __init__(self, prob_dist_fun, seed=None):
         self.prob_dist_fun = prob_dist_fun
-
-    def generate(self, size_hint=None, dtype=default_dtype):
-        size = self.size_hint_to_size(size_hint)
-
-        # XXX remove duplicate code here?
-        result = np.zeros(size, dtype)
-        if not HAVE_NUMPY_RANDOM and not HAVE_MULTIDIM:
-            # pypy compatibility
-            assert len(size) == 1
-            randoms = np.array([random.random() for i in xrange(size[0])])
-        elif not HAVE_NUMPY_RANDOM and HAVE_MULTIDIM:
-            randoms = np.array([random.random() for i in xrange(reduce(lambda a,b:a*b, size))])
-            randoms = randoms.reshape(*size)
-        else:
-            randoms = np.random.rand(*size)
-
-
-        for pos in product(*[xrange(siz) for siz in size]):
-            relative_probabs = {}
-            for key, func in self.prob_dist_fun.iteritems():
-                if isinstance(func, int):
-                    relative_probabs[key] = func
-                else:
-                    relative_probabs[key] = self.prob_dist_fun[key](*(pos + size))
-
-            one = sum(relative_probabs.values())
-            cumulative_percentages = {}
-            cumulative = 0
-            for key, relative_perc in relative_probabs.iteritems():
-                part = relative_perc / one
-                cumulative_percentages[key] = cumulative + part
-                cumulative += part
-
-            # XXX remove duplicate code here?
-            result[pos] = min(idx for idx, perc in cumulative_percentages.iteritems()
-                           if randoms[pos] < perc)
-
-        return result
-
+        self.set_seed(seed)
+
+    def evaluate(self, function, positions, size):
+        """Calculate the relative probabilities given by function for an
+        array of positions.
+
+        The function is called with arrays of positions first; if it can't
+        handle them, it is called for every position on its own."""
+        if isinstance(function, int):
+            return function
+        try:
+            result = np.asarray(function(*(positions + size)), dtype=float)
+            return np.broadcast_to(result, positions[0].shape)
+        except (TypeError, ValueError):
+            # things like "0 if x < 10 else 5" only work for single positions
+            return np.vectorize(function, otypes=[float])(*(positions + size))
+
+    def generate_chunk(self, size, start, end):
+        positions = np.unravel_index(np.arange(start, end), size)
+        keys = sorted(self.prob_dist_fun)
+        relative_probabs = np.empty((len(keys), end - start))
+        for row, key in zip(relative_probabs, keys):
+            row[:] = self.evaluate(self.prob_dist_fun[key], positions, tuple(size))
+
+        cumulative_percentages = relative_probabs.cumsum(axis=0) / relative_probabs.sum(axis=0)
+        index = (self.randoms(end - start) >= cumulative_percentages).sum(axis=0)
+        return np.array(keys)[index.clip(max=len(keys) - 1)]
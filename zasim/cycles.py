@@ -0,0 +1,141 @@
+"""This module offers the `CycleDetector`, that finds out when a deterministic
+simulator has run into a cycle.
+
+On a finite grid, a deterministic cellular automaton has to repeat a
+configuration at some point, after which it runs through the same
+configurations over and over again. The number of steps before the first
+configuration of the cycle is the transient, the length of the cycle is the
+period.
+
+Every configuration is reduced to a 64 bit hash, the sum of each cell's
+value times a random 64 bit weight for its position, modulo 2**64. This
+hash can be updated from only the cells that changed in a step. The hashes
+are fed to Brent's algorithm, which finds the period; the transient is
+then looked up in the recorded hashes.
+
+As hashes can collide, a cycle is only confirmed after the simulator has
+run through it once more and arrived at the exact same configuration.
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+import numpy as np
+
+class CycleDetector(object):
+    """Watch the configurations of a deterministic `CagenSimulator` for a
+    cycle.
+
+    Don't create this directly, use :meth:`CagenSimulator.enable_cycle_detection`.
+
+    The result is put into the target as the stat `cycle`, an array with the
+    transient and the period, which are -1 as long as no cycle has been
+    confirmed."""
+
+    transient = None
+    """The step number of the first configuration of the cycle."""
+
+    period = None
+    """The number of steps it takes to get back to the same configuration."""
+
+    def __init__(self, simulator, seed=0):
+        if getattr(simulator._step_func, "random", None) is not None:
+            raise ValueError("Can only detect cycles of deterministic step functions.")
+        if isinstance(simulator.get_config(), dict):
+            raise TypeError("Cycle detection can't handle subcell configurations.")
+        self._sim = simulator
+
+        size = int(np.prod(simulator.shape))
+        self._weights = np.random.RandomState(seed).randint(
+                0, 2 ** 62, size=size).astype(np.uint64) * np.uint64(4) + np.uint64(1)
+        simulator._target.cycle = np.array([-1, -1])
+        self.reset()
+
+    def reset(self):
+        """Forget everything and start looking for a cycle from the current
+        configuration."""
+        sim = self._sim
+        self.transient = self.period = None
+        sim._target.cycle[:] = -1
+
+        self._start = sim.step_number
+        self._last_step = sim.step_number
+        self._last_conf = sim.get_config().ravel()
+        self._hash = np.array([(self._last_conf.astype(np.uint64) * self._weights).sum()],
+                              dtype=np.uint64)
+        self._hashes = np.empty(1024, dtype=np.uint64)
+        self._hashes[0] = self._hash[0]
+
+        # state of brent's algorithm
+        self._power = self._lam = 1
+        self._tortoise = self._hash[0]
+
+        self._candidate = None
+
+    @property
+    def confirmed(self):
+        return self.period is not None
+
+    def stepped(self):
+        """Update the hash and look for a cycle after the simulator made a
+        step."""
+        sim = self._sim
+        if sim.step_number != self._last_step + 1:
+            self.reset()
+            return
+        self._last_step = sim.step_number
+        if self.confirmed:
+            return
+
+        activity = getattr(sim._target, "activity", None)
+        if activity is None or activity[1] != 0:
+            conf = sim.get_config_view().ravel()
+            changed = np.flatnonzero(conf != self._last_conf)
+            new = conf[changed]
+            self._hash += ((new.astype(np.uint64) - self._last_conf[changed].astype(np.uint64))
+                           * self._weights[changed]).sum(dtype=np.uint64)
+            self._last_conf[changed] = new
+
+        index = sim.step_number - self._start
+        if index >= len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.empty_like(self._hashes)])
+        self._hashes[index] = self._hash[0]
+
+        if self._candidate is not None:
+            self._confirm(index)
+        else:
+            self._brent_step()
+
+    def skipped(self):
+        """Accept the step number of the simulator after it skipped over
+        whole periods of the cycle."""
+        self._last_step = self._sim.step_number
+
+    def _brent_step(self):
+        hare = self._hash[0]
+        if hare == self._tortoise:
+            period = self._lam
+            index = self._sim.step_number - self._start
+            hashes = self._hashes[:index + 1]
+            transient = int(np.flatnonzero(hashes[:-period] == hashes[period:])[0])
+            self._candidate = (transient, period, index, self._last_conf.copy())
+            return
+
+        if self._power == self._lam:
+            self._tortoise = hare
+            self._power *= 2
+            self._lam = 0
+        self._lam += 1
+
+    def _confirm(self, index):
+        transient, period, found_at, conf = self._candidate
+        if index < found_at + period:
+            return
+        self._candidate = None
+        if (conf == self._last_conf).all():
+            self.transient = self._start + transient
+            self.period = period
+            self._sim._target.cycle[:] = self.transient, self.period
+        else:
+            # the hashes collided. keep on looking from here.
+            self._power = self._lam = 1
+            self._tortoise = self._hash[0]
@@ -0,0 +1,266 @@
+"""This module answers questions about the predecessors of configurations of
+one-dimensional elementary cellular automata with the help of their de
+Bruijn graphs.
+
+For a neighbourhood of `digits` cells and `base` possible values, the nodes
+of the de Bruijn graph are all combinations of ``digits - 1`` cell values.
+Every combination of `digits` values is an edge from the node made up of
+its first ``digits - 1`` values to the node made up of its last ones, and
+is labelled with the result the rule gives for it. A preimage of a
+configuration is then a path through the graph, whose edge labels spell
+out the configuration.
+
+Counting those paths is done by dynamic programming over the cells of the
+configuration, which takes time proportional to the width of the
+configuration times the number of edges. All calculations are done for a
+whole batch of rules at once; the first axis of every result is the rule.
+
+Three kinds of boundaries are supported:
+
+``periodic``
+    The preimage wraps around, like with the border copiers of
+    `zasim.cagen`.
+
+``fixed``
+    The cells outside of the preimage have a fixed value, like the zeros
+    in the borders when the borders are not copied.
+
+``open``
+    The preimage is wider than the configuration by the size of the
+    neighbourhood minus one, and the extra cells can have any value.
+
+A configuration without any open preimage is called an orphan; any
+configuration containing an orphan is a Garden of Eden, which can't be
+reached by any step at all. A rule has Gardens of Eden exactly if it has
+orphans, which is decided by following sets of nodes through the graph.
+
+.. testsetup::
+
+    from zasim.debruijn import *
+
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+from __future__ import absolute_import
+from .cagen.utils import rule_nr_to_rule_arr
+
+import numpy as np
+
+BOUNDARIES = ("periodic", "fixed", "open")
+
+class DeBruijnGraph(object):
+    """The de Bruijn graphs of a batch of elementary rules."""
+
+    def __init__(self, rules, digits=3, base=2):
+        """:param rules: A rule number or a list of rule numbers.
+        :param digits: The number of cells in the neighbourhood. The
+                       neighbourhood has to be contiguous, with the cell
+                       itself in the middle, or just right of the middle
+                       for an even number of cells.
+        :param base: The number of possible cell values."""
+        self.single = isinstance(rules, (int, long, np.integer))
+        self.rules = [rules] if self.single else list(rules)
+        self.digits = digits
+        self.base = base
+        self.left = digits // 2
+        """How many cells to the left the neighbourhood reaches."""
+
+        self.nodes = base ** (digits - 1)
+        """The number of nodes in each graph."""
+
+        self.tables = np.array([rule_nr_to_rule_arr(rule, digits, base) for rule in self.rules],
+                               dtype=np.int8).reshape(len(self.rules), base ** digits)
+        """The result of each rule for each combination of neighbourhood
+        values. The combination is read as a number with the leftmost cell
+        as the highest digit."""
+
+    @classmethod
+    def from_simulator(cls, simulator):
+        """Create the graph for the rule of an `ElementarySimulator`."""
+        offsets = [offset for (offset,) in simulator._step_func.neigh.offsets]
+        if offsets != range(offsets[0], offsets[0] + len(offsets)) or offsets[0] != -(len(offsets) // 2):
+            raise ValueError("Need a contiguous one-dimensional neighbourhood.")
+        return cls(simulator.rule_number, len(offsets), len(simulator.t.possible_values))
+
+    def _result(self, value):
+        return value[0] if self.single else value
+
+    def _digits_of(self, nodes):
+        """Split node numbers into their cell values, leftmost first."""
+        powers = self.base ** np.arange(self.digits - 2, -1, -1)
+        return (np.asarray(nodes)[..., None] // powers) % self.base
+
+    def _boundary_vectors(self, boundary, border):
+        nodes = np.arange(self.nodes)
+        if boundary == "open":
+            return np.ones(self.nodes, dtype=bool), np.ones(self.nodes, dtype=bool)
+        elif boundary == "fixed":
+            digits = self._digits_of(nodes)
+            start = (digits[:, :self.left] == border).all(axis=1)
+            end = (digits[:, self.left:] == border).all(axis=1)
+            return start, end
+        raise ValueError("boundary has to be one of %s" % (BOUNDARIES,))
+
+    def _step_counts(self, counts, value):
+        """Follow all edges labelled with value.
+
+        :param counts: The number of paths ending in each node, with the
+                       node as the last axis and the rule as the first."""
+        base, nodes = self.base, self.nodes
+        matches = (self.tables == value).reshape((len(self.rules),) + (1,) * (counts.ndim - 2) + (-1,))
+        # edge number p goes from node p // base to node p % nodes
+        spread = np.repeat(counts, base, axis=-1) * matches
+        return spread.reshape(counts.shape[:-1] + (base, nodes)).sum(axis=-2)
+
+    def _dtype_for(self, width):
+        if self.base ** (width + self.digits) >= 2 ** 62:
+            return object
+        return np.int64
+
+    def count_preimages(self, config, boundary="periodic", border=0):
+        """Count the preimages of a configuration for each rule.
+
+        :param config: A one-dimensional configuration.
+        :param boundary: One of ``periodic``, ``fixed`` or ``open``.
+        :param border: The value of the cells outside of the preimage for
+                       ``fixed`` boundaries.
+        :returns: The number of preimages for each rule, or just one number
+                  if only one rule was given."""
+        config = np.asarray(config).ravel()
+        rules = len(self.rules)
+        dtype = self._dtype_for(len(config))
+        if boundary == "periodic":
+            if len(config) < self.digits - 1:
+                raise ValueError("periodic configurations must be at least %d cells wide"
+                                 % (self.digits - 1))
+            # follow the paths from every node separately and count the ones
+            # that return to where they started.
+            counts = np.zeros((rules, self.nodes, self.nodes), dtype=dtype)
+            counts[:, np.arange(self.nodes), np.arange(self.nodes)] = 1
+            for value in config:
+                counts = self._step_counts(counts, value)
+            result = counts.diagonal(axis1=1, axis2=2).sum(axis=1)
+        else:
+            start, end = self._boundary_vectors(boundary, border)
+            counts = np.zeros((rules, self.nodes), dtype=dtype)
+            counts[:, start] = 1
+            for value in config:
+                counts = self._step_counts(counts, value)
+            result = counts[:, end].sum(axis=1)
+        return self._result(result)
+
+    def preimages(self, config, boundary="periodic", border=0, rule=None):
+        """Enumerate the preimages of a configuration for one rule.
+
+        :param rule: The rule number to use, if the graph was created for
+                     more than one rule.
+        :returns: A generator of arrays. For ``open`` boundaries, they are
+                  wider than the configuration by ``digits - 1`` cells."""
+        index = 0 if rule is None else self.rules.index(rule)
+        table = self.tables[index]
+        config = np.asarray(config).ravel()
+        width = len(config)
+        base, nodes = self.base, self.nodes
+
+        if boundary == "periodic":
+            starts = range(nodes)
+        else:
+            start, end = self._boundary_vectors(boundary, border)
+            starts = np.flatnonzero(start)
+
+        for first in starts:
+            if boundary == "periodic":
+                end = np.zeros(nodes, dtype=bool)
+                end[first] = True
+            # how many ways there are from each node after each cell to the end
+            remaining = [end.astype(np.int64)]
+            for value in config[::-1]:
+                after = remaining[-1]
+                spread = (after[np.arange(nodes * base) % nodes] * (table == value))
+                remaining.append(spread.reshape(nodes, base).sum(axis=1))
+            remaining.reverse()
+            if not remaining[0][first]:
+                continue
+
+            for path in self._walk(table, config, remaining, first):
+                # the digits along the path are the cells of the preimage,
+                # starting self.left cells left of the configuration.
+                digits = np.array(list(self._digits_of(first)) + path)
+                if boundary == "open":
+                    yield digits
+                else:
+                    yield digits[self.left:self.left + width]
+
+    def _walk(self, table, config, remaining, node):
+        base, nodes = self.base, self.nodes
+        stack = [(0, node, [])]
+        while stack:
+            position, node, path = stack.pop()
+            if position == len(config):
+                yield path
+                continue
+            for value in range(base - 1, -1, -1):
+                edge = node * base + value
+                following = edge % nodes
+                if table[edge] == config[position] and remaining[position + 1][following]:
+                    stack.append((position + 1, following, path + [value]))
+
+    def _subset_transitions(self):
+        """For every rule, value and set of nodes, find the set of nodes
+        that can be reached over an edge labelled with that value."""
+        base, nodes = self.base, self.nodes
+        subsets = 2 ** nodes
+        members = (np.arange(subsets)[:, None] >> np.arange(nodes)) & 1
+        edges = np.arange(nodes * base)
+        transitions = np.empty((len(self.rules), base, subsets), dtype=np.int64)
+        for value in range(base):
+            # adjacency[rule, from, to]
+            adjacency = np.zeros((len(self.rules), nodes, nodes), dtype=np.int64)
+            rule_index, edge = np.nonzero(self.tables == value)
+            adjacency[rule_index, edge // base, edge % nodes] = 1
+            reached = np.einsum("sn,rnm->rsm", members, adjacency) > 0
+            transitions[:, value] = (reached * (1 << np.arange(nodes))).sum(axis=-1)
+        return transitions
+
+    def has_garden_of_eden(self):
+        """Find out for each rule, whether there are configurations that
+        can't be reached by any step.
+
+        This follows all sets of nodes, so it is only feasible for small
+        neighbourhoods."""
+        transitions = self._subset_transitions()
+        rules, subsets = len(self.rules), 2 ** self.nodes
+        reached = np.zeros((rules, subsets), dtype=bool)
+        reached[:, subsets - 1] = True
+        rows = np.repeat(np.arange(rules)[:, None], subsets, axis=1)
+        while True:
+            before = reached.copy()
+            for value in range(self.base):
+                np.logical_or.at(reached, (rows, transitions[:, value]), before)
+            if (reached == before).all():
+                break
+        return self._result(reached[:, 0])
+
+    def find_orphan(self, rule=None):
+        """Find one of the shortest configurations without any preimage,
+        or None, if the rule has no Gardens of Eden."""
+        index = 0 if rule is None else self.rules.index(rule)
+        transitions = self._subset_transitions()[index]
+        full = 2 ** self.nodes - 1
+        parents = {full: None}
+        queue = [full]
+        for subset in queue:
+            for value in range(self.base):
+                following = transitions[value, subset]
+                if following in parents:
+                    continue
+                parents[following] = (subset, value)
+                if following == 0:
+                    orphan = []
+                    while parents[following] is not None:
+                        following, value = parents[following]
+                        orphan.append(value)
+                    return np.array(orphan[::-1])
+                queue.append(following)
+        return None
@@ -22,6 +22,37 @@ HTML_PALETTE = "#000 #fff #f00 #00f #0f0 #ff0 #0ff #f0f".split(" ")
 PALETTE = dict(enumerate(PALETTE))
 HTML_PALETTE = dict(enumerate(HTML_PALETTE))
 
+def palette_bytes(palette):
+    """Turn a palette into a dictionary of value to the utf8 bytes of its
+    representation."""
+    if isinstance(palette, list):
+        palette = dict(enumerate(palette))
+    return dict((value, text.encode("utf8") if isinstance(text, unicode) else text)
+                for value, text in palette.iteritems())
+
+def values_to_lines(values, palette, missing="X"):
+    """Turn each row of a two-dimensional array of values into a line of
+    text, by looking up the bytes of every value in a table.
+
+    :param missing: The text to use for values that are not in the
+                    palette."""
+    palette = palette_bytes(palette)
+    keys = np.array(sorted(palette))
+    texts = [palette[key] for key in keys] + [missing]
+    lengths = np.array([len(text) for text in texts])
+    table = np.zeros((len(texts), lengths.max()), dtype=np.uint8)
+    for row, text in zip(table, texts):
+        row[:len(text)] = np.frombuffer(text, dtype=np.uint8)
+
+    values = np.asarray(values)
+    index = np.searchsorted(keys, values).clip(max=len(keys) - 1)
+    index[keys[index] != values] = len(keys)
+    encoded = table[index]
+    if (lengths == lengths[0]).all():
+        return [line.tostring() for line in encoded.reshape(len(values), -1)]
+    used = np.arange(table.shape[1]) < lengths[index][..., None]
+    return [line[mask].tostring() for line, mask in zip(encoded, used)]
+
 class BaseConsolePainter(QObject):
     """This is a base class for implementing renderers that output the
     configuration of a simulator as an ascii-art string."""
@@ -61,7 +92,7 @@ class BaseConsolePainter(QObject):
         self._sim.snapshot_restored.connect(self.conf_replaced)
 
     def after_step(self, update_step=True):
-        self._last_conf = self._sim.get_config().copy()
+        self._last_conf = self._sim.get_config_view()
         self.draw_conf(update_step)
         if self._auto_output:
             print str(self),
@@ -123,8 +154,7 @@ class OneDimConsolePainter(BaseConsolePainter):
         self.after_step()
 
     def draw_conf(self, update_step=True):
-        # FIXME: numpypy int32 won't hash to the same as pythons int.
-        newline = "".join(self.palette.get(int(value), "X") for value in self._last_conf)
+        newline = values_to_lines(self._last_conf[None], self.palette)[0]
         if len(self._data) == self._lines and update_step:
             self._data.pop(0)
         elif not update_step:
@@ -150,18 +180,15 @@ class TwoDimConsolePainter(BaseConsolePainter):
         self.after_step()
 
     def draw_conf(self, update_step=True):
-        self._data = []
-        for line in self._last_conf.T:
-            # FIXME: numpypy int32 won't hash to the same as pythons int.
-            newline = "".join(self.palette[int(value)] for value in line)
-            self._data.append(newline)
+        self._data = values_to_lines(self._last_conf.T, self.palette)
 
     def __str__(self):
         return "\n".join(self._data + [""])
 
     def export(self, filename):
+        lines = values_to_lines(self._last_conf.T, self.palette)
         with open(filename, "w") as out:
-            out.write("\n".join(self._data + [""]))
+            out.write("\n".join(lines + [""]))
 
 class MultilineOneDimConsolePainter(BaseConsolePainter):
     """A painter for multiline palettes (as described in `convert_palette`)."""
@@ -0,0 +1,321 @@
+"""This module reads and writes PNG images as numpy arrays without the help
+of Qt or any other imaging library, and turns the colours of images into
+cell values with a palette.
+
+Palettes map cell values to colours packed into 32 bit integers as
+``0xAARRGGBB``, like `PALETTE_32`; the alpha part is ignored when
+comparing colours.
+
+Only images without interlacing can be read. Undoing the filters of the
+PNG format is done for a whole anti-diagonal of pixels at once, as each
+pixel only depends on the pixels left of and above it.
+
+.. testsetup::
+
+    from zasim.display.pngfile import *
+
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+from __future__ import absolute_import
+
+import numpy as np
+import struct
+import zlib
+
+PALETTE_32 = dict(enumerate([0xff000000, 0xffffffff, 0xffff0000, 0xff0000ff, 0xff00ff00, 0xffffff00, 0xff00ffff, 0xffff00ff]))
+
+SIGNATURE = "\x89PNG\r\n\x1a\n"
+
+_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+"""How many samples each pixel has for each colour type."""
+
+def is_png(filename):
+    """Find out, if a file starts like a PNG image."""
+    with open(filename, "rb") as image:
+        return image.read(len(SIGNATURE)) == SIGNATURE
+
+def _chunks(data):
+    position = len(SIGNATURE)
+    while position < len(data):
+        length, kind = struct.unpack(">I4s", data[position:position + 8])
+        content = data[position + 8:position + 8 + length]
+        crc, = struct.unpack(">I", data[position + 8 + length:position + 12 + length])
+        if zlib.crc32(kind + content) & 0xffffffff != crc:
+            raise ValueError("The %s chunk of the image is broken." % kind)
+        yield kind, content
+        position += 12 + length
+
+def _paeth(left, up, upleft):
+    # the distances of left + up - upleft to left, up and upleft
+    to_left, to_up, to_upleft = abs(up - upleft), abs(left - upleft), abs(left + up - 2 * upleft)
+    return np.where((to_left <= to_up) & (to_left <= to_upleft), left,
+                    np.where(to_up <= to_upleft, up, upleft))
+
+def _unfilter(data, height, rowbytes, bpp):
+    """Undo the filter of every row.
+
+    :param bpp: The number of bytes that make up one pixel, at least 1."""
+    raw = np.frombuffer(data, dtype=np.uint8)[:height * (rowbytes + 1)]
+    raw = raw.reshape(height, rowbytes + 1)
+    filters, rows = raw[:, 0], raw[:, 1:]
+    if (filters > 4).any():
+        raise ValueError("Unknown filter type in image.")
+    if (filters == 0).all():
+        return rows.copy()
+
+    units = rowbytes // bpp
+    rows = rows.reshape(height, units, bpp).astype(np.int32)
+    if (filters <= 1).all():
+        # every row only depends on itself
+        sub = filters == 1
+        rows[sub] = rows[sub].cumsum(axis=1) % 256
+        return rows.astype(np.uint8).reshape(height, rowbytes)
+
+    # padded with a row above and a column left of the image and flattened,
+    # so that every anti-diagonal is a strided slice.
+    stride = units + 1
+    padded = np.zeros((height + 1, stride, bpp), dtype=np.int16)
+    padded[1:, 1:] = rows
+    rows = padded.reshape(-1, bpp)
+    recon = np.zeros_like(rows)
+    # how many rows of each filter type come before each row
+    counts = np.zeros((5, height + 1), dtype=np.intp)
+    counts[:, 1:] = (filters == np.arange(5)[:, None]).cumsum(axis=1)
+    filters = filters[:, None]
+    predictors = [lambda left, up, upleft: 0,
+                  lambda left, up, upleft: left,
+                  lambda left, up, upleft: up,
+                  lambda left, up, upleft: (left + up) // 2,
+                  _paeth]
+    for diagonal in xrange(height + units - 1):
+        low, high = max(0, diagonal - units + 1), min(height, diagonal + 1)
+        start = (low + 1) * stride + diagonal - low + 1
+        stop = start + (high - low - 1) * units + 1
+        left = recon[start - 1:stop - 1:units]
+        up = recon[start - stride:stop - stride:units]
+        upleft = recon[start - stride - 1:stop - stride - 1:units]
+        present = np.flatnonzero(counts[:, high] != counts[:, low])
+        if len(present) == 1:
+            predictor = predictors[present[0]](left, up, upleft)
+        else:
+            predictor = np.choose(filters[low:high],
+                                  [predictors[kind](left, up, upleft) if kind in present else 0
+                                   for kind in range(5)])
+        recon[start:stop:units] = (rows[start:stop:units] + predictor) % 256
+    return recon.reshape(height + 1, stride * bpp)[1:, bpp:].astype(np.uint8)
+
+def read_png(file_or_name):
+    """Read a PNG image.
+
+    :returns: An array of shape (height, width, 3) with the red, green and
+              blue value of every pixel. The alpha channel is dropped and
+              16 bit images are reduced to 8 bits."""
+    if isinstance(file_or_name, basestring):
+        with open(file_or_name, "rb") as image:
+            data = image.read()
+    else:
+        data = file_or_name.read()
+    if not data.startswith(SIGNATURE):
+        raise ValueError("Not a PNG image.")
+
+    header, palette, compressed = None, None, []
+    for kind, content in _chunks(data):
+        if kind == "IHDR":
+            header = struct.unpack(">IIBBBBB", content)
+        elif kind == "PLTE":
+            palette = np.frombuffer(content, dtype=np.uint8).reshape(-1, 3)
+        elif kind == "IDAT":
+            compressed.append(content)
+        elif kind == "IEND":
+            break
+    if header is None:
+        raise ValueError("The image has no header.")
+
+    width, height, depth, colortype, _, _, interlace = header
+    if interlace:
+        raise ValueError("Interlaced images are not supported.")
+    if colortype not in _CHANNELS:
+        raise ValueError("Unknown colour type %d." % colortype)
+    channels = _CHANNELS[colortype]
+    bits = depth * channels
+    rowbytes = (width * bits + 7) // 8
+    rows = _unfilter(zlib.decompress("".join(compressed)), height, rowbytes, max(1, bits // 8))
+
+    if depth == 16:
+        samples = rows.reshape(height, width, channels, 2)[..., 0]
+    elif depth == 8:
+        samples = rows.reshape(height, width, channels)
+    else:
+        unpacked = np.unpackbits(rows, axis=1)[:, :width * depth].reshape(height, width, depth)
+        samples = (unpacked * (1 << np.arange(depth - 1, -1, -1))).sum(axis=2)[..., None]
+        if colortype == 0:
+            samples = samples * (255 // ((1 << depth) - 1))
+        samples = samples.astype(np.uint8)
+
+    if colortype == 3:
+        if palette is None:
+            raise ValueError("The image has no palette.")
+        return palette[samples[..., 0]]
+    elif colortype in (0, 4):
+        return np.repeat(samples[..., :1], 3, axis=2)
+    return samples[..., :3].copy()
+
+def write_png(file_or_name, rgb, filter_type=0):
+    """Write an array of shape (height, width, 3) as an 8 bit RGB image.
+
+    :param filter_type: The PNG filter to use for all rows, or a list with
+                        one filter for each row."""
+    rgb = np.asarray(rgb, dtype=np.uint8)
+    height, width = rgb.shape[:2]
+    rows = rgb.reshape(height, width * 3).astype(np.int32)
+    filters = np.zeros(height, dtype=np.int32) + filter_type
+
+    left = np.zeros_like(rows)
+    left[:, 3:] = rows[:, :-3]
+    up = np.zeros_like(rows)
+    up[1:] = rows[:-1]
+    upleft = np.zeros_like(rows)
+    upleft[1:, 3:] = rows[:-1, :-3]
+    predictor = np.choose(filters[:, None], [0, left, up, (left + up) // 2, _paeth(left, up, upleft)])
+
+    raw = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 0] = filters
+    raw[:, 1:] = (rows - predictor) % 256
+
+    def chunk(kind, content):
+        return (struct.pack(">I", len(content)) + kind + content
+                + struct.pack(">I", zlib.crc32(kind + content) & 0xffffffff))
+
+    data = (SIGNATURE
+            + chunk("IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk("IDAT", zlib.compress(raw.tostring()))
+            + chunk("IEND", ""))
+    if isinstance(file_or_name, basestring):
+        with open(file_or_name, "wb") as image:
+            image.write(data)
+    else:
+        file_or_name.write(data)
+
+def pack_rgb(rgb):
+    """Pack the last axis of an array of red, green and blue values into
+    32 bit colours.
+
+    >>> hex(int(pack_rgb([255, 128, 0])))
+    '0xffff8000'"""
+    rgb = np.asarray(rgb, dtype=np.uint32)
+    return np.uint32(0xff000000) | (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+def unpack_rgb(colors):
+    """Split 32 bit colours into an array with the red, green and blue value
+    along the last axis."""
+    colors = np.asarray(colors, dtype=np.uint32)
+    return np.stack([(colors >> 16) & 0xff, (colors >> 8) & 0xff, colors & 0xff], axis=-1).astype(np.uint8)
+
+def colors_to_values(colors, palette=PALETTE_32, fuzz=False, default=1, chunk_size=2 ** 16):
+    """Find the value of the palette entry for each of an array of 32 bit
+    colours.
+
+    :param fuzz: If True, colours that are not in the palette get the value
+                 of the nearest colour of the palette. Otherwise, they get
+                 the default value.
+    :param chunk_size: How many different colours to compare to the whole
+                       palette at once.
+
+    >>> colors_to_values(pack_rgb([[0, 0, 0], [250, 10, 0], [255, 255, 255]]), fuzz=True).tolist()
+    [0, 2, 1]"""
+    if isinstance(palette, list):
+        palette = dict(enumerate(palette))
+    colors = np.asarray(colors, dtype=np.uint32) & 0xffffff
+    values = np.array(palette.keys())
+    palette_colors = np.array(palette.values(), dtype=np.uint32) & 0xffffff
+
+    order = np.argsort(palette_colors)
+    palette_colors, values = palette_colors[order], values[order]
+    index = np.searchsorted(palette_colors, colors).clip(max=len(palette_colors) - 1)
+    found = palette_colors[index] == colors
+
+    result = np.empty(colors.shape, dtype=values.dtype)
+    result[found] = values[index[found]]
+    if found.all():
+        return result
+    if not fuzz:
+        result[~found] = default
+        return result
+
+    # look up each of the missing colours only once.
+    missing, inverse = np.unique(colors[~found], return_inverse=True)
+    palette_rgb = unpack_rgb(palette_colors).astype(np.int32)
+    nearest = np.empty(len(missing), dtype=np.intp)
+    for start in xrange(0, len(missing), chunk_size):
+        rgb = unpack_rgb(missing[start:start + chunk_size]).astype(np.int32)
+        distances = ((rgb[:, None, :] - palette_rgb[None, :, :]) ** 2).sum(axis=2)
+        nearest[start:start + chunk_size] = distances.argmin(axis=1)
+    result[~found] = values[nearest][inverse]
+    return result
+
+class ColorTable(object):
+    """Look up the colours of a palette for arrays of cell values with a
+    single `numpy.take`.
+
+    Palettes with small, non-negative values get a table with one entry
+    per possible value, others, like the bit mask states of
+    `zasim.cagen.jvn`, are looked up with `numpy.searchsorted` first.
+    Values that are not in the palette get the colour `missing`.
+
+    >>> table = ColorTable({0: 0xff000000, 1: 0xffffffff, 1000: 0xffff0000})
+    >>> [hex(int(color)) for color in table.lookup([1, 1000, 7])]
+    ['0xffffffff', '0xffff0000', '0xff000000']"""
+
+    missing = 0xff000000
+    """The colour of values, that are not in the palette."""
+
+    def __init__(self, palette, missing=None):
+        """:param palette: A dictionary or list of value to colour.
+        :param missing: Overrides the colour of missing values."""
+        if missing is not None:
+            self.missing = missing
+        if isinstance(palette, list):
+            palette = dict(enumerate(palette))
+        self.palette = dict(palette)
+        keys = np.array(sorted(self.palette), dtype=np.int64)
+        colors = np.array([self.palette[key] for key in keys] + [self.missing], dtype=np.uint32)
+
+        self.dense = len(keys) == 0 or (keys[0] >= 0 and keys[-1] < max(256, 8 * len(keys)))
+        if self.dense:
+            # the last entry is for everything that is not in the palette.
+            self.table = np.empty((keys[-1] + 2) if len(keys) else 1, dtype=np.uint32)
+            self.table.fill(self.missing)
+            self.table[keys] = colors[:-1]
+        else:
+            self.keys = keys
+            self.table = colors
+
+    def indices(self, values):
+        """Find the index into `table` for each value."""
+        values = np.asarray(values)
+        if values.dtype.kind not in "iu":
+            values = values.astype(np.int64)
+        if self.dense:
+            if values.dtype.kind == "i" and values.dtype.itemsize < 8:
+                # negative values become huge and get clipped to the last
+                # entry.
+                values = values.view(values.dtype.str.replace("i", "u"))
+            elif values.dtype.kind == "i":
+                values = np.where(values < 0, len(self.table) - 1, values)
+            return values
+        index = self.keys.searchsorted(values).clip(max=len(self.keys) - 1)
+        index[self.keys[index] != values] = len(self.keys)
+        return index
+
+    def lookup(self, values, out=None):
+        """Get the colour of each of an array of values.
+
+        :param out: An array of 32 bit colours to write the result to."""
+        return np.take(self.table, self.indices(values), out=out, mode="clip")
+
+def values_to_colors(values, palette=PALETTE_32):
+    """Turn an array of cell values into 32 bit colours, the reverse of
+    `colors_to_values`."""
+    return ColorTable(palette).lookup(values)
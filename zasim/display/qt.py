@@ -9,6 +9,8 @@ from __future__ import absolute_import
 
 from ..external.qt import (QObject, QPixmap, QImage, QPainter, QPoint, QSize, QRect,
                            QPen, QBrush, QLine, QColor, QBuffer, QIODevice, Signal, Qt)
+from .pngfile import PALETTE_32, ColorTable
+from .tiles import TileSet
 
 import numpy as np
 import time
@@ -67,8 +69,6 @@ def generate_tile_atlas(filename_map, common_prefix=""):
 
     return new_image, palette_rect
 
-PALETTE_32 = dict(enumerate([0xff000000, 0xffffffff, 0xffff0000, 0xff0000ff, 0xff00ff00, 0xffffff00, 0xff00ffff, 0xffff00ff]))
-
 def make_palette_qc(pal):
     """Turn a 32bit color palette into a QColor palette."""
     result = {}
@@ -195,79 +195,126 @@ def qimage_to_pngstr(image):
     buf.close()
     return str(buf.data())
 
-_last_rendered_state_conf = None
-def render_state_array(states, palette=PALETTE_32, region=None):
-    global _last_rendered_state_conf
-    if len(states.shape) == 1:
-        states = states.reshape((states.shape[0], 1))
-    if region:
-        x, y, w, h = region
-        conf = states[x:x+w, y:y+h]
-    else:
-        x, y = 0, 0
-        w, h = states.shape
-        conf = states
-    nconf = np.empty((w, h), np.uint32, "F")
+class StateArrayRenderer(object):
+    """Render arrays of states to QImages with the colours of a palette.
+
+    The renderer owns the buffer, that the images point to, and reuses it
+    for every image, so an image is only valid until the next one is
+    rendered; copy it to keep it around for longer. The colour table is
+    only built again when the palette changes."""
+
+    def __init__(self):
+        self._palette = None
+        self._table = None
+        self._buffer = np.empty(0, dtype=np.uint32)
+
+    def table(self, palette):
+        """Get the `ColorTable` for the palette."""
+        if self._table is None or self._palette != palette:
+            self._table = ColorTable(palette)
+            self._palette = dict(palette) if isinstance(palette, dict) else list(palette)
+        return self._table
+
+    def render(self, states, palette=PALETTE_32, region=None):
+        """Render states, or the region (x, y, w, h) of them, to a QImage."""
+        if len(states.shape) == 1:
+            states = states.reshape((states.shape[0], 1))
+        if region:
+            x, y, w, h = region
+            conf = states[x:x+w, y:y+h]
+        else:
+            conf = states
+        w, h = conf.shape
 
-    for num, value in palette.iteritems():
-        nconf[conf == num] = value
+        if self._buffer.size < w * h:
+            self._buffer = np.empty(w * h, dtype=np.uint32)
+        # the image has the rows of the configuration one after the other.
+        nconf = self._buffer[:w * h].reshape((h, w))
+        self.table(palette).lookup(conf.T, out=nconf)
 
-    image = QImage(nconf.data, w, h, QImage.Format_RGB32)
+        return QImage(nconf.data, w, h, QImage.Format_RGB32)
 
-    # without this cheap trick, the data from the array is imemdiately freed and
-    # subsequently re-used, leading to the first pixels in the top left corner
-    # getting pretty colors and zasim eventually crashing.
-    _last_rendered_state_conf = nconf
-    return image
+def render_state_array(states, palette=PALETTE_32, region=None):
+    """Render states, or the region (x, y, w, h) of them, to a QImage with
+    the colours of the palette.
+
+    The image has its own copy of the pixels; painters, that render often,
+    use a `StateArrayRenderer` instead."""
+    return StateArrayRenderer().render(states, palette, region).copy()
+
+def tile_set_from_atlas(atlas, rects):
+    """Cut the tiles out of a texture atlas, like the one
+    `generate_tile_atlas` creates, into a `TileSet`.
+
+    :param atlas: The atlas as a QPixmap or QImage.
+    :param rects: A dictionary from state value to rect in the atlas."""
+    if isinstance(atlas, QPixmap):
+        atlas = atlas.toImage()
+    image = atlas.convertToFormat(QImage.Format_RGB32)
+    colors = np.frombuffer(image.bits(), dtype=np.uint32)
+    colors = colors.reshape((image.height(), image.width()))
+
+    values = list(rects.keys())
+    tiles = [colors[rects[value].y():rects[value].y() + rects[value].height(),
+                    rects[value].x():rects[value].x() + rects[value].width()]
+             for value in values]
+    return TileSet(np.array(tiles), values)
+
+class TileRenderer(object):
+    """Render arrays of states to QImages made up of the tiles of a texture
+    atlas.
+
+    The tiles are cut out of the atlas only once. Every frame is then
+    composed into a buffer owned by the renderer, so that Qt only has to
+    draw one image, which is only valid until the next frame is rendered."""
+
+    def __init__(self, atlas, rects):
+        self.tiles = tile_set_from_atlas(atlas, rects)
+        self._buffer = np.empty(0, dtype=np.uint32)
+
+    def render(self, states, region=None):
+        """Render states, or the region (x, y, w, h) of them, to a QImage."""
+        if len(states.shape) == 1:
+            states = states.reshape((states.shape[0], 1))
+        if region:
+            x, y, w, h = region
+            states = states[x:x+w, y:y+h]
+        width, height = self.tiles.frame_size(*states.shape)
+
+        if self._buffer.size < width * height:
+            self._buffer = np.empty(width * height, dtype=np.uint32)
+        frame = self.tiles.render(states, out=self._buffer)
+
+        return QImage(frame.data, width, height, QImage.Format_RGB32)
+
+    def draw(self, painter, states, region=None):
+        """Draw states, or the region of them, with a painter, that is
+        scaled so that one cell is one unit big."""
+        image = self.render(states, region)
+        size = QSize(image.width() / self.tiles.tile_width,
+                     image.height() / self.tiles.tile_height)
+        painter.drawImage(QRect(QPoint(0, 0), size), image)
 
 def render_state_array_tiled(states, palette, rects, region=None, painter=None):
-    """Using a texture atlas and a dictionary of pixmap fragment "factories",
-    draw a configuration using graphical tiles.
+    """Using a texture atlas and a dictionary of rects into it, draw a
+    configuration using graphical tiles.
 
     :param states: The array of states to render.
     :param palette: The image to use.
     :param rects: A dictionary from state value to rect in the image.
     :param region: What part of the config to render (x, y, w, h).
-    """
-
-    if region:
-        x, y, w, h = region
-        try:
-            conf = states[x:x+w, y:y+h]
-        except IndexError:
-            # this is 1d :(
-            assert h == 1
-            states = states.reshape((states.shape[0], h))
-            conf = states[x:x+w, y:y+h]
+    :param painter: A painter, that is scaled so that one cell is one unit
+                    big, to draw with.
+    :returns: A QPixmap of the configuration, if no painter was given.
 
-        w, h = conf.shape
+    Painters, that render often, use a `TileRenderer` instead, so that the
+    atlas doesn't have to be cut into tiles for every frame.
+    """
+    renderer = TileRenderer(palette, rects)
+    if painter:
+        renderer.draw(painter, states, region)
     else:
-        x, y = 0, 0
-        try:
-            w, h = states.shape
-        except ValueError:
-            # the shape is 1d only
-            w, = states.shape
-            h = 1
-            states = states.reshape((w,h))
-        conf = states
-
-    if not painter:
-        tilesize = rects.values()[0].size()
-        result = QPixmap(QSize(w * tilesize.width(), h * tilesize.height()))
-        painter =  QPainter(result)
-        painter.scale(tilesize.width(), tilesize.height())
-
-    positions = product(xrange(w), xrange(h))
-
-    values = [(pos, conf[pos]) for pos in positions]
-    fragments = [(QPoint(pos[0], pos[1]), rects[value]) for pos, value in values]
-
-    for dest, src in fragments:
-        painter.drawPixmap(QRect(dest, QSize(1, 1)), palette, src)
-
-    if not painter:
-        return result
+        return QPixmap.fromImage(renderer.render(states, region))
 
 class BaseQImagePainter(QObject):
     """This is a base class for implementing renderers for configs based on
@@ -305,6 +352,8 @@ class BaseQImagePainter(QObject):
         self.next_frame = 0
         self._skip_all_frames = False
 
+        self._renderer = StateArrayRenderer()
+
         if 'colors32' not in self._sim.palette_info:
             if len(self._sim.t.possible_values) > len(PALETTE_32):
                 self.palette = make_gray_palette(self._sim.t.possible_values)
@@ -459,7 +508,7 @@ class OneDimQImagePainter(BaseQImagePainter):
             return
 
         self._queued_steps -= rendered
-        _image = render_state_array(whole_conf, self.palette, (0, 0, w, rendered))
+        _image = self._renderer.render(whole_conf, self.palette, (0, 0, w, rendered))
         _image = _image.scaled(w * self._scale, rendered * self._scale)
 
         painter = QPainter(self._image)
@@ -469,7 +518,7 @@ class OneDimQImagePainter(BaseQImagePainter):
             self.image_wrapped.emit()
 
     def after_step(self, update_step=True):
-        conf = self._sim.get_config().copy()
+        conf = self._sim.get_config_frame()
         try:
             self._queue.put_nowait((update_step, conf))
             self._queued_steps += 1
@@ -513,7 +562,7 @@ class TwoDimQImagePainterBase(BaseQImagePainter):
 
         if update_step and self.skip_frame():
             return
-        conf = self._sim.get_config().copy()
+        conf = self._sim.get_config_frame()
         self._queue.put((update_step, conf, self._changed_rect))
 
         self.draw_conf()
@@ -551,7 +600,7 @@ class TwoDimQImagePainter(TwoDimQImagePainterBase):
                 x, y = 0, 0
                 w, h = self._width, self._height
 
-            image = render_state_array(conf, self.palette, (0, 0, w, h))
+            image = self._renderer.render(conf, self.palette, (0, 0, w, h))
             if changeinfo:
                 painter = QPainter(self._image)
                 if self._scale != 1:
@@ -585,18 +634,29 @@ class TwoDimQImagePalettePainter(TwoDimQImagePainterBase):
         w = w * self.tile_size
         h = h * self.tile_size
 
+        self._tile_renderer = TileRenderer(self.palette, self.rects)
+
         super(TwoDimQImagePalettePainter, self).__init__(w, h, **kwargs)
 
     def draw_conf(self):
         try:
             update_step, conf, changeinfo = self._queue.get_nowait()
-            tilesize = self.tile_size * self._scale
-            w, h = self._width / tilesize, self._height / tilesize
-
-            print self._width, self._height, tilesize
-            print w, h
+            if changeinfo:
+                # only the changed cells are composed and drawn over the
+                # last image.
+                x, y, w, h = changeinfo.getRect()
+                image = self._tile_renderer.render(conf, (x, y, w, h))
+                painter = QPainter(self._image)
+                if self._scale != 1:
+                    painter.scale(self._scale, self._scale)
+                painter.drawImage(QPoint(x * self.tile_size, y * self.tile_size), image)
+                painter.end()
+            else:
+                pixmap = QPixmap.fromImage(self._tile_renderer.render(conf))
+                if self._scale != 1:
+                    pixmap = pixmap.scaled(self._width * self._scale, self._height * self._scale)
 
-            self._image = render_state_array_tiled(conf, self.palette, self.rects)
+                self._image = pixmap
         except Queue.Empty:
             pass
 
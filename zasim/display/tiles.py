@@ -0,0 +1,83 @@
+"""This module composes images of configurations out of graphical tiles,
+one tile per cell, without the help of Qt.
+
+The tiles are kept in one array of 32 bit colours with the tile number as
+the first axis. Drawing a configuration looks up the tile number of every
+cell with a `ColorTable` and then gathers all pixels of the frame from the
+tiles in a single `numpy.take`, so that the whole frame can be handed to the
+graphics toolkit as one image.
+
+.. testsetup::
+
+    from zasim.display.tiles import *
+
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+from __future__ import absolute_import
+
+from .pngfile import ColorTable
+
+import numpy as np
+
+class TileSet(object):
+    """A set of equally sized tiles, one for each cell value.
+
+    >>> tiles = TileSet(np.array([[[1, 2]], [[3, 4]]]), [0, 5])
+    >>> print tiles.render(np.array([[5], [0], [5]]))
+    [[3 4 1 2 3 4]]"""
+
+    missing = 0xffff00ff
+    """The colour of the tile for values, that have no tile."""
+
+    def __init__(self, tiles, values):
+        """:param tiles: An array of the shape (n, height, width) with the
+                         colours of the tiles as ``0xAARRGGBB``.
+        :param values: The cell value of each of the tiles."""
+        tiles = np.asarray(tiles, dtype=np.uint32)
+        if len(tiles) != len(values):
+            raise ValueError("Got %d tiles for %d values." % (len(tiles), len(values)))
+        self.tile_height, self.tile_width = tiles.shape[1:]
+
+        # the last tile is for everything that has no tile of its own.
+        self.tiles = np.empty((len(tiles) + 1,) + tiles.shape[1:], dtype=np.uint32)
+        self.tiles[:-1] = tiles
+        self.tiles[-1] = self.missing
+
+        self.index = ColorTable(dict(zip(values, range(len(values)))), missing=len(values))
+        """Looks up the tile number of cell values."""
+
+        pixels = np.arange(self.tile_height * self.tile_width, dtype=np.intp)
+        self._pixels = pixels.reshape((self.tile_height, 1, self.tile_width))
+
+    def frame_size(self, w, h):
+        """The width and height in pixels of the frame for w times h cells."""
+        return w * self.tile_width, h * self.tile_height
+
+    def render(self, states, region=None, out=None):
+        """Compose the image for states, or the region (x, y, w, h) of them.
+
+        :param out: A buffer of 32 bit colours with at least as many
+                    entries as the frame has pixels, which the frame is
+                    written to.
+        :returns: An array with one row of pixels per row of the image."""
+        if len(states.shape) == 1:
+            states = states.reshape((states.shape[0], 1))
+        if region:
+            x, y, w, h = region
+            states = states[x:x+w, y:y+h]
+        w, h = states.shape
+        th, tw = self.tile_height, self.tile_width
+
+        if out is None:
+            out = np.empty(w * h * th * tw, dtype=np.uint32)
+        frame = out.ravel()[:w * h * th * tw].reshape((h, th, w, tw))
+
+        # the offset of every pixel of the frame into the flat tile array;
+        # the rows of the tiles are the second axis, the columns the last.
+        numbers = self.index.lookup(states.T).astype(np.intp)
+        offsets = numbers.reshape((h, 1, w, 1)) * (th * tw) + self._pixels
+        np.take(self.tiles.ravel(), offsets, out=frame)
+
+        return frame.reshape((h * th, w * tw))
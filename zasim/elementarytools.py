@@ -4,11 +4,13 @@ the table-like step functions of elementary cellular automatons.
  * A bit of functionality to generate a rule number from arbitrary step
    functions by running them on a pre-generated target and finding out how it
    behaved.
+ * Enumerating the classes of equivalent rules with `ClassEnumeration`.
  * ...
 
  .. testsetup ::
 
    from zasim import elementarytools
+   from zasim.elementarytools import *
 
 
 """
@@ -16,7 +18,12 @@ the table-like step functions of elementary cellular automatons.
 # See LICENSE.txt for details.
 
 from __future__ import absolute_import
-from .cagen.utils import elementary_digits_and_values, rule_nr_to_rule_arr
+from .cagen.utils import elementary_digits, rule_arr_to_rule_nr
+
+from itertools import islice, imap
+from time import time
+import os
+import numpy as np
 
 neighbourhood_actions = {}
 def neighbourhood_action(name):
@@ -28,35 +35,28 @@ def neighbourhood_action(name):
 def digits_and_values_to_rule_nr(digits_and_values, base=2):
     if isinstance(digits_and_values[0], dict):
         digits_and_values = [val["result_value"] for val in digits_and_values]
-    num = 0
-    for digit, value in enumerate(digits_and_values):
-        num += value * (base ** digit)
-    return num
+    return rule_arr_to_rule_nr(digits_and_values, base)
 
-_minimize_cache = {}
 def minimize_rule_number(neighbourhood, number, base=2):
-    digits = base ** len(neighbourhood.offsets)
-    rule_arr = rule_nr_to_rule_arr(number, digits, base)
-    cache = {number: ([], rule_arr)}
-    tries = [([name], rule_arr) for name in neighbourhood_actions]
-
-    for route, data in tries:
-        new = neighbourhood_actions[route[-1]](neighbourhood, data)
-        rule_nr = digits_and_values_to_rule_nr(new)
-        if rule_nr in cache:
-            oldroute, olddata = cache[rule_nr]
-            if len(oldroute) > len(route):
-                cache[rule_nr] = (route, new)
-                tries.extend([(route + [name], new) for name in neighbourhood_actions])
-        else:
-            cache[rule_nr] = (route, new)
-            tries.extend([(route + [name], new) for name in neighbourhood_actions])
-    lowest_number = min(cache.keys())
-    return lowest_number, cache[lowest_number], cache
-
-def minimize_rule_values(neighbourhood, digits_and_values):
-    number = digits_and_values_to_rule_nr(digits_and_values)
-    return minimize_rule_number(neighbourhood, number)
+    """Find the lowest rule number, that can be reached from the given rule
+    number with the `neighbourhood_actions`.
+
+    :returns: The lowest number, the route of actions to it together with
+              its rule array, and a dictionary of the same for all
+              equivalent rule numbers."""
+    from .symmetry import symmetry_group
+    group = symmetry_group(neighbourhood, base)
+    orbit = group.orbits(group.tables([number]))[0]
+    equivalent = {}
+    for rule_nr, route, rule_arr in zip(group.numbers(orbit), group.routes, orbit):
+        if rule_nr not in equivalent:
+            equivalent[rule_nr] = (route, rule_arr)
+    lowest_number = min(equivalent.keys())
+    return lowest_number, equivalent[lowest_number], equivalent
+
+def minimize_rule_values(neighbourhood, digits_and_values, base=2):
+    number = digits_and_values_to_rule_nr(digits_and_values, base)
+    return minimize_rule_number(neighbourhood, number, base)
 
 @neighbourhood_action("flip all bits")
 def flip_all(neighbourhood, results, base=2):
@@ -65,6 +65,8 @@ def flip_all(neighbourhood, results, base=2):
         for val in nres:
             val["result_value"] = base - 1 - val["result_value"]
         return nres
+    elif isinstance(results, np.ndarray):
+        return base - 1 - results
     else:
         return [base - 1 - res for res in results]
 
@@ -77,17 +79,13 @@ def permutation_to_index_map(neighbourhood, permutation, base=2):
     :attr permutations: A dictionary that says what cell to take the value from
                         for any given cell."""
 
-    resultless_dav = elementary_digits_and_values(neighbourhood, base)
-
-    index_map = range(len(resultless_dav))
+    names = list(neighbourhood.names)
+    digits = elementary_digits(len(names), base)
+    # the new entry takes each of its values from the cell of the permutation
+    sources = [names.index(permutation[name]) for name in names]
+    powers = base ** np.arange(len(names))
 
-    for index, dav in enumerate(resultless_dav):
-        ndav = dict((k, dav[permutation[k]]) for k in neighbourhood.names)
-
-        other_index = resultless_dav.index(ndav)
-        index_map[index] = other_index
-
-    return index_map
+    return (digits[:, sources] * powers).sum(axis=1)
 
 def apply_index_map_values(digits_and_values, index_map):
     new = [value.copy() for value in digits_and_values]
@@ -99,6 +97,8 @@ def apply_index_map_values(digits_and_values, index_map):
 def apply_index_map(results, index_map):
     if isinstance(results[0], dict):
         return apply_index_map_values(results, index_map)
+    if isinstance(results, np.ndarray):
+        return results[index_map]
     return [results[index_map[i]] for i in range(len(results))]
 
 def flip_offset_to_permutation(neighbourhood, permute_func):
@@ -125,23 +125,247 @@ def mirror_by_axis(neighbourhood, axis=[0], base=2):
 
 @neighbourhood_action("flip vertically")
 def flip_v(neighbourhood, results, cache={}, base=2):
-    if neighbourhood not in cache:
-        cache[neighbourhood] = mirror_by_axis(neighbourhood, [1], base)
+    if (neighbourhood, base) not in cache:
+        cache[neighbourhood, base] = mirror_by_axis(neighbourhood, [1], base)
 
-    return apply_index_map(results, cache[neighbourhood])
+    return apply_index_map(results, cache[neighbourhood, base])
 
 @neighbourhood_action("flip horizontally")
 def flip_h(neighbourhood, results, cache={}, base=2):
-    if neighbourhood not in cache:
-        cache[neighbourhood] = mirror_by_axis(neighbourhood, [0], base)
-    return apply_index_map(results, cache[neighbourhood])
+    if (neighbourhood, base) not in cache:
+        cache[neighbourhood, base] = mirror_by_axis(neighbourhood, [0], base)
+    return apply_index_map(results, cache[neighbourhood, base])
 
 @neighbourhood_action("rotate clockwise")
 def rotate_clockwise(neighbourhood, results, cache={}, base=2):
-    if neighbourhood not in cache:
+    if (neighbourhood, base) not in cache:
         def rotate((a, b)):
             return b, -a
         permutation = flip_offset_to_permutation(neighbourhood, rotate)
-        cache[neighbourhood] = permutation_to_index_map(neighbourhood, permutation, base)
-
-    return apply_index_map(results, cache[neighbourhood])
+        cache[neighbourhood, base] = permutation_to_index_map(neighbourhood, permutation, base)
+
+    return apply_index_map(results, cache[neighbourhood, base])
+
+def _binomial(n, k):
+    if k < 0 or k > n:
+        return 0
+    result = 1
+    for i in xrange(min(k, n - k)):
+        result = result * (n - i) // (i + 1)
+    return result
+
+def unrank_fixed_bits(index, bits, bits_set):
+    """Find the number at the given index in the ordered list of all
+    numbers with `bits` bits, of which `bits_set` are set to 1.
+
+    >>> [unrank_fixed_bits(index, 4, 2) for index in range(6)]
+    [3, 5, 6, 9, 10, 12]"""
+    if not 0 <= index < _binomial(bits, bits_set):
+        raise IndexError("there are only %d numbers with %d of %d bits set"
+                         % (_binomial(bits, bits_set), bits_set, bits))
+    number = 0
+    position = bits
+    for remaining in xrange(bits_set, 0, -1):
+        position -= 1
+        while _binomial(position, remaining) > index:
+            position -= 1
+        index -= _binomial(position, remaining)
+        number |= 1 << position
+    return number
+
+def fixed_bits(bits, bits_set, start=0):
+    """Iterate over all numbers with `bits` bits, of which `bits_set` are set
+    to 1, from smallest to biggest, starting at the given index.
+
+    >>> list(fixed_bits(4, 3, start=1))
+    [11, 13, 14]"""
+    if start >= _binomial(bits, bits_set):
+        return
+    number = unrank_fixed_bits(start, bits, bits_set)
+    limit = 1 << bits
+    while number < limit:
+        yield number
+        if number == 0:
+            return
+        # move the lowest block of ones up by one and pack the rest of it
+        # into the lowest bits.
+        lowest = number & -number
+        ripple = number + lowest
+        number = (((ripple ^ number) >> 2) // lowest) | ripple
+
+class ClassCache(object):
+    """A cache from rule numbers to their representatives, that can be
+    shared between processes.
+
+    It has a fixed number of slots and every rule number can only go into
+    one of them, so a new entry simply evicts the old entry in its slot."""
+
+    def __init__(self, size=2 ** 20):
+        from multiprocessing import RawArray, Lock
+        import ctypes
+        self.size = size
+        self.keys = np.frombuffer(RawArray(ctypes.c_int64, size), dtype=np.int64)
+        self.keys[:] = -1
+        self.values = np.frombuffer(RawArray(ctypes.c_int64, size), dtype=np.int64)
+        self.lock = Lock()
+
+    def lookup(self, numbers):
+        """Find out which numbers are in the cache.
+
+        :returns: An array that says which numbers were found and an array
+                  with their representatives."""
+        slots = numbers % self.size
+        with self.lock:
+            found = self.keys[slots] == numbers
+            values = self.values[slots]
+        return found, values
+
+    def store(self, numbers, representatives):
+        slots = numbers % self.size
+        with self.lock:
+            self.keys[slots] = numbers
+            self.values[slots] = representatives
+
+_worker_enumeration = None
+def _init_worker(enumeration):
+    global _worker_enumeration
+    _worker_enumeration = enumeration
+
+def _classify_chunk(chunk):
+    return _worker_enumeration.classify_chunk(chunk)
+
+class ClassEnumeration(object):
+    """Find the representative of every rule with a fixed number of bits
+    set in its rule array, which tells what classes of equivalent rules
+    there are.
+
+    The rules are split up into chunks, that can be calculated by a pool of
+    processes. The representatives are written into a memory mapped file
+    and every finished chunk is marked in a second one, so that an
+    interrupted enumeration picks up where it left off.
+
+    Flipping all bits changes the number of bits set, so it is left out of
+    the actions by default."""
+
+    def __init__(self, neighbourhood, bits_set, basename, actions=None,
+                 chunk_size=2 ** 16, cache_size=2 ** 20):
+        """:param neighbourhood: The neighbourhood of the binary rules.
+        :param bits_set: How many entries of the rule arrays are 1.
+        :param basename: The start of the names of the result files.
+        :param actions: The names of the `neighbourhood_actions` to use.
+        :param chunk_size: How many rules make up one chunk of work.
+        :param cache_size: How many slots the cache of already classified
+                           rules has."""
+        from .symmetry import VALUE_FLIP
+        if actions is None:
+            actions = sorted(name for name in neighbourhood_actions if name != VALUE_FLIP)
+        self.neigh = neighbourhood
+        self.actions = actions
+        self.bits = 2 ** len(neighbourhood.offsets)
+        if self.bits > 63:
+            raise ValueError("The rule numbers of this neighbourhood don't fit into 64 bits.")
+        self.bits_set = bits_set
+        self.chunk_size = chunk_size
+        self.cache = ClassCache(cache_size)
+
+        self.size = _binomial(self.bits, bits_set)
+        """The number of rules to classify."""
+
+        self.chunks = -(-self.size // chunk_size)
+        self.taskname = "%s_%02d" % (basename, bits_set)
+
+        filename = self.res("representatives")
+        done_filename = self.res("done")
+        mode = "r+" if os.path.exists(filename) and os.path.exists(done_filename) else "w+"
+        self.representatives = np.memmap(filename, dtype=np.int64, mode=mode, shape=(self.size,))
+        """The representative of every rule, in the order of the rule
+        numbers."""
+
+        self.done = np.memmap(done_filename, dtype=np.uint8, mode=mode, shape=(self.chunks,))
+        """Which chunks have already been calculated."""
+
+    def res(self, name):
+        """generate a resource filename for the given name"""
+        return self.taskname + "_" + name
+
+    def chunk_numbers(self, chunk):
+        """Get an array of the rule numbers in the given chunk."""
+        start = chunk * self.chunk_size
+        count = min(self.chunk_size, self.size - start)
+        return np.fromiter(islice(fixed_bits(self.bits, self.bits_set, start), count),
+                           dtype=np.int64, count=count)
+
+    def classify_chunk(self, chunk):
+        """Calculate the representatives of one chunk and write them into
+        the result file."""
+        from .symmetry import symmetry_group
+        group = symmetry_group(self.neigh, 2, self.actions)
+
+        numbers = self.chunk_numbers(chunk)
+        found, representatives = self.cache.lookup(numbers)
+        missing = numbers[~found]
+
+        tables = (missing[:, None] >> np.arange(self.bits)) & 1
+        orbits = group.orbits(tables)
+        orbit_numbers = np.array(group.numbers(orbits), dtype=np.int64).reshape(orbits.shape[:2])
+        lowest = orbit_numbers.min(axis=1)
+        representatives[~found] = lowest
+
+        # remember the equivalent rules, that still have to be classified
+        ahead = orbit_numbers > numbers[-1]
+        self.cache.store(orbit_numbers[ahead], np.broadcast_to(lowest[:, None], ahead.shape)[ahead])
+
+        start = chunk * self.chunk_size
+        results = np.memmap(self.res("representatives"), dtype=np.int64, mode="r+",
+                            offset=start * 8, shape=(len(numbers),))
+        results[:] = representatives
+        results.flush()
+        del results
+        return chunk, len(numbers)
+
+    def run(self, processes=None, progress=None):
+        """Classify all rules that haven't been classified yet.
+
+        :param processes: How many worker processes to use. None will use as
+                          many processes as there are CPUs, 1 will do all the
+                          work in this process.
+        :param progress: A function that gets called with the number of
+                         finished and the total number of rules and the
+                         number of rules per second after each chunk."""
+        todo = np.flatnonzero(self.done == 0).tolist()
+        finished = self.size - sum(min(self.chunk_size, self.size - chunk * self.chunk_size)
+                                   for chunk in todo)
+        if processes == 1 or len(todo) <= 1:
+            pool = None
+            results = imap(self.classify_chunk, todo)
+        else:
+            from multiprocessing import Pool
+            pool = Pool(processes, _init_worker, (self,))
+            results = pool.imap_unordered(_classify_chunk, todo)
+
+        start = time()
+        calculated = 0
+        try:
+            for chunk, count in results:
+                # the results of the chunk have been flushed, so it can be
+                # marked as done.
+                self.done[chunk] = 1
+                self.done.flush()
+                finished += count
+                calculated += count
+                if progress:
+                    progress(finished, self.size, calculated / max(time() - start, 1e-6))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def classes(self):
+        """Iterate over the representatives of all classes, which are the
+        rules that are their own representative."""
+        for chunk in xrange(self.chunks):
+            start = chunk * self.chunk_size
+            numbers = self.chunk_numbers(chunk)
+            representatives = self.representatives[start:start + len(numbers)]
+            for number in numbers[numbers == representatives]:
+                yield int(number)
@@ -26,6 +26,8 @@ class ControlWidget(QWidget):
         """Setup the widgets, connect the signals&slots."""
         l = QHBoxLayout(self)
 
+        self.back_button = QPushButton("&Back", self)
+        self.back_button.setObjectName("back")
         self.step_button = QPushButton("Ste&p", self)
         self.step_button.setObjectName("step")
         self.start_button = QPushButton("&Run", self)
@@ -41,6 +43,7 @@ class ControlWidget(QWidget):
         delay.setValue(self.timer_delay)
         delay.setObjectName("delay")
 
+        l.addWidget(self.back_button)
         l.addWidget(self.step_button)
         l.addWidget(self.start_button)
         l.addWidget(self.stop_button)
@@ -51,6 +54,7 @@ class ControlWidget(QWidget):
 
         self.setLayout(l)
 
+        self.back_button.clicked.connect(self.step_back)
         self.step_button.clicked.connect(self.sim.step)
         self.start_button.clicked.connect(self.start)
         self.stop_button.clicked.connect(self.stop)
@@ -70,6 +74,11 @@ class ControlWidget(QWidget):
         self.stop_button.hide()
         self.start_button.show()
 
+    def step_back(self):
+        """Go back one step, if the simulator has a history."""
+        if self.sim.available_history > 0:
+            self.sim.step_back()
+
     def change_delay(self, delay):
         """Change the timer delay of the simulator steps."""
         if isinstance(delay, basestring) and delay.endswith("ms"):
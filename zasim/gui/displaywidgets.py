@@ -1,6 +1,6 @@
 from ..external.qt import QWidget, QPainter, Qt, QSize, QPoint
 from ..display.qt import OneDimQImagePainter, TwoDimQImagePainter,\
-        render_state_array_tiled
+        TileRenderer
 
 import Queue
 
@@ -164,6 +164,7 @@ class NewDisplayWidget(QWidget):
         self.rects = rects
 
         self.tilesize = self.rects.values()[0].size()
+        self._tile_renderer = TileRenderer(self.palette, self.rects)
 
         self.shape = simulator.shape
 
@@ -199,7 +200,7 @@ class NewDisplayWidget(QWidget):
 
     def update_display(self):
         try:
-            self._last_conf = self._sim.get_config()
+            self._last_conf = self._sim.get_config_frame()
             self.update()
             return True
         except Queue.Empty:
@@ -229,7 +230,7 @@ class NewDisplayWidget(QWidget):
 
         # XXX why doesn't this use the TwoDimQImagePalettePainter?
 
-        render_state_array_tiled(self._last_conf, self.palette, self.rects, region, painter=painter)
+        self._tile_renderer.draw(painter, self._last_conf, region)
 
         #color = QColor.fromHsv(random.random() * 360, 255, 255)
         #print color
@@ -347,7 +347,7 @@ class ElementaryRuleWindow(QWidget):
         return self.rule_nr
 
     def minimize_rule_number(self):
-        best_num, (best_route, result), _ = minimize_rule_values(self.neighbourhood, self.digits_and_values)
+        best_num, (best_route, result), _ = minimize_rule_values(self.neighbourhood, self.digits_and_values, self.base)
         if best_num == self.rule_nr:
             QMessageBox.information(self, "No optimization found",
                     """This rule set is already the lowest I can make out of it.""")
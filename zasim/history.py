@@ -0,0 +1,232 @@
+"""This module offers the `ConfigHistory`, that remembers the configurations
+a `CagenSimulator` went through, so that it can go back to them.
+
+The history is made up of groups. Each group starts with a keyframe, a full
+snapshot of the simulator as taken by :meth:`CagenSimulator.snapshot`,
+followed by one delta per step. A delta holds the positions of the cells
+that changed in that step and the XOR of their old and new values, so the
+same delta takes the configuration one step forward or one step back.
+
+When the history grows beyond its memory limit, the oldest group is thrown
+away as a whole.
+
+Going to a step in the middle of a group only restores the configuration
+and the step number; everything else, like the histogram or the sparse
+cell lists, is rebuilt from the configuration as if it had been set with
+`set_config`. Only keyframes restore the complete state, including the
+random number generator.
+
+For deterministic step functions the history can also be told to only keep
+keyframes. Going to a step between two keyframes then restores the keyframe
+before it and calculates the steps in between again.
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+import numpy as np
+
+class HistoryGroup(object):
+    """A keyframe and the deltas of the steps following it."""
+
+    def __init__(self, step_number, keyframe):
+        self.step_number = step_number
+        self.last_step = step_number
+        self.keyframe = keyframe
+        self.deltas = []
+        self.nbytes = sum(value.nbytes for value in keyframe["target"].values()
+                          if isinstance(value, np.ndarray))
+        self.delta_nbytes = 0
+
+    def append(self, delta):
+        self.deltas.append(delta)
+        self.last_step += 1
+        size = delta[0].nbytes + delta[1].nbytes
+        self.nbytes += size
+        self.delta_nbytes += size
+
+    def truncate(self, step_number):
+        """Throw away the deltas for the steps after step_number."""
+        while self.deltas and self.step_number + len(self.deltas) > step_number:
+            positions, xor = self.deltas.pop()
+            size = positions.nbytes + xor.nbytes
+            self.nbytes -= size
+            self.delta_nbytes -= size
+        self.last_step = min(self.last_step, step_number)
+
+class ConfigHistory(object):
+    """Record the configurations of a `CagenSimulator` and go back to them.
+
+    Don't create this directly, use :meth:`CagenSimulator.enable_history`."""
+
+    def __init__(self, simulator, keyframe_interval=32, max_bytes=64 * 1024 * 1024, deltas=True):
+        """:param simulator: The simulator to record.
+        :param keyframe_interval: After how many steps to take a new keyframe.
+        :param max_bytes: How much memory the keyframes and deltas may take
+                          up, before the oldest ones get thrown away.
+        :param deltas: Store a delta for every step. If this is False, only
+                       keyframes are stored and the steps in between are
+                       calculated again. This only works for deterministic
+                       step functions."""
+        if not deltas and getattr(simulator._step_func, "random", None) is not None:
+            raise ValueError("Can only calculate the steps between keyframes "
+                             "again for deterministic step functions.")
+        if isinstance(simulator.get_config(), dict):
+            raise TypeError("The history can't handle subcell configurations.")
+
+        self._sim = simulator
+        self.keyframe_interval = keyframe_interval
+        self.max_bytes = max_bytes
+        self.deltas = deltas
+
+        self.groups = []
+        self.nbytes = 0
+        self._navigating = False
+        self._take_keyframe()
+
+    @property
+    def first_step(self):
+        """The earliest step that can be restored."""
+        return self.groups[0].step_number
+
+    @property
+    def last_step(self):
+        """The latest step that can be restored."""
+        return self.groups[-1].last_step
+
+    def _take_keyframe(self):
+        sim = self._sim
+        group = HistoryGroup(sim.step_number, sim.snapshot())
+        self.groups.append(group)
+        self.nbytes += group.nbytes
+        self._last_conf = sim.get_config()
+        self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self.groups) > 1:
+            self.nbytes -= self.groups.pop(0).nbytes
+
+    def _truncate(self, step_number):
+        """Forget about everything after step_number."""
+        while len(self.groups) > 1 and self.groups[-1].step_number > step_number:
+            self.nbytes -= self.groups.pop().nbytes
+        last = self.groups[-1]
+        if last.step_number > step_number:
+            # the only group that's left is in the future.
+            self.groups = []
+            self.nbytes = 0
+            return
+        self.nbytes -= last.nbytes
+        last.truncate(step_number)
+        self.nbytes += last.nbytes
+
+    def stepped(self):
+        """Record the step the simulator just made."""
+        if self._navigating:
+            return
+        sim = self._sim
+        if sim.step_number - 1 < self.last_step:
+            # we went back in time and made a different step now.
+            self._truncate(sim.step_number - 1)
+            if not self.groups:
+                self._take_keyframe()
+                return
+
+        last = self.groups[-1]
+        if sim.step_number - last.step_number >= self.keyframe_interval \
+                or (self.deltas and last.delta_nbytes > self._last_conf.nbytes):
+            self._take_keyframe()
+            return
+
+        if not self.deltas:
+            last.last_step = sim.step_number
+        else:
+            conf = sim.get_config_view()
+            positions = np.flatnonzero(conf != self._last_conf).astype(np.int32)
+            xor = conf.ravel()[positions] ^ self._last_conf.ravel()[positions]
+            last.append((positions, xor))
+            self.nbytes += positions.nbytes + xor.nbytes
+            self._last_conf.ravel()[positions] ^= xor
+            self._evict()
+
+    def config_changed(self):
+        """Handle a change to the configuration, that didn't come from a
+        step, by starting a new group with the current state."""
+        if self._navigating:
+            return
+        self._truncate(self._sim.step_number - 1)
+        self._take_keyframe()
+
+    def _group_for(self, step_number):
+        if not self.groups or not (self.first_step <= step_number <= self.last_step):
+            raise IndexError("step %d is not in the history (%d to %d)" %
+                             (step_number, self.first_step if self.groups else -1,
+                              self.last_step if self.groups else -1))
+        for group in reversed(self.groups):
+            if group.step_number <= step_number:
+                if step_number > group.last_step:
+                    raise IndexError("step %d was never recorded" % step_number)
+                return group
+
+    def seek(self, step_number):
+        """Bring the simulator to the given step."""
+        sim = self._sim
+        group = self._group_for(step_number)
+
+        self._navigating = True
+        try:
+            if not self.deltas:
+                self._recalculate(group, step_number)
+            elif step_number == group.step_number:
+                sim.restore(group.keyframe)
+                self._last_conf = sim.get_config()
+            else:
+                self._apply_deltas(group, step_number)
+        finally:
+            self._navigating = False
+
+    def _apply_deltas(self, group, step_number):
+        sim = self._sim
+        current = sim.step_number
+        if group.step_number <= current <= group.last_step \
+                and abs(current - step_number) < step_number - group.step_number:
+            # the current config is closer than the keyframe.
+            conf = self._last_conf
+            start = current
+        else:
+            conf = group.keyframe["target"]["cconf"]
+            conf = conf[sim._unbordered_slices(conf)].copy()
+            start = group.step_number
+
+        # xor deltas work in both directions. the delta for step i takes us
+        # from step i - 1 to step i and back.
+        if step_number > start:
+            steps = range(start + 1, step_number + 1)
+        else:
+            steps = range(start, step_number, -1)
+        flat = conf.ravel()
+        for step in steps:
+            positions, xor = group.deltas[step - group.step_number - 1]
+            flat[positions] ^= xor
+
+        self._last_conf = conf
+        sim._step_func.set_config(conf)
+        sim.step_number = step_number
+        sim._config_frame = None
+        sim.snapshot_restored.emit()
+
+    def _recalculate(self, group, step_number):
+        sim = self._sim
+        sim.restore(group.keyframe)
+        if step_number > group.step_number:
+            for i in range(step_number - group.step_number):
+                sim._step_func.step()
+            sim.step_number = step_number
+            sim._config_frame = None
+            sim.snapshot_restored.emit()
+        self._last_conf = sim.get_config()
+
+    def available(self):
+        """How many steps back from the current step are in the history."""
+        if not self.groups:
+            return 0
+        return max(0, self._sim.step_number - self.first_step)
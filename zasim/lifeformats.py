@@ -0,0 +1,597 @@
+"""This module reads and writes patterns in the RLE and macrocell formats,
+that Golly and most other programs for Life-like cellular automata use.
+
+Both formats describe a pattern with the x axis pointing right and the y
+axis pointing down; the configurations have the x axis first, like all
+other two-dimensional configurations in zasim.
+
+RLE files are decoded a chunk at a time. The runs of each chunk are found
+and written into the configuration with a few array operations, and the runs
+for writing RLE files are found with `numpy.diff`, so that even patterns
+with millions of cells are converted quickly.
+
+Macrocell files store a quadtree, in which equal parts of the pattern are
+only stored once. Reading one places all copies of a node at once, level
+by level; writing one finds the equal nodes of each level with
+`numpy.unique`.
+
+.. testsetup::
+
+    from zasim.lifeformats import *
+
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+from __future__ import absolute_import
+
+from .config import BaseConfiguration, default_dtype
+
+import re
+import numpy as np
+
+_RLE_HEADER = re.compile(r"x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)(?:\s*,\s*rule\s*=\s*(\S+))?")
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[[ord(char) for char in " \t\r\n"]] = True
+
+# the value of each tag of the RLE format; -1 for bytes that aren't tags.
+_TAG_VALUES = np.full(256, -1, dtype=np.int16)
+_TAG_VALUES[ord(".")] = _TAG_VALUES[ord("b")] = _TAG_VALUES[ord("$")] = 0
+_TAG_VALUES[ord("o")] = 1
+_TAG_VALUES[ord("A"):ord("X") + 1] = np.arange(1, 25)
+_IS_DIGIT = np.zeros(256, dtype=bool)
+_IS_DIGIT[ord("0"):ord("9") + 1] = True
+_IS_PREFIX = np.zeros(256, dtype=bool)
+_IS_PREFIX[ord("p"):ord("y") + 1] = True
+_POWERS = 10 ** np.arange(19, dtype=np.int64)
+
+def life_rule(params):
+    """Turn the parameters of a `LifeCellularAutomatonBase` into a rule
+    string in B/S notation.
+
+    >>> life_rule(dict(reproduce_min=3, reproduce_max=3, stay_alive_min=2, stay_alive_max=3))
+    'B3/S23'"""
+    return "B%s/S%s" % (
+        "".join(map(str, range(params["reproduce_min"], params["reproduce_max"] + 1))),
+        "".join(map(str, range(params["stay_alive_min"], params["stay_alive_max"] + 1))))
+
+def life_params(rule):
+    """Turn a rule string in B/S or S/B notation into parameters for
+    `LifeCellularAutomatonBase`.
+
+    Only rules, whose counts for birth and survival are ranges without gaps,
+    can be turned into parameters.
+
+    >>> sorted(life_params("B36/S23").items())
+    Traceback (most recent call last):
+    ...
+    ValueError: The rule B36/S23 can't be expressed with count ranges.
+    >>> sorted(life_params("23/3").items())
+    [('reproduce_max', 3), ('reproduce_min', 3), ('stay_alive_max', 3), ('stay_alive_min', 2)]"""
+    match = re.match(r"^[Bb](\d*)/[Ss](\d*)$", rule)
+    if match:
+        birth, survival = match.groups()
+    else:
+        match = re.match(r"^(\d*)/(\d*)$", rule)
+        if not match:
+            raise ValueError("Can't read the rule %s." % rule)
+        survival, birth = match.groups()
+
+    params = {}
+    for name, counts in (("reproduce", birth), ("stay_alive", survival)):
+        counts = sorted(set(int(count) for count in counts))
+        if not counts or counts != range(counts[0], counts[-1] + 1):
+            raise ValueError("The rule %s can't be expressed with count ranges." % rule)
+        params[name + "_min"], params[name + "_max"] = counts[0], counts[-1]
+    return params
+
+def simulator_rule(sim):
+    """Find the rule string of a simulator calculating a Life-like rule,
+    like a `GameOfLife`."""
+    from .cagen.computations import LifeCellularAutomatonBase
+    for visitor in sim._step_func.visitors:
+        if isinstance(visitor, LifeCellularAutomatonBase):
+            return life_rule(visitor.params)
+    raise ValueError("The simulator doesn't calculate a Life-like rule.")
+
+def _open(file_or_name, mode):
+    if isinstance(file_or_name, basestring):
+        return open(file_or_name, mode)
+    return file_or_name
+
+def _place(out, offset, xs, ys, values):
+    """Write cells into out, shifted by offset, if they fit."""
+    xs, ys = xs + offset[0], ys + offset[1]
+    if len(xs) and (xs.min() < 0 or ys.min() < 0
+                    or xs.max() >= out.shape[0] or ys.max() >= out.shape[1]):
+        raise ValueError("The pattern doesn't fit into the configuration.")
+    out[xs, ys] = values
+
+def read_rle_header(infile):
+    """Read the comments and the header line of an RLE file.
+
+    :returns: The width, height and rule of the pattern."""
+    # read line by line, so that the file can be read on in chunks.
+    for line in iter(infile.readline, ""):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        match = _RLE_HEADER.match(stripped)
+        if not match:
+            break
+        return int(match.group(1)), int(match.group(2)), match.group(3) or "B3/S23"
+    raise ValueError("The RLE file has no header line.")
+
+def _decode_rle(data, row, column):
+    """Find the runs of the complete tags in an array of bytes without
+    whitespace.
+
+    :returns: The rows, columns, lengths and values of the runs of living
+              cells, the row and column after the last tag, the number of
+              bytes that were used up and whether the end was reached."""
+    # anything after the ! is a comment.
+    ends = np.flatnonzero(data == ord("!"))
+    finished = len(ends) > 0
+    if finished:
+        data = data[:ends[0]]
+
+    values = _TAG_VALUES[data]
+    digits = _IS_DIGIT[data]
+    prefixes = _IS_PREFIX[data]
+    unknown = (values < 0) & ~digits & ~prefixes
+    if unknown.any():
+        raise ValueError("Unknown character %r in the RLE data." % chr(data[np.flatnonzero(unknown)[0]]))
+
+    tags = np.flatnonzero(values >= 0)
+    used = tags[-1] + 1 if len(tags) else 0
+    if finished:
+        used = len(data) + 1
+
+    # multi-state tags like pA are made up of a prefix and a letter.
+    prefixed = np.zeros(len(tags), dtype=bool)
+    has_previous = tags > 0
+    prefixed[has_previous] = prefixes[tags[has_previous] - 1]
+    if (prefixed & (data[tags] < ord("A"))).any() or (prefixed & (data[tags] > ord("X"))).any():
+        raise ValueError("A prefix in the RLE data isn't followed by a letter.")
+    tag_values = values[tags].astype(np.int64) + np.where(prefixed, (data[tags - 1].astype(np.int64) - ord("p") + 1) * 24, 0)
+
+    # the digits in front of each tag make up its count.
+    digit_positions = np.flatnonzero(digits[:used])
+    terms = np.zeros(len(digit_positions) + 1, dtype=np.int64)
+    if len(digit_positions):
+        owner = (values >= 0).cumsum()[digit_positions]
+        exponent = (tags - prefixed)[owner] - 1 - digit_positions
+        terms[1:] = (data[digit_positions] - ord("0")) * _POWERS[exponent]
+    terms = terms.cumsum()
+    digit_counts = digits.cumsum()[tags]
+    previous_counts = np.zeros_like(digit_counts)
+    previous_counts[1:] = digit_counts[:-1]
+    counts = terms[digit_counts] - terms[previous_counts]
+    counts[digit_counts == previous_counts] = 1
+
+    newlines = data[tags] == ord("$")
+    row_steps = np.where(newlines, counts, 0)
+    rows = row + row_steps.cumsum() - row_steps
+    cells = np.where(newlines, 0, counts)
+    ends_of_runs = cells.cumsum()
+    # the columns restart after every $
+    last_newline = np.maximum.accumulate(np.where(newlines, np.arange(len(tags)), -1))
+    restart = np.where(last_newline >= 0, ends_of_runs[last_newline], -column)
+    columns = ends_of_runs - cells - restart
+
+    if len(tags):
+        row = rows[-1] + row_steps[-1]
+        column = columns[-1] + cells[-1]
+    alive = ~newlines & (tag_values != 0) & (cells > 0)
+    return (rows[alive], columns[alive], cells[alive], tag_values[alive],
+            row, column, used, finished)
+
+def read_rle(file_or_name, out=None, offset=(0, 0), dtype=default_dtype, chunk_size=2 ** 20):
+    """Read a pattern from an RLE file.
+
+    :param out: The array to write the pattern into. Cells that are dead in
+                the pattern are left untouched. If it is None, an array of
+                the size given in the header is created.
+    :param offset: Where to put the upper left corner of the pattern.
+    :param chunk_size: How many bytes to decode at once.
+    :returns: The array and the rule of the pattern."""
+    infile = _open(file_or_name, "rb")
+    try:
+        width, height, rule = read_rle_header(infile)
+        if out is None:
+            out = np.zeros((width, height), dtype=dtype)
+        row, column, pending = 0, 0, np.zeros(0, dtype=np.uint8)
+        finished = False
+        while not finished:
+            chunk = infile.read(chunk_size)
+            data = np.frombuffer(chunk, dtype=np.uint8)
+            data = np.concatenate([pending, data[~_WHITESPACE[data]]])
+            if not chunk:
+                if len(data):
+                    raise ValueError("The RLE data ends in the middle of a tag.")
+                break
+            rows, columns, lengths, values, row, column, used, finished = \
+                    _decode_rle(data, row, column)
+            pending = data[used:]
+
+            # one entry for each cell of each run
+            total = lengths.sum()
+            starts = np.repeat(columns - (lengths.cumsum() - lengths), lengths)
+            _place(out, offset, starts + np.arange(total),
+                   np.repeat(rows, lengths), np.repeat(values, lengths))
+    finally:
+        if infile is not file_or_name:
+            infile.close()
+    return out, rule
+
+def _number_lengths(numbers):
+    """How many digits the count of each run needs in an RLE file; runs of
+    one cell have no count at all."""
+    lengths = (numbers > 1).astype(np.int8)
+    power = 10
+    while len(numbers) and power <= numbers.max():
+        lengths += numbers >= power
+        power *= 10
+    return lengths
+
+def _write_numbers(result, ends, numbers, lengths):
+    """Write the digits of numbers into an array of bytes, so that each
+    number ends just before its entry in ends."""
+    for place in xrange(lengths.max() if len(lengths) else 0):
+        digit = lengths > place
+        result[ends[digit] - 1 - place] = ord("0") + numbers[digit] // 10 ** place % 10
+
+def encode_rle(conf, line_length=70):
+    """Turn a configuration into the data part of an RLE file.
+
+    >>> encode_rle(np.array([[0, 1, 1], [0, 0, 1], [1, 0, 0], [0, 0, 0]]))
+    '2bo$o$2o!'"""
+    conf = np.asarray(conf)
+    if conf.size and (conf.min() < 0 or conf.max() > 255):
+        raise ValueError("RLE files can only hold the values 0 to 255.")
+    flat = np.ascontiguousarray(conf.T).ravel()
+    width = max(1, conf.shape[0])
+
+    # the runs start where the value changes or a new row begins.
+    change = np.ones(len(flat), dtype=bool)
+    change[1:] = flat[1:] != flat[:-1]
+    change[::width] = True
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.append(starts, len(flat)))
+    values = flat[starts]
+    rows = starts // width
+    # the dead cells at the end of each row are left out.
+    last_of_row = np.ones(len(starts), dtype=bool)
+    last_of_row[:-1] = rows[1:] != rows[:-1]
+    keep = ~last_of_row | (values != 0)
+    lengths, values, rows = lengths[keep], values[keep], rows[keep]
+
+    # each run starts with a $ and the number of rows to skip, if it is the
+    # first one of its row. runs are never split across lines, so that no
+    # line gets longer than line_length.
+    skips = np.diff(np.append(0, rows))
+    skip_lengths = _number_lengths(skips)
+    run_lengths = _number_lengths(lengths)
+    if len(values) and values.max() > 1:
+        prefixes = np.where(values > 24, ord("p") + (values - 1) // 24 - 1, 0)
+        letters = np.where(values > 24, ord("A") + (values - 1) % 24, ord("A") + values - 1)
+        letters[values == 0] = ord(".")
+    else:
+        prefixes = np.zeros(len(values), dtype=np.int8)
+        letters = np.where(values != 0, ord("o"), ord("b"))
+    sizes = (np.where(skips > 0, skip_lengths + 1, 0) + run_lengths + (prefixes > 0) + 1).astype(np.intp)
+    ends = sizes.cumsum()
+
+    step = max(1, line_length - (sizes.max() if len(sizes) else 0) + 1)
+    breaks = np.zeros(len(sizes), dtype=np.intp)
+    breaks[:-1] = ends[:-1] // step != ends[1:] // step
+    ends += breaks.cumsum()
+    ends -= breaks
+
+    result = np.empty((ends[-1] if len(ends) else 0) + 1, dtype=np.uint8)
+    result[-1] = ord("!")
+    result[ends - 1] = letters
+    result[(ends - 2)[prefixes > 0]] = prefixes[prefixes > 0]
+    _write_numbers(result, ends - 1 - (prefixes > 0), lengths, run_lengths)
+    newline_rows = np.flatnonzero(skips > 0)
+    dollars = (ends - sizes)[newline_rows] + skip_lengths[newline_rows]
+    result[dollars] = ord("$")
+    _write_numbers(result, dollars, skips[newline_rows], skip_lengths[newline_rows])
+    result[ends[breaks > 0]] = ord("\n")
+    return result.tostring()
+
+def write_rle(file_or_name, conf, rule="B3/S23"):
+    """Write a configuration to an RLE file."""
+    conf = np.asarray(conf)
+    outfile = _open(file_or_name, "wb")
+    try:
+        outfile.write("x = %d, y = %d, rule = %s\n" % (conf.shape[0], conf.shape[1], rule))
+        outfile.write(encode_rle(conf))
+        outfile.write("\n")
+    finally:
+        if outfile is not file_or_name:
+            outfile.close()
+
+def save_rle(file_or_name, sim):
+    """Write the configuration and the rule of a Life-like simulator, like a
+    `GameOfLife`, to an RLE file."""
+    write_rle(file_or_name, sim.get_config_view(), simulator_rule(sim))
+
+def _parse_leaves(lines):
+    """Turn the lines of 8x8 leaves, like ``.*$..*$***$``, into an array
+    indexed by leaf, y and x."""
+    data = np.frombuffer("\n".join(lines) + "\n", dtype=np.uint8)
+    newlines = data == ord("\n")
+    separators = newlines | (data == ord("$"))
+    # every row ends with a separator; number the rows of each leaf.
+    ends = np.flatnonzero(separators)
+    ends_leaf = newlines[ends]
+    indices = np.arange(len(ends))
+    last_leaf_end = np.concatenate([[-1], np.maximum.accumulate(np.where(ends_leaf, indices, -1))[:-1]])
+    leaf_of_row = ends_leaf.cumsum() - ends_leaf
+    row_in_leaf = indices - last_leaf_end - 1
+
+    stars = np.flatnonzero(data == ord("*"))
+    row = separators.cumsum(dtype=np.int32)[stars]
+    columns = stars - np.concatenate([[-1], ends])[row] - 1
+    rows = row_in_leaf[row]
+    alive = (rows < 8) & (columns < 8)
+    leaf, rows, columns = leaf_of_row[row][alive], rows[alive], columns[alive]
+
+    leaves = np.zeros((len(lines), 8, 8), dtype=np.uint8)
+    leaves[leaf, rows, columns] = 1
+    return leaves
+
+def read_macrocell_nodes(file_or_name):
+    """Read the nodes of a macrocell file.
+
+    :returns: The rule, the level and the four children of every node, and
+              the cells of the 8x8 leaves of two-state patterns as an array
+              indexed by leaf, y and x. The children of leaves are the
+              index of their cells; those of nodes of level 1 in
+              multi-state patterns are cell values. The first node is an
+              empty placeholder, as index 0 stands for an empty child."""
+    infile = _open(file_or_name, "rb")
+    try:
+        data = infile.read()
+    finally:
+        if infile is not file_or_name:
+            infile.close()
+    lines = data.split("\n")
+    if not lines[0].startswith("[M2]"):
+        raise ValueError("Not a macrocell file.")
+
+    rule = "B3/S23"
+    for line in lines:
+        if line.startswith("#R"):
+            rule = line[2:].strip()
+    lines = [line.strip() for line in lines[1:]]
+    lines = [line for line in lines if line and not line.startswith("#")]
+    if not lines:
+        raise ValueError("The macrocell file has no nodes.")
+
+    is_leaf = np.array([line[0] in ".*$" for line in lines])
+    leaf_lines = [line for line in lines if line[0] in ".*$"]
+    node_lines = [line for line in lines if line[0] not in ".*$"]
+    numbers = np.fromstring(" ".join(node_lines), dtype=np.int64, sep=" ")
+    if len(numbers) != 5 * len(node_lines):
+        raise ValueError("Every node of a macrocell file needs a level and four children.")
+    numbers = numbers.reshape(-1, 5)
+
+    levels = np.zeros(len(lines) + 1, dtype=np.int64)
+    children = np.zeros((len(lines) + 1, 4), dtype=np.int64)
+    leaf_nodes = np.flatnonzero(is_leaf) + 1
+    levels[leaf_nodes] = 3
+    children[leaf_nodes, 0] = np.arange(len(leaf_nodes))
+    other_nodes = np.flatnonzero(~is_leaf) + 1
+    levels[other_nodes] = numbers[:, 0]
+    children[other_nodes] = numbers[:, 1:]
+    later = (children[other_nodes] >= other_nodes[:, None]) & (levels[other_nodes] > 1)[:, None]
+    if later.any():
+        raise ValueError("A node of the macrocell file refers to a later node.")
+    return rule, levels, children, _parse_leaves(leaf_lines)
+
+def read_macrocell(file_or_name, out=None, offset=(0, 0), dtype=default_dtype):
+    """Read a pattern from a macrocell file.
+
+    :param out: The array to write the pattern into. Cells that are dead in
+                the pattern are left untouched. If it is None, an array just
+                big enough for the living cells is created.
+    :param offset: Where to put the upper left corner of the bounding box
+                   of the living cells.
+    :returns: The array and the rule of the pattern."""
+    rule, levels, children, leaves = read_macrocell_nodes(file_or_name)
+    root = len(levels) - 1
+    nodes = np.array([root])
+    xs = np.zeros(1, dtype=np.int64)
+    ys = np.zeros(1, dtype=np.int64)
+
+    # place all copies of the nodes of one level at once, from the root down.
+    level = levels[root]
+    while level > 1 and not (level == 3 and len(leaves)):
+        half = 2 ** (level - 1)
+        quads = children[nodes]
+        nodes = quads.ravel()
+        xs = (xs[:, None] + np.array([0, half, 0, half])).ravel()
+        ys = (ys[:, None] + np.array([0, 0, half, half])).ravel()
+        filled = nodes != 0
+        nodes, xs, ys = nodes[filled], xs[filled], ys[filled]
+        level -= 1
+        if len(nodes) and (levels[nodes] != level).any():
+            raise ValueError("A node of the macrocell file has children of the wrong level.")
+
+    if level == 3:
+        cells = leaves[children[nodes, 0]]
+        instance, cell_y, cell_x = np.nonzero(cells)
+        values = np.ones(len(instance), dtype=np.int64)
+    else:
+        quads = children[nodes]
+        instance, quarter = np.nonzero(quads)
+        values = quads[instance, quarter]
+        cell_x, cell_y = quarter % 2, quarter // 2
+    cell_x = xs[instance] + cell_x
+    cell_y = ys[instance] + cell_y
+
+    if len(cell_x):
+        cell_x -= cell_x.min()
+        cell_y -= cell_y.min()
+    if out is None:
+        size = (cell_x.max() + 1, cell_y.max() + 1) if len(cell_x) else (0, 0)
+        out = np.zeros(size, dtype=dtype)
+    _place(out, offset, cell_x, cell_y, values)
+    return out, rule
+
+def _leaf_text(leaves):
+    """Turn an array of 8x8 leaves indexed by leaf, y and x into their
+    lines, leaving out the dead cells at the end of each row and the empty
+    rows at the end of each leaf."""
+    count = len(leaves)
+    chars = np.empty((count, 8, 9), dtype=np.uint8)
+    chars[:, :, :8] = np.where(leaves, ord("*"), ord("."))
+    row_lengths = np.where(leaves.any(axis=2), 8 - leaves[:, :, ::-1].argmax(axis=2), 0)
+    chars[np.arange(count)[:, None], np.arange(8), row_lengths] = ord("$")
+    used_rows = 8 - leaves.any(axis=2)[:, ::-1].argmax(axis=1)
+
+    keep = ((np.arange(9) <= row_lengths[:, :, None])
+            & (np.arange(8)[:, None] < used_rows[:, None, None]))
+    text = np.empty((count, 73), dtype=np.uint8)
+    text[:, :72] = chars.reshape(count, 72)
+    text[:, 72] = ord("\n")
+    keep = np.concatenate([keep.reshape(count, 72), np.ones((count, 1), dtype=bool)], axis=1)
+    return text[keep].tostring()
+
+def _pad_even(grid):
+    """Pad a grid of nodes with empty nodes to an even size."""
+    padded = np.zeros(((grid.shape[0] + 1) // 2 * 2, (grid.shape[1] + 1) // 2 * 2), dtype=np.int64)
+    padded[:grid.shape[0], :grid.shape[1]] = grid
+    return padded
+
+def encode_macrocell(conf):
+    """Turn a configuration into the node lines of a macrocell file.
+
+    Configurations with only the values 0 and 1 are made up of 8x8 leaves,
+    all others of nodes of level 1, that hold cell values."""
+    conf = np.asarray(conf)
+    two_state = conf.size == 0 or conf.max() <= 1
+    parts = []
+    nodes = [0]
+
+    def number(key):
+        """Give each distinct non-empty entry of key the next free node
+        number, in the order of their first appearance.
+
+        :returns: The node numbers and the index of the first appearance of
+                  each new node."""
+        filled = key != 0 if key.ndim == 1 else key.any(axis=1)
+        ids = np.zeros(len(key), dtype=np.int64)
+        if not filled.any():
+            return ids, np.zeros(0, dtype=np.intp)
+        unique, first, inverse = np.unique(key[filled], return_index=True, return_inverse=True, axis=0)
+        # keep the order of appearance, so that the output doesn't depend
+        # on the sort order of the keys.
+        order = np.argsort(first)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        ids[filled] = nodes[0] + 1 + rank[inverse]
+        nodes[0] += len(order)
+        return ids, np.flatnonzero(filled)[first[order]]
+
+    if two_state:
+        height, width = -(-conf.shape[1] // 8) * 8, -(-conf.shape[0] // 8) * 8
+        rows = np.zeros((max(height, 8), max(width, 8)), dtype=bool)
+        rows[:conf.shape[1], :conf.shape[0]] = conf.T
+        blocks = rows.reshape(rows.shape[0] // 8, 8, rows.shape[1] // 8, 8).swapaxes(1, 2)
+        grid_shape = blocks.shape[:2]
+        blocks = blocks.reshape(-1, 8, 8)
+        key = np.packbits(blocks, axis=2).reshape(-1, 8).view(np.uint64).ravel()
+        ids, firsts = number(key)
+        parts.append(_leaf_text(blocks[firsts]))
+        grid = ids.reshape(grid_shape)
+        level, root_level = 3, 4
+    else:
+        grid = conf.T.astype(np.int64)
+        level, root_level = 0, 1
+
+    while grid.shape != (1, 1) or level < root_level:
+        grid = _pad_even(grid)
+        quads = np.stack([grid[0::2, 0::2], grid[0::2, 1::2], grid[1::2, 0::2], grid[1::2, 1::2]], axis=-1)
+        grid_shape = quads.shape[:2]
+        quads = quads.reshape(-1, 4)
+        ids, firsts = number(quads)
+        level += 1
+        parts.extend("%d %d %d %d %d\n" % tuple([level] + quad) for quad in quads[firsts].tolist())
+        grid = ids.reshape(grid_shape)
+    if grid[0, 0] == 0:
+        # an empty pattern still needs a root node.
+        parts.append("%d 0 0 0 0\n" % level)
+    return "".join(parts)
+
+def write_macrocell(file_or_name, conf, rule="B3/S23"):
+    """Write a configuration to a macrocell file."""
+    outfile = _open(file_or_name, "wb")
+    try:
+        outfile.write("[M2] (zasim)\n#R %s\n" % rule)
+        outfile.write(encode_macrocell(conf))
+    finally:
+        if outfile is not file_or_name:
+            outfile.close()
+
+def save_macrocell(file_or_name, sim):
+    """Write the configuration and the rule of a Life-like simulator, like a
+    `GameOfLife`, to a macrocell file."""
+    write_macrocell(file_or_name, sim.get_config_view(), simulator_rule(sim))
+
+class BaseLifePatternConfiguration(BaseConfiguration):
+    """The base of configurations, that are read from pattern files.
+
+    If the size hint is bigger than the pattern, the pattern is put into
+    the middle of an empty configuration of that size."""
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def read(self, out=None, offset=(0, 0), dtype=default_dtype):
+        """Read the pattern and its rule."""
+
+    def generate(self, size_hint=None, dtype=default_dtype):
+        pattern, self.rule = self.read(dtype=dtype)
+        if size_hint is None or None in size_hint or (np.array(size_hint) <= pattern.shape).all():
+            return pattern
+        size = tuple(max(hint, have) for hint, have in zip(size_hint, pattern.shape))
+        out = np.zeros(size, dtype=dtype)
+        offset = tuple((outer - inner) // 2 for outer, inner in zip(size, pattern.shape))
+        out[offset[0]:offset[0] + pattern.shape[0], offset[1]:offset[1] + pattern.shape[1]] = pattern
+        return out
+
+    def life_params(self):
+        """The parameters for a `GameOfLife` with the rule of the pattern."""
+        return life_params(self.rule)
+
+class RleConfiguration(BaseLifePatternConfiguration):
+    """Import a pattern from an RLE file."""
+
+    def __init__(self, filename):
+        super(RleConfiguration, self).__init__(filename)
+        with open(filename, "rb") as infile:
+            self.width, self.height, self.rule = read_rle_header(infile)
+
+    def read(self, out=None, offset=(0, 0), dtype=default_dtype):
+        return read_rle(self.filename, out, offset, dtype)
+
+class MacrocellConfiguration(BaseLifePatternConfiguration):
+    """Import a pattern from a macrocell file.
+
+    The configuration only spans the living cells of the pattern."""
+
+    def __init__(self, filename):
+        super(MacrocellConfiguration, self).__init__(filename)
+        self.rule = "B3/S23"
+        with open(filename, "rb") as infile:
+            for line in infile:
+                if line.startswith("#R"):
+                    self.rule = line[2:].strip()
+                elif not line.startswith("#") and not line.startswith("[M2]"):
+                    break
+
+    def read(self, out=None, offset=(0, 0), dtype=default_dtype):
+        return read_macrocell(self.filename, out, offset, dtype)
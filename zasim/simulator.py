@@ -14,6 +14,16 @@ except ImportError:
     QObject = object
     print "using lightweight signal"
 
+from .history import ConfigHistory
+from .cycles import CycleDetector
+
+import numpy as np
+
+import copy
+import cPickle
+import os
+import tempfile
+
 class TargetProxy(object):
     def __init__(self, target, attrs):
         self.target = target
@@ -78,9 +88,11 @@ class SimulatorInterface(QObject):
     stopped = Signal()
     """Is emitted when continuous updating has been stopped."""
 
-    shapshot_taken = Signal()
+    snapshot_taken = Signal()
     """Is emitted when a snapshot has been taken."""
 
+    shapshot_taken = snapshot_taken
+
     snapshot_restored = Signal()
     """Is emitted when a snapshot is restored or a completely new configuration
     has been set."""
@@ -103,6 +115,30 @@ class SimulatorInterface(QObject):
         Its shape matches up with :attr:`shape`, so it also does not
         include any borders."""
 
+    def get_config_view(self):
+        """Returns the configuration space as a read-only numpy array, that
+        shares its memory with the simulator wherever possible.
+
+        The view is only valid until the next step or change of the
+        configuration. Use :meth:`get_config` or :meth:`get_config_frame`
+        to hold on to a configuration for longer."""
+        view = self.get_config()
+        if isinstance(view, np.ndarray):
+            # some simulators hand out their own array, which has to stay
+            # writeable for them.
+            view = view.view()
+            view.flags.writeable = False
+        return view
+
+    def get_config_frame(self):
+        """Returns a read-only copy of the configuration space, that is
+        shared between all callers until the configuration changes.
+
+        Observers that need to keep a configuration around after the next
+        step, like painters that queue configurations, should use this
+        instead of copying the configuration themselves."""
+        return self.get_config()
+
     def set_config(self, config):
         """Sets a new config for the simulator.
 
@@ -118,6 +154,11 @@ class SimulatorInterface(QObject):
         self.updated.emit()
         self.step_number += 1
 
+    def run(self, steps):
+        """Step the simulator the given number of times."""
+        for i in xrange(steps):
+            self.step()
+
     def copy(self):
         """Duplicate the simulator."""
 
@@ -147,6 +188,77 @@ class SimulatorInterface(QObject):
         raise NotImplementedError("restoring of snapshots not implemented"\
                                   "for %s" % (self.__class__))
 
+    def step_back(self):
+        """Go back to the previous step, if it's in the history.
+
+        See :attr:`available_history`."""
+        self.seek(self.step_number - 1)
+
+    def seek(self, step_number):
+        """Go to the given step, if it's in the history."""
+        raise NotImplementedError("history not implemented for %s" % (self.__class__))
+
+    def save_checkpoint(self, filename):
+        """Write a snapshot of the simulator to a file.
+
+        The file is written under a temporary name first and then renamed,
+        so that a crash while writing never leaves a broken checkpoint
+        behind."""
+        snapshot = self.snapshot()
+        arrays = dict(("target/" + name, value)
+                      for name, value in snapshot["target"].iteritems()
+                      if isinstance(value, np.ndarray))
+        meta = dict(snapshot)
+        meta["target"] = dict((name, value)
+                              for name, value in snapshot["target"].iteritems()
+                              if not isinstance(value, np.ndarray))
+        arrays["meta"] = np.frombuffer(cPickle.dumps(meta, 2), dtype=np.uint8)
+
+        directory = os.path.dirname(os.path.abspath(filename))
+        handle, tmpname = tempfile.mkstemp(prefix=".checkpoint_", suffix=".npz", dir=directory)
+        try:
+            with os.fdopen(handle, "wb") as outfile:
+                np.savez_compressed(outfile, **arrays)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            os.rename(tmpname, filename)
+        except:
+            os.unlink(tmpname)
+            raise
+
+    def load_checkpoint(self, filename):
+        """Restore the simulator from a file written by :meth:`save_checkpoint`.
+
+        The simulator has to be set up the same way as the one the checkpoint
+        was taken from."""
+        with open(filename, "rb") as infile:
+            data = np.load(infile)
+            snapshot = cPickle.loads(data["meta"].tostring())
+            for key in data.files:
+                if key.startswith("target/"):
+                    snapshot["target"][key[len("target/"):]] = data[key]
+        self.restore(snapshot)
+
+    def auto_checkpoint(self, filename, every=1000):
+        """Save a checkpoint to `filename` every `every` steps.
+
+        Pass None as the filename to stop taking checkpoints."""
+        self._checkpoint_file = filename
+        self._checkpoint_every = every
+
+    _checkpoint_file = None
+    _checkpoint_every = None
+
+    def _take_auto_checkpoint(self, since=None):
+        """Save a checkpoint, if a multiple of the interval was reached
+        after the step number `since`, which defaults to the last step."""
+        if self._checkpoint_file is None:
+            return
+        if since is None:
+            since = self.step_number - 1
+        if self.step_number // self._checkpoint_every > since // self._checkpoint_every:
+            self.save_checkpoint(self._checkpoint_file)
+
     def reset(self, configurator=None):
         """Reset the simulator by using the same generator that was initially
         used, if it's still available, or set a new configurator for the future
@@ -179,17 +291,47 @@ class CagenSimulator(SimulatorInterface):
 
         self.t = TargetProxy(self._target, self._step_func.attrs + ["possible_values"])
 
+        self._config_frame = None
+
     def get_config(self):
         """Return the config, sans borders."""
+        return self.get_config_view().copy()
+
+    def get_config_view(self):
+        """Return a read-only view of the config, sans borders.
+
+        The view points into the buffer the simulator works on, so it will
+        hold a different configuration after the next step."""
+        view = self._target.cconf[self._unbordered_slices(self._target.cconf)]
+        view.flags.writeable = False
+        return view
+
+    def _unbordered_slices(self, conf):
+        """The slices that cut the borders off of a config with borders."""
         if len(self.shape) == 1:
             ((l, r),) = self._bbox
-            return self._target.cconf[abs(l):-abs(r)].copy()
+            return (slice(abs(l), conf.shape[0] - abs(r)),)
         elif len(self.shape) == 2:
             (l, r), (u, d) = self._bbox
-            return self._target.cconf[abs(u):-abs(d),abs(l):-abs(r)].copy()
+            return (slice(abs(u), conf.shape[0] - abs(d)),
+                    slice(abs(l), conf.shape[1] - abs(r)))
+
+    def get_config_frame(self):
+        """Return a read-only copy of the config, sans borders, that is made
+        at most once per step and shared by all callers."""
+        if self._config_frame is None:
+            frame = self.get_config()
+            frame.flags.writeable = False
+            self._config_frame = frame
+        return self._config_frame
 
     def set_config(self, config):
         self._step_func.set_config(config)
+        self._config_frame = None
+        if self.history is not None:
+            self.history.config_changed()
+        if self.cycles is not None:
+            self.cycles.reset()
         self.snapshot_restored.emit()
 
     def set_config_value(self, pos, value=None):
@@ -197,6 +339,11 @@ class CagenSimulator(SimulatorInterface):
             self._step_func.set_config_value(pos, value)
         except IndexError:
             return
+        self._config_frame = None
+        if self.history is not None:
+            self.history.config_changed()
+        if self.cycles is not None:
+            self.cycles.reset()
         self.changed.emit()
 
     def step(self):
@@ -206,20 +353,156 @@ class CagenSimulator(SimulatorInterface):
         # XXX what's the order? what happens if a slot called from here changes something?
         self.prepared = True
         self.step_number += 1
+        self._config_frame = None
+        if self.history is not None:
+            self.history.stepped()
+        if self.cycles is not None:
+            self.cycles.stepped()
         self.updated.emit()
+        self._take_auto_checkpoint()
 
     def step_inline(self):
         """Step the simulator using the weave.inline version of the code."""
         self._step_func.step_inline()
         self.prepared = True
         self.step_number += 1
+        self._config_frame = None
+        if self.history is not None:
+            self.history.stepped()
+        if self.cycles is not None:
+            self.cycles.stepped()
         self.updated.emit()
+        self._take_auto_checkpoint()
 
     def step_pure_py(self):
         """Step the simulator using the pure python code version."""
         self._step_func.step_pure_py()
         self.step_number += 1
+        self._config_frame = None
+        if self.history is not None:
+            self.history.stepped()
+        if self.cycles is not None:
+            self.cycles.stepped()
         self.updated.emit()
+        self._take_auto_checkpoint()
+
+    def snapshot(self):
+        """Take a snapshot of all the state of the step function.
+
+        This includes all arrays and sets in the target, the state of the
+        random number generator, the step number and a description of the
+        step function, that is checked when restoring.
+
+        :returns: A dictionary, that can be passed to :meth:`restore`."""
+        target = {}
+        for name, value in vars(self._target).iteritems():
+            if isinstance(value, np.ndarray):
+                target[name] = value.copy()
+            elif isinstance(value, (set, dict, list)):
+                target[name] = copy.deepcopy(value)
+
+        random = getattr(self._step_func, "random", None)
+        snapshot = dict(structure=str(self._step_func),
+                        shape=tuple(self.shape),
+                        step_number=self.step_number,
+                        target=target,
+                        random_state=random.getstate() if random is not None else None)
+        self.snapshot_taken.emit()
+        return snapshot
+
+    def restore(self, snapshot):
+        """Restore a snapshot taken with :meth:`snapshot` from this simulator
+        or from one that was set up the same way."""
+        if snapshot["structure"] != str(self._step_func) or tuple(snapshot["shape"]) != tuple(self.shape):
+            raise ValueError("The snapshot was taken from a different step function:\n%s %s" %
+                             (snapshot["structure"], snapshot["shape"]))
+
+        for name, value in snapshot["target"].iteritems():
+            if isinstance(value, np.ndarray):
+                value = value.copy()
+            else:
+                value = copy.deepcopy(value)
+            setattr(self._target, name, value)
+
+        if snapshot["random_state"] is not None:
+            self._step_func.random.setstate(snapshot["random_state"])
+        self.step_number = snapshot["step_number"]
+        self._config_frame = None
+        if self.history is not None:
+            self.history.config_changed()
+        if self.cycles is not None:
+            self.cycles.reset()
+        self.snapshot_restored.emit()
+
+    def light_cone_values(self, positions, steps):
+        """Calculate the values the cells at positions will have after the
+        given number of steps, without stepping the whole configuration.
+
+        This only works for deterministic step functions with elementary or
+        life-like computations, see `zasim.cagen.lightcone`."""
+        return self._step_func.light_cone_values(positions, steps)
+
+    history = None
+    """The `ConfigHistory`, if :meth:`enable_history` was called."""
+
+    def enable_history(self, keyframe_interval=32, max_bytes=64 * 1024 * 1024, deltas=True):
+        """Start recording the configurations, so that :meth:`step_back`
+        and :meth:`seek` can go back to them.
+
+        See `ConfigHistory` for the parameters."""
+        self.history = ConfigHistory(self, keyframe_interval, max_bytes, deltas)
+
+    @property
+    def available_history(self):
+        if self.history is None:
+            return 0
+        return self.history.available()
+
+    def seek(self, step_number):
+        if self.history is None:
+            raise IndexError("the history is not enabled. Call enable_history first.")
+        self.history.seek(step_number)
+
+    cycles = None
+    """The `CycleDetector`, if :meth:`enable_cycle_detection` was called."""
+
+    def enable_cycle_detection(self, seed=0):
+        """Start looking for a cycle in the configurations, so that
+        :meth:`run` can skip over it.
+
+        The result is available as the stat `cycle`, see `CycleDetector`."""
+        self.cycles = CycleDetector(self, seed)
+        if "cycle" not in self.t.attrs:
+            self.t.attrs.append("cycle")
+
+    @property
+    def cycle(self):
+        """The transient and the period of the cycle the simulator is in,
+        or None, if no cycle has been found yet."""
+        if self.cycles is None or not self.cycles.confirmed:
+            return None
+        return self.cycles.transient, self.cycles.period
+
+    def run(self, steps):
+        """Step the simulator the given number of times.
+
+        If cycle detection is enabled and the simulator is known to be in a
+        cycle, whole periods are skipped and only the steps that remain
+        are calculated."""
+        target = self.step_number + steps
+        while self.step_number < target:
+            cycles = self.cycles
+            if cycles is not None and cycles.confirmed and self.step_number >= cycles.transient:
+                skip = (target - self.step_number) // cycles.period * cycles.period
+                if skip:
+                    self.step_number += skip
+                    cycles.skipped()
+                    if self.history is not None:
+                        self.history.config_changed()
+                    self.snapshot_restored.emit()
+                    self._take_auto_checkpoint(self.step_number - skip)
+                    continue
+            self.step()
 
     def reset(self, configurator=None):
         if configurator is not None:
@@ -240,9 +523,24 @@ class ElementaryCagenSimulator(CagenSimulator):
     """This Simulator has a few special options available only if you have an
     elementary step func with a rule number."""
 
-    rule_number = 0
-    """The rule number of the target."""
+    _rule_number = None
 
-    def __init__(self, step_func, rule_nr):
+    def __init__(self, step_func, rule_nr=None):
+        """:param step_func: The step function, whose target has a rule
+                             lookup array called `rule`.
+        :param rule_nr: The rule number. If it's None, it is calculated
+                        from the lookup array when it's first needed."""
         super(ElementaryCagenSimulator, self).__init__(step_func=step_func)
-        self.rule_number = rule_nr
+        self._rule_number = rule_nr
+
+    @property
+    def rule_number(self):
+        """The rule number of the target."""
+        if self._rule_number is None:
+            from .cagen.utils import rule_arr_to_rule_nr
+            self._rule_number = rule_arr_to_rule_nr(self._target.rule, len(self._target.possible_values))
+        return self._rule_number
+
+    @rule_number.setter
+    def rule_number(self, rule_nr):
+        self._rule_number = rule_nr
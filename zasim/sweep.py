@@ -0,0 +1,362 @@
+"""This module runs a simulator for every combination of a grid of
+parameters and reduces the histogram and activity of each run to a few
+numbers, the metrics.
+
+The runs are distributed over a pool of processes. Each process keeps the
+step functions it has generated around and reuses them for the next run
+with the same structure (size, nondet, beta and base), only swapping out
+the rule table, the random seed and the configuration.
+
+Results are appended to a `ColumnStore` as soon as they come in, so an
+interrupted sweep can be resumed by running it again with the same
+directory; combinations that already have a result are skipped.
+
+The same functionality is available from the commandline::
+
+    zasim_sweep results/ --rules 0-255 --nondet 1,0.5 --size 100 --seeds 0-4
+
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+from __future__ import absolute_import
+
+from .cagen.simulators import ElementarySimulator
+from .cagen.utils import rule_nr_to_multidim_rule_arr
+from .config import RandomConfiguration
+
+from itertools import product, imap
+from random import Random
+
+import numpy as np
+import random
+import json
+import os
+
+PARAMETER_COLUMNS = [("rule", "int64"), ("nondet", "float64"), ("beta", "float64"),
+                     ("width", "int64"), ("height", "int64"), ("seed", "int64")]
+"""The columns that identify a single run of a sweep."""
+
+def final_density(series):
+    """The fraction of cells that are not 0 after the last step."""
+    return 1.0 - series["histogram"][-1, 0] / float(series["cells"])
+
+def mean_density(series):
+    """The fraction of cells that are not 0, averaged over all steps."""
+    return 1.0 - series["histogram"][:, 0].mean() / float(series["cells"])
+
+def final_activity(series):
+    """The fraction of cells that changed their value in the last step."""
+    return series["activity"][-1, 1] / float(series["cells"])
+
+def mean_activity(series):
+    """The fraction of cells that changed their value, averaged over all
+    steps."""
+    return series["activity"][:, 1].mean() / float(series["cells"])
+
+def frozen_step(series):
+    """The first step after which no cell changed anymore, or -1 if the
+    configuration never froze."""
+    active = np.flatnonzero(series["activity"][:, 1])
+    if len(active) == 0:
+        return 0
+    if active[-1] == len(series["activity"]) - 1:
+        return -1
+    return active[-1] + 1
+
+METRICS = dict((fun.__name__, fun) for fun in
+               [final_density, mean_density, final_activity, mean_activity, frozen_step])
+"""The metrics that can be selected by name.
+
+A metric is a function, that takes a dictionary with the arrays
+"histogram" (one row per step) and "activity" (one row per step, see
+`ActivityRecord`) and the number of cells under "cells" and returns a single
+number. Custom metrics have to be defined at the module level, so that they
+can be sent to the worker processes."""
+
+def parameter_grid(rules, nondet=(1,), beta=(1,), sizes=((100,),), seeds=(0,)):
+    """Generate a dictionary of parameters for every combination of the given
+    values.
+
+    Combinations that have both nondet and beta set to something other than 1
+    are left out, as the simulators can't do both at the same time."""
+    for rule, nd, bt, size, seed in product(rules, nondet, beta, sizes, seeds):
+        if nd != 1 and bt != 1:
+            continue
+        yield dict(rule=rule, nondet=nd, beta=bt,
+                   width=size[0], height=size[1] if len(size) > 1 else 0,
+                   seed=seed)
+
+class ColumnStore(object):
+    """Store rows of numbers in a directory, one file of raw values per
+    column, so that single columns can be loaded quickly and rows can be
+    appended cheaply.
+
+    The names and dtypes of the columns and any additional info are kept in
+    a file called meta.json. Rows that were only partially written, for
+    example because the process was killed, are cut off when the store is
+    opened again."""
+
+    def __init__(self, directory, columns=None, info=None):
+        """Open the store in `directory` or create a new one.
+
+        :param columns: A list of (name, dtype) tuples. Must be supplied when
+                        creating a new store and must match the existing store
+                        otherwise.
+        :param info: A dictionary of additional info to save. Must match the
+                     existing store as well."""
+        self.directory = directory
+        metafile = os.path.join(directory, "meta.json")
+
+        if os.path.exists(metafile):
+            with open(metafile) as meta:
+                meta = json.load(meta)
+            stored_columns = [(str(name), str(dtype)) for name, dtype in meta["columns"]]
+            if columns is not None and list(columns) != stored_columns:
+                raise ValueError("%s holds columns %s, not %s" % (directory, stored_columns, columns))
+            if info is not None and info != meta["info"]:
+                raise ValueError("%s was created with %s, not %s" % (directory, meta["info"], info))
+            self.columns = stored_columns
+            self.info = meta["info"]
+        else:
+            if columns is None:
+                raise ValueError("%s doesn't hold a column store yet" % directory)
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            self.columns = list(columns)
+            self.info = info or {}
+            with open(metafile, "w") as meta:
+                json.dump(dict(columns=self.columns, info=self.info), meta)
+
+        self._dtypes = [np.dtype(dtype) for name, dtype in self.columns]
+
+        self.rows = min([os.path.getsize(self._filename(name)) // dtype.itemsize
+                         if os.path.exists(self._filename(name)) else 0
+                         for (name, _), dtype in zip(self.columns, self._dtypes)])
+
+        self._files = []
+        for (name, _), dtype in zip(self.columns, self._dtypes):
+            colfile = open(self._filename(name), "ab")
+            colfile.truncate(self.rows * dtype.itemsize)
+            self._files.append(colfile)
+
+    def _filename(self, name):
+        return os.path.join(self.directory, name + ".col")
+
+    def append(self, row):
+        """Append a row, given as a dictionary from column name to value."""
+        for (name, _), dtype, colfile in zip(self.columns, self._dtypes, self._files):
+            colfile.write(np.array([row[name]], dtype=dtype).tostring())
+        for colfile in self._files:
+            colfile.flush()
+        self.rows += 1
+
+    def load(self):
+        """Return a dictionary from column name to an array of all values."""
+        for colfile in self._files:
+            colfile.flush()
+        return dict((name, np.fromfile(self._filename(name), dtype=dtype, count=self.rows))
+                    for (name, _), dtype in zip(self.columns, self._dtypes))
+
+    def close(self):
+        for colfile in self._files:
+            colfile.close()
+        self._files = []
+
+    def __len__(self):
+        return self.rows
+
+def load_sweep(directory):
+    """Load the results of a sweep as a dictionary from column name to array."""
+    store = ColumnStore(directory)
+    try:
+        return store.load()
+    finally:
+        store.close()
+
+_simulators = {}
+"""The simulators each worker process has built so far, by structure."""
+
+_max_simulators = 16
+
+def _prepare_simulator(params, base):
+    """Get a simulator for the given parameters, reusing the step function
+    of an earlier run with the same structure, if there is one."""
+    size = (params["width"],) if params["height"] == 0 else (params["width"], params["height"])
+    key = (size, params["nondet"], params["beta"], base)
+
+    random.seed(params["seed"])
+    np.random.seed(params["seed"])
+    config = RandomConfiguration(base).generate(size_hint=size)
+
+    sim = _simulators.get(key)
+    if sim is None:
+        if len(_simulators) >= _max_simulators:
+            _simulators.clear()
+        sim = ElementarySimulator(size=size, nondet=params["nondet"], beta=params["beta"],
+                                  base=base, rule=params["rule"], config=config,
+                                  histogram=True, activity=True,
+                                  random_generator=Random(params["seed"]))
+        _simulators[key] = sim
+        return sim
+
+    stepfunc = sim._step_func
+    rule_arr = rule_nr_to_multidim_rule_arr(params["rule"], sim.computer.digits, base)
+    sim.computer.rule = sim.rule_number = params["rule"]
+    sim._target.rule[...] = rule_arr
+    if hasattr(stepfunc, "random"):
+        # do the same as RandomGenerator.set_target does for a new simulator
+        stepfunc.random.seed(params["seed"])
+        sim._target.randseed[0] = stepfunc.random.random()
+    sim.set_config(config)
+    return sim
+
+def run_one(task):
+    """Run a single simulation and calculate its metrics.
+
+    :param task: A tuple of the parameter dictionary, the number of steps,
+                 the base and the list of metrics.
+    :returns: The parameter dictionary updated with the metrics."""
+    params, steps, base, metrics = task
+
+    sim = _prepare_simulator(params, base)
+    histogram = np.empty((steps, base), dtype=np.int64)
+    activity = np.empty((steps, 2), dtype=np.int64)
+    for step in xrange(steps):
+        sim.step()
+        histogram[step] = sim._target.histogram
+        activity[step] = sim._target.activity
+
+    series = dict(histogram=histogram, activity=activity,
+                  cells=int(np.prod(sim.shape)))
+    result = dict(params)
+    for metric in metrics:
+        fun = METRICS[metric] if isinstance(metric, basestring) else metric
+        result[metric_name(metric)] = fun(series)
+    return result
+
+def metric_name(metric):
+    return metric if isinstance(metric, basestring) else metric.__name__
+
+def run_sweep(directory, rules, nondet=(1,), beta=(1,), sizes=((100,),), seeds=(0,),
+              steps=100, base=2, metrics=("final_density", "mean_activity"),
+              processes=None, progress=None):
+    """Run a simulation for every combination of parameters and store the
+    metrics of each run in a `ColumnStore` in `directory`.
+
+    If the directory already holds results of a sweep with the same steps,
+    base and metrics, the combinations that were already calculated are
+    skipped.
+
+    :param processes: How many worker processes to use. None will use as
+                      many processes as there are CPUs, 1 will run all
+                      simulations in this process.
+    :param progress: A function that gets called with the number of
+                     finished and the total number of runs after each run.
+    :returns: The results of all runs in the directory, as returned by
+              `load_sweep`."""
+    for metric in metrics:
+        if isinstance(metric, basestring) and metric not in METRICS:
+            raise ValueError("unknown metric %s, choose from %s" % (metric, ", ".join(sorted(METRICS))))
+
+    columns = PARAMETER_COLUMNS + [(metric_name(metric), "float64") for metric in metrics]
+    store = ColumnStore(directory, columns, dict(steps=steps, base=base))
+    try:
+        done = store.load()
+        done = set(zip(*[done[name].tolist() for name, _ in PARAMETER_COLUMNS]))
+
+        # sorting by structure makes consecutive tasks, that end up in the
+        # same chunk, reuse the same step function.
+        tasks = [params for params in parameter_grid(rules, nondet, beta, sizes, seeds)
+                 if tuple(params[name] for name, _ in PARAMETER_COLUMNS) not in done]
+        tasks.sort(key=lambda params: (params["width"], params["height"],
+                                       params["nondet"], params["beta"]))
+        tasks = [(params, steps, base, list(metrics)) for params in tasks]
+
+        total = len(tasks) + len(done)
+        if processes == 1 or len(tasks) <= 1:
+            pool = None
+            results = imap(run_one, tasks)
+        else:
+            from multiprocessing import Pool
+            pool = Pool(processes)
+            chunksize = max(1, min(32, len(tasks) // (4 * len(pool._pool))))
+            results = pool.imap_unordered(run_one, tasks, chunksize)
+
+        try:
+            for result in results:
+                store.append(result)
+                if progress:
+                    progress(len(store), total)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        return store.load()
+    finally:
+        store.close()
+
+def main(args=None):
+    import argparse
+    import sys
+
+    def parse_numbers(conv, ranges=True):
+        def parse(text):
+            result = []
+            for part in text.split(","):
+                if ranges and "-" in part[1:]:
+                    start, end = part.split("-", 1)
+                    result.extend(range(conv(start), conv(end) + 1))
+                else:
+                    result.append(conv(part))
+            return result
+        return parse
+
+    def parse_size(text):
+        return tuple(int(part) for part in text.split("x"))
+
+    def print_progress(done, total):
+        sys.stdout.write("\r%d / %d" % (done, total))
+        sys.stdout.flush()
+
+    argp = argparse.ArgumentParser(
+        description="Run BinRule simulators for a grid of parameters and "
+                    "store metrics of every run.")
+    argp.add_argument("directory",
+            help="the directory to store the results in. Running the same "
+                 "sweep again resumes it")
+    argp.add_argument("-r", "--rules", type=parse_numbers(lambda t: int(t, 0)), required=True,
+            help="the rule numbers to run, like 30,110 or 0-255")
+    argp.add_argument("--nondet", type=parse_numbers(float, False), default=[1.0],
+            help="comma separated probabilities for cells to be executed")
+    argp.add_argument("--beta", type=parse_numbers(float, False), default=[1.0],
+            help="comma separated probabilities for cells to expose their state")
+    argp.add_argument("--size", type=parse_size, action="append", dest="sizes",
+            help="a size to run, like 100 or 40x30. Can be given multiple times")
+    argp.add_argument("--seeds", type=parse_numbers(int), default=[0],
+            help="the random seeds to run, like 0-9")
+    argp.add_argument("-s", "--steps", default=100, type=int,
+            help="how many steps to run each simulator for")
+    argp.add_argument("--base", default=2, type=int,
+            help="The base of cell values. Base 2 gives you 0 and 1, for example.")
+    argp.add_argument("--metrics", default="final_density,mean_activity",
+            help="comma separated metrics to calculate, out of %s" % ", ".join(sorted(METRICS)))
+    argp.add_argument("-p", "--processes", default=None, type=int,
+            help="how many worker processes to use. Defaults to one per cpu")
+
+    args = argp.parse_args(args)
+
+    metrics = args.metrics.split(",")
+    for metric in metrics:
+        if metric not in METRICS:
+            argp.error("unknown metric %s" % metric)
+
+    results = run_sweep(args.directory, args.rules, args.nondet, args.beta,
+                        args.sizes or [(100,)], args.seeds, args.steps, args.base,
+                        metrics, args.processes, print_progress)
+    print
+    print "%d runs stored in %s" % (len(results["rule"]), args.directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""This module finds the rules, that are equivalent to a rule by mirroring or
+rotating the neighbourhood, or by flipping the values of the results, and
+picks the lowest rule number out of each class of equivalent rules as its
+canonical representative.
+
+The operations are the `neighbourhood_actions` of `zasim.elementarytools`.
+Each of them, except for flipping the results, is just a reordering of the
+entries of the rule array, so it can be expressed as an index map. A
+`SymmetryGroup` builds all combinations of the operations once for a
+neighbourhood, after which the whole orbit of a batch of rules can be
+created with a single fancy indexing operation.
+
+.. testsetup::
+
+    from zasim.symmetry import *
+
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+from __future__ import absolute_import
+from .cagen.utils import rule_nr_to_rule_arr, rule_arr_to_rule_nr, rule_arr_dtype
+from . import elementarytools
+
+import numpy as np
+
+VALUE_FLIP = "flip all bits"
+"""The name of the action that flips the results instead of reordering them."""
+
+class SymmetryGroup(object):
+    """All combinations of a set of neighbourhood actions for one
+    neighbourhood and base.
+
+    >>> from zasim.cagen import VonNeumannNeighbourhood
+    >>> group = SymmetryGroup(VonNeumannNeighbourhood())
+    >>> len(group)
+    16
+
+    Setting only one of the outer cells of the neighbourhood gives
+    equivalent rules, setting only the middle cell doesn't:
+
+    >>> group.canonical_numbers([2, 4, 16, 256, 65536])
+    [2, 2, 16, 2, 2]"""
+
+    def __init__(self, neighbourhood, base=2, actions=None):
+        """:param neighbourhood: The neighbourhood of the rules.
+        :param base: The number of possible cell values.
+        :param actions: The names of the actions to combine. Defaults to
+                        all `neighbourhood_actions`. Actions that don't work
+                        with the neighbourhood, like rotating a
+                        one-dimensional one, are left out."""
+        if actions is None:
+            actions = sorted(elementarytools.neighbourhood_actions)
+        self.base = base
+        self.digits = len(neighbourhood.offsets)
+        self.size = base ** self.digits
+        """The number of entries in a rule array."""
+
+        identity = np.arange(self.size)
+        generators = []
+        for name in actions:
+            if name == VALUE_FLIP:
+                generators.append((name, identity, True))
+                continue
+            try:
+                index_map = elementarytools.neighbourhood_actions[name](neighbourhood, identity, base=base)
+            except (KeyError, TypeError, ValueError, IndexError):
+                continue
+            generators.append((name, np.asarray(index_map), False))
+
+        # build the closure of the generators breadth first, so that every
+        # element gets one of the shortest routes to it.
+        elements = {(tuple(identity), False): []}
+        queue = [(identity, False, [])]
+        for index_map, flip, route in queue:
+            for name, generator, generator_flip in generators:
+                new_map = index_map[generator]
+                new_flip = flip != generator_flip
+                key = (tuple(new_map), new_flip)
+                if key not in elements:
+                    elements[key] = route + [name]
+                    queue.append((new_map, new_flip, route + [name]))
+
+        self.index_maps = np.array([index_map for index_map, _, _ in queue])
+        """An array with one index map per element of the group."""
+
+        self.flips = np.array([flip for _, flip, _ in queue], dtype=bool)
+        """Whether each element of the group flips the results."""
+
+        self.routes = [route for _, _, route in queue]
+        """The names of the actions that make up each element."""
+
+        self._powers = None
+        if self.size * np.log2(base) <= 63:
+            self._powers = base ** np.arange(self.size, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.index_maps)
+
+    def orbits(self, tables):
+        """Apply every element of the group to a batch of rule arrays.
+
+        :param tables: An array of rule arrays, one per row.
+        :returns: An array with the rule as the first axis and the element
+                  of the group as the second."""
+        tables = np.asarray(tables, dtype=rule_arr_dtype(self.base)).reshape(-1, self.size)
+        orbits = tables[:, self.index_maps]
+        flipped = self.base - 1 - orbits[:, self.flips]
+        orbits[:, self.flips] = flipped
+        return orbits
+
+    def canonical_tables(self, tables):
+        """Find the rule array with the lowest rule number in the orbit of
+        each of a batch of rule arrays.
+
+        :returns: The canonical rule arrays and the index of the element of
+                  the group, that creates each of them."""
+        orbits = self.orbits(tables)
+        rules = np.arange(len(orbits))
+        candidates = np.ones(orbits.shape[:2], dtype=bool)
+        # compare the entries from the most significant digit down
+        for entry in xrange(self.size - 1, -1, -1):
+            values = np.where(candidates, orbits[:, :, entry], self.base)
+            candidates &= values == values.min(axis=1)[:, None]
+            if (candidates.sum(axis=1) == 1).all():
+                break
+        elements = candidates.argmax(axis=1)
+        return orbits[rules, elements], elements
+
+    def numbers(self, tables):
+        """Turn a batch of rule arrays into rule numbers."""
+        tables = np.asarray(tables).reshape(-1, self.size)
+        if self._powers is not None:
+            return (tables.astype(np.int64) * self._powers).sum(axis=1).tolist()
+        return [rule_arr_to_rule_nr(table, self.base) for table in tables]
+
+    def tables(self, numbers):
+        """Turn rule numbers into an array of rule arrays."""
+        return np.array([rule_nr_to_rule_arr(number, self.digits, self.base) for number in numbers],
+                        dtype=rule_arr_dtype(self.base)).reshape(-1, self.size)
+
+    def canonical_numbers(self, numbers):
+        """Find the canonical rule number for each of a list of rule
+        numbers."""
+        canonical, _ = self.canonical_tables(self.tables(numbers))
+        return self.numbers(canonical)
+
+    def orbit_numbers(self, number):
+        """Find all rule numbers equivalent to a rule number, together with
+        the shortest route of actions to each of them.
+
+        :returns: A dictionary of rule number to route."""
+        orbit = self.orbits(self.tables([number]))[0]
+        result = {}
+        for rule_nr, route in zip(self.numbers(orbit), self.routes):
+            if rule_nr not in result:
+                result[rule_nr] = route
+        return result
+
+_groups = {}
+def symmetry_group(neighbourhood, base=2, actions=None):
+    """Get the `SymmetryGroup` for a neighbourhood, base and actions, which
+    is only created once for each combination."""
+    if actions is None:
+        actions = sorted(elementarytools.neighbourhood_actions)
+    key = (tuple(neighbourhood.names), tuple(neighbourhood.offsets), base, tuple(actions))
+    if key not in _groups:
+        _groups[key] = SymmetryGroup(neighbourhood, base, actions)
+    return _groups[key]
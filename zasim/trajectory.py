@@ -0,0 +1,262 @@
+"""This module implements a file format for recording the configurations
+of a simulator over many steps and reading them back, without holding the
+whole trajectory in memory on either side.
+
+A trajectory file consists of a header, a sequence of records and an index.
+
+The header holds the magic string ``ZASIMTRJ`` and a json dictionary with
+the shape and dtype of the configurations.
+
+Every record starts with its kind (a keyframe or a delta), the step number
+it belongs to and its length. Keyframes hold the raw bytes of a
+configuration, so that the reader can map them into memory directly.
+Deltas hold the zlib compressed XOR of a configuration and the one recorded
+before it. Every `keyframe_interval` records, a keyframe is written.
+
+The index at the end of the file lists the kinds, step numbers and offsets
+of all records. If the writer didn't get to write it, because the program
+crashed, the reader rebuilds it by walking over the records.
+
+To get to any configuration, the reader only has to decode the deltas
+between it and the keyframe before it.
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+import numpy as np
+
+import json
+import mmap
+import struct
+import zlib
+
+MAGIC = "ZASIMTRJ"
+INDEX_MAGIC = "ZTRJIDX\0"
+
+KEYFRAME = 0
+DELTA = 1
+
+_record_header = struct.Struct("<BqQ")
+_index_trailer = struct.Struct("<QQ8s")
+
+_index_dtype = np.dtype([("kind", "<u1"), ("step", "<i8"), ("offset", "<u8"), ("length", "<u8")])
+
+class TrajectoryWriter(object):
+    """Stream the configurations of a simulator into a trajectory file."""
+
+    def __init__(self, filename, simulator=None, keyframe_interval=64,
+                 compression=6, connect=True):
+        """:param filename: The file to write to.
+        :param simulator: The simulator to record. If it is supplied, the
+                          current configuration is written immediately.
+                          Otherwise, call :meth:`write` for every step.
+        :param keyframe_interval: How many records to write between two
+                                  keyframes. More records between keyframes
+                                  make the file smaller, but seeking slower.
+        :param compression: The zlib compression level for deltas.
+        :param connect: Connect the signals of the simulator immediately?"""
+        self._file = open(filename, "wb")
+        self._sim = simulator
+        self.keyframe_interval = keyframe_interval
+        self.compression = compression
+
+        self._header_written = False
+        self._last_conf = None
+        self._since_keyframe = 0
+        self._index = []
+        self._connected = False
+
+        if simulator is not None:
+            self.record()
+            if connect:
+                self.connect_simulator()
+
+    def connect_simulator(self):
+        self._sim.updated.connect(self.record)
+        self._sim.changed.connect(self.record)
+        self._sim.snapshot_restored.connect(self.record)
+        self._connected = True
+
+    def record(self):
+        """Write the current configuration of the simulator."""
+        self.write(self._sim.get_config_view(), self._sim.step_number)
+
+    def _write_header(self, config):
+        header = json.dumps(dict(shape=list(config.shape), dtype=config.dtype.str))
+        self._file.write(MAGIC)
+        self._file.write(struct.pack("<I", len(header)))
+        self._file.write(header)
+        self.shape = config.shape
+        self.dtype = config.dtype
+        self._header_written = True
+
+    def write(self, config, step_number):
+        """Append a configuration to the file."""
+        if not self._header_written:
+            self._write_header(config)
+        elif config.shape != self.shape or config.dtype != self.dtype:
+            raise ValueError("can't record a %s config of shape %s in a trajectory of %s configs of shape %s"
+                             % (config.dtype, config.shape, self.dtype, self.shape))
+
+        if self._last_conf is None or self._since_keyframe >= self.keyframe_interval:
+            kind = KEYFRAME
+            payload = np.ascontiguousarray(config).tostring()
+            self._last_conf = config.copy()
+            self._since_keyframe = 0
+        else:
+            kind = DELTA
+            xor = config ^ self._last_conf
+            payload = zlib.compress(xor.tostring(), self.compression)
+            self._last_conf ^= xor
+        self._since_keyframe += 1
+
+        self._file.write(_record_header.pack(kind, step_number, len(payload)))
+        offset = self._file.tell()
+        self._file.write(payload)
+        self._index.append((kind, step_number, offset, len(payload)))
+
+    def disconnect_simulator(self):
+        self._sim.updated.disconnect(self.record)
+        self._sim.changed.disconnect(self.record)
+        self._sim.snapshot_restored.disconnect(self.record)
+
+    def close(self):
+        """Write the index and close the file."""
+        if self._file.closed:
+            return
+        if self._connected:
+            self.disconnect_simulator()
+        if self._header_written:
+            index = np.array(self._index, dtype=_index_dtype)
+            offset = self._file.tell()
+            self._file.write(index.tostring())
+            self._file.write(_index_trailer.pack(offset, len(index), INDEX_MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class TrajectoryReader(object):
+    """Read configurations back from a trajectory file.
+
+    The file is mapped into memory, so only the parts that are needed for
+    the requested configurations are read from disk."""
+
+    def __init__(self, filename):
+        self._file = open(filename, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a trajectory file" % filename)
+        header_length, = struct.unpack("<I", self._map[len(MAGIC):len(MAGIC) + 4])
+        self._data_start = len(MAGIC) + 4 + header_length
+        header = json.loads(self._map[len(MAGIC) + 4:self._data_start])
+        self.shape = tuple(header["shape"])
+        self.dtype = np.dtype(str(header["dtype"]))
+
+        self._index = self._read_index()
+        self.steps = self._index["step"]
+        """The step number of every record."""
+
+        self._keyframes = np.flatnonzero(self._index["kind"] == KEYFRAME)
+
+    def _read_index(self):
+        size = len(self._map)
+        if size >= self._data_start + _index_trailer.size:
+            offset, count, magic = _index_trailer.unpack(self._map[size - _index_trailer.size:])
+            if magic == INDEX_MAGIC:
+                return np.frombuffer(self._map, dtype=_index_dtype, count=count, offset=offset).copy()
+
+        # the writer didn't finish. walk over the records instead.
+        records = []
+        position = self._data_start
+        while position + _record_header.size <= size:
+            kind, step, length = _record_header.unpack(
+                    self._map[position:position + _record_header.size])
+            position += _record_header.size
+            if position + length > size:
+                break
+            records.append((kind, step, position, length))
+            position += length
+        return np.array(records, dtype=_index_dtype)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _keyframe_array(self, record):
+        offset, length = int(self._index["offset"][record]), int(self._index["length"][record])
+        return np.frombuffer(self._map, dtype=self.dtype, count=length // self.dtype.itemsize,
+                             offset=offset).reshape(self.shape)
+
+    def _delta_array(self, record):
+        offset, length = int(self._index["offset"][record]), int(self._index["length"][record])
+        data = zlib.decompress(self._map[offset:offset + length])
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.shape)
+
+    def _keyframe_before(self, record):
+        return self._keyframes[np.searchsorted(self._keyframes, record, "right") - 1]
+
+    def record_of_step(self, step_number):
+        """Find the last record for the given step number."""
+        record = np.searchsorted(self.steps, step_number, "right") - 1
+        if record < 0 or self.steps[record] != step_number:
+            raise IndexError("step %d is not in the trajectory" % step_number)
+        return record
+
+    def __getitem__(self, record):
+        """Get the configuration of the given record."""
+        if record < 0:
+            record += len(self)
+        if not 0 <= record < len(self):
+            raise IndexError("record %d out of range" % record)
+        keyframe = self._keyframe_before(record)
+        config = self._keyframe_array(keyframe).copy()
+        for delta in xrange(keyframe + 1, record + 1):
+            config ^= self._delta_array(delta)
+        return config
+
+    def get_step(self, step_number):
+        """Get the configuration at the given step number."""
+        return self[self.record_of_step(step_number)]
+
+    def __iter__(self):
+        for config in self.window(0, len(self)):
+            yield config.copy()
+
+    def window(self, start, stop, region=None):
+        """Iterate over the configurations of the records from start to stop,
+        optionally cut down to a region.
+
+        :param region: A tuple of slices to apply to every configuration.
+        :returns: A generator of read-only arrays, that are only valid until
+                  the next one is generated."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if region is None:
+            region = (slice(None),) * len(self.shape)
+
+        config = None
+        for record in xrange(start, stop):
+            if self._index["kind"][record] == KEYFRAME:
+                config = self._keyframe_array(record)[region].copy()
+            elif config is None:
+                config = self[record][region].copy()
+            else:
+                config ^= self._delta_array(record)[region]
+            config.flags.writeable = False
+            yield config
+            config.flags.writeable = True
+
+    def spacetime(self, start=0, stop=None, region=None):
+        """Stack the configurations of the records from start to stop into
+        one array, with time as the first axis.
+
+        :param region: A tuple of slices to apply to every configuration."""
+        return np.array([config.copy() for config in self.window(start, stop, region)])
+
+    def close(self):
+        self._index = None
+        self._map.close()
+        self._file.close()
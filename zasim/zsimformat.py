@@ -0,0 +1,229 @@
+"""This module implements the .zsim format, which stores a configuration
+together with everything needed to continue simulating it.
+
+A .zsim file starts with a short magic string, a version byte and the length
+of a JSON header, followed by the header itself and the configuration as an
+ordinary .npy array, like `numpy.save` writes it. The header holds the shape,
+dtype and base of the configuration, the computation with its rule table,
+the neighbourhood, the border mode and the step number.
+
+Configurations with only the values 0 and 1 can be packed into eight cells
+per byte. Unpacked configurations are memory mapped when they are loaded, so
+that opening even huge files doesn't read more than the header.
+
+.. testsetup::
+
+    from zasim.zsimformat import *
+
+"""
+# This file is part of zasim. zasim is licensed under the BSD 3-clause license.
+# See LICENSE.txt for details.
+
+from __future__ import absolute_import
+
+from .config import BaseConfiguration, default_dtype
+from .cagen.border import BaseBorderCopier
+from .cagen.beta_async import BetaAsynchronousAccessor, BetaAsynchronousNeighbourhood
+from .cagen.computations import ElementaryCellularAutomatonBase, LifeCellularAutomatonBase
+from .cagen.loops import SparseCellLoop
+from .cagen.neighbourhoods import SimpleNeighbourhood
+from .cagen.stats import SimpleHistogram, ActivityRecord
+from .cagen.utils import make_rule_arr
+
+import json
+import os
+import struct
+import tempfile
+import numpy as np
+
+MAGIC = "\x93ZSIM"
+VERSION = 1
+
+ALIGNMENT = 64
+"""The payload starts at a multiple of this many bytes."""
+
+_PREFIX = len(MAGIC) + 1 + 4
+_LIFE_PARAMS = ("reproduce_min", "reproduce_max", "stay_alive_min", "stay_alive_max")
+
+def write_zsim(filename, config, meta=None, packed=None):
+    """Write a configuration to a .zsim file.
+
+    The file is written under a temporary name first and then renamed, so
+    that a crash while writing never leaves a broken file behind.
+
+    :param config: The configuration array.
+    :param meta: A dictionary of further header entries, like the ones
+                 :func:`save_simulator` creates.
+    :param packed: Whether to pack eight cells into one byte. Defaults to
+                   packing if the base given in meta is 2."""
+    config = np.asarray(config)
+    header = dict(meta or {})
+    header.update(shape=list(config.shape), dtype=config.dtype.str)
+    if packed is None:
+        packed = header.get("base") == 2
+    if packed:
+        if config.size and (config.min() < 0 or config.max() > 1):
+            raise ValueError("Only configurations of zeros and ones can be packed.")
+        payload = np.packbits(config.ravel() != 0)
+    else:
+        payload = np.ascontiguousarray(config)
+    header["packed"] = bool(packed)
+
+    text = json.dumps(header, sort_keys=True)
+    text += " " * (-(_PREFIX + len(text) + 1) % ALIGNMENT) + "\n"
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    handle, tmpname = tempfile.mkstemp(prefix=".zsim_", suffix=".zsim", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as outfile:
+            outfile.write(MAGIC + chr(VERSION) + struct.pack("<I", len(text)) + text)
+            np.lib.format.write_array(outfile, payload)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.rename(tmpname, filename)
+    except:
+        os.unlink(tmpname)
+        raise
+
+def _read_prefix(infile):
+    """Read the header of an open .zsim file and leave the file at the start
+    of the .npy payload."""
+    start = infile.read(_PREFIX)
+    if len(start) < _PREFIX or not start.startswith(MAGIC):
+        raise ValueError("Not a .zsim file.")
+    if ord(start[len(MAGIC)]) > VERSION:
+        raise ValueError("The .zsim file has the unknown version %d." % ord(start[len(MAGIC)]))
+    length, = struct.unpack("<I", start[len(MAGIC) + 1:])
+    header = json.loads(infile.read(length))
+    header["shape"] = tuple(header["shape"])
+    return header
+
+def read_header(filename):
+    """Read only the header of a .zsim file.
+
+    :returns: A dictionary with the header entries."""
+    with open(filename, "rb") as infile:
+        return _read_prefix(infile)
+
+def read_payload(filename, mode="c"):
+    """Read the header and the configuration of a .zsim file.
+
+    :param mode: The mode to memory map the configuration with, see
+                 `numpy.memmap`. The default maps the file copy-on-write.
+    :returns: The header and the configuration array."""
+    with open(filename, "rb") as infile:
+        header = _read_prefix(infile)
+        version = np.lib.format.read_magic(infile)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(infile)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(infile)
+        offset = infile.tell()
+
+    order = "F" if fortran_order else "C"
+    if int(np.prod(shape)) == 0:
+        payload = np.zeros(shape, dtype=dtype, order=order)
+    else:
+        payload = np.memmap(filename, dtype=dtype, mode=mode, offset=offset,
+                            shape=shape, order=order)
+
+    if header["packed"]:
+        size = int(np.prod(header["shape"]))
+        config = np.unpackbits(payload)[:size].astype(header["dtype"])
+        return header, config.reshape(header["shape"])
+    return header, payload
+
+class ZsimConfiguration(BaseConfiguration):
+    """Load a configuration from a .zsim file.
+
+    Only the header is read when the configuration is created; the cells are
+    memory mapped when the configuration is generated, so changing them
+    doesn't change the file."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.header = read_header(filename)
+
+    def generate(self, size_hint=None, dtype=default_dtype):
+        _, config = read_payload(self.filename)
+        if config.dtype != np.dtype(dtype):
+            config = config.astype(dtype)
+        return config
+
+def _find_visitor(stepfunc, cls):
+    for visitor in stepfunc.visitors:
+        if isinstance(visitor, cls):
+            return visitor
+
+def simulator_meta(sim):
+    """Collect the header entries that describe a simulator, so that
+    :func:`load_simulator` can create the same simulator again."""
+    stepfunc = sim._step_func
+    base = len(sim.t.possible_values)
+    # deterministic sparse loops have a probab of None.
+    nondet = getattr(stepfunc.loop, "probab", None)
+    meta = dict(base=base,
+                step_number=sim.step_number,
+                neighbourhood=dict(names=list(stepfunc.neigh.names),
+                                   offsets=[list(offset) for offset in stepfunc.neigh.offsets],
+                                   name=getattr(stepfunc.neigh, "neighbourhood_name", "")),
+                border="copy" if isinstance(stepfunc.border, BaseBorderCopier) else "fixed",
+                nondet=1 if nondet is None else nondet,
+                beta=stepfunc.acc.probab if isinstance(stepfunc.acc, BetaAsynchronousAccessor) else 1,
+                sparse_loop=isinstance(stepfunc.loop, SparseCellLoop),
+                histogram=_find_visitor(stepfunc, SimpleHistogram) is not None,
+                activity=_find_visitor(stepfunc, ActivityRecord) is not None)
+
+    elementary = _find_visitor(stepfunc, ElementaryCellularAutomatonBase)
+    life = _find_visitor(stepfunc, LifeCellularAutomatonBase)
+    if elementary is not None:
+        table = elementary._rule_arr
+        if table is None:
+            table = make_rule_arr(elementary.rule, len(stepfunc.neigh.names), base)
+        meta["computation"] = dict(kind="elementary", table=table.tolist())
+    elif life is not None:
+        meta["computation"] = dict(kind="life",
+                                   params=dict((key, life.params[key]) for key in _LIFE_PARAMS))
+    else:
+        meta["computation"] = None
+    return meta
+
+def save_simulator(filename, sim, packed=None):
+    """Write the current configuration of a simulator to a .zsim file
+    together with its rule, neighbourhood, border mode and step number."""
+    write_zsim(filename, sim.get_config_view(), simulator_meta(sim), packed)
+
+def load_simulator(filename):
+    """Create a simulator from a .zsim file written by :func:`save_simulator`.
+
+    The simulator continues at the step number it was saved at. Resetting it
+    loads the configuration from the file again."""
+    from .cagen.simulators import ElementarySimulator, GameOfLife
+
+    config = ZsimConfiguration(filename)
+    header = config.header
+    computation = header.get("computation")
+    if computation is None:
+        raise ValueError("The .zsim file %s doesn't describe a computation." % filename)
+
+    options = dict(size=header["shape"], config=config,
+                   nondet=header["nondet"], beta=header["beta"],
+                   copy_borders=header["border"] == "copy",
+                   sparse_loop=header["sparse_loop"],
+                   histogram=header["histogram"], activity=header["activity"])
+    if computation["kind"] == "elementary":
+        neighbourhood_class = (BetaAsynchronousNeighbourhood if header["beta"] != 1
+                               else SimpleNeighbourhood)
+        neighbourhood = neighbourhood_class(header["neighbourhood"]["names"],
+                                            header["neighbourhood"]["offsets"],
+                                            name=header["neighbourhood"].get("name", ""))
+        sim = ElementarySimulator(rule=np.array(computation["table"]),
+                                  neighbourhood=neighbourhood,
+                                  base=header["base"], **options)
+    elif computation["kind"] == "life":
+        sim = GameOfLife(life_params=computation["params"], **options)
+    else:
+        raise ValueError("Unknown computation %r in %s." % (computation["kind"], filename))
+
+    sim.step_number = header.get("step_number", 0)
+    return sim